@@ -0,0 +1,270 @@
+"""Versioned JSON API, mounted at /api/v1.
+
+The read endpoints reuse the query layer in queries.py and never render a
+template. Responses are encoded straight to bytes (see encoders.py).
+POST /shows/batch books several shows at once (see booking.py).
+
+`?fields=id,name` limits each object to the named fields. List endpoints
+take `limit` and `after` and return the URL of the next page as `next`,
+or null on the last page.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    request,
+    stream_with_context,
+    url_for,
+)
+from sqlalchemy.exc import OperationalError
+from werkzeug.exceptions import HTTPException
+
+from booking import book_shows
+from database import QUERY_CANCELED, statement_timeout
+from encoders import dumps
+from exporter import FORMATS, export
+from models import db, Artist, Show, Venue
+from queries import entity_page, show_page, show_sections
+from request_args import (
+    format_cursor,
+    parse_cursor_arg,
+    parse_datetime_arg,
+    parse_int_arg,
+)
+from slots import find_slots, search_args
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+VENUE_FIELDS = (
+    "id",
+    "name",
+    "genres",
+    "address",
+    "city",
+    "state",
+    "phone",
+    "website",
+    "facebook_link",
+    "seeking_talent",
+    "seeking_description",
+    "image_link",
+)
+ARTIST_FIELDS = (
+    "id",
+    "name",
+    "genres",
+    "city",
+    "state",
+    "phone",
+    "website",
+    "facebook_link",
+    "seeking_venue",
+    "seeking_description",
+    "image_link",
+)
+SHOW_FIELDS = (
+    "id",
+    "start_time",
+    "venue_id",
+    "venue_name",
+    "artist_id",
+    "artist_name",
+    "artist_image_link",
+)
+SECTION_FIELDS = (
+    "past_shows",
+    "upcoming_shows",
+    "past_shows_count",
+    "upcoming_shows_count",
+)
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype="application/json")
+
+
+def selected_fields(available):
+    """Fields requested with ?fields=, or all of them; 400 on unknown names."""
+    value = request.args.get("fields")
+    if not value:
+        return available
+    fields = tuple(name for name in value.split(",") if name)
+    if not fields or not set(fields) <= set(available):
+        abort(400)
+    return fields
+
+
+def page_limit():
+    return parse_int_arg(
+        "limit",
+        default=current_app.config["API_PAGE_SIZE"],
+        minimum=1,
+        maximum=current_app.config["API_MAX_PAGE_SIZE"],
+    )
+
+
+def next_url(endpoint, after):
+    if after is None:
+        return None
+    args = {name: value for name, value in request.args.items() if name != "after"}
+    return url_for(endpoint, after=after, **args)
+
+
+def entity_list(model, fk_column, endpoint, available):
+    fields = selected_fields(available)
+    after = parse_int_arg("after", minimum=0)
+    rows, next_key = entity_page(
+        model,
+        fk_column,
+        datetime.now(),
+        genre=request.args.get("genre"),
+        after=after,
+        limit=page_limit(),
+    )
+    return json_response(
+        {
+            "data": [{name: row[name] for name in fields} for row in rows],
+            "next": next_url(endpoint, next_key),
+        }
+    )
+
+
+def entity_detail(model, entity_id, owner_column, other, available):
+    fields = selected_fields(available + SECTION_FIELDS)
+    entity = db.get_or_404(model, entity_id)
+    data = {name: getattr(entity, name) for name in fields if name in available}
+    # The show queries only run when a show field was asked for
+    if set(fields) & set(SECTION_FIELDS):
+        shows = show_sections(
+            owner_column,
+            entity_id,
+            other,
+            datetime.now(),
+            limit=current_app.config["DETAIL_SHOWS_LIMIT"],
+        )
+        data.update((name, shows[name]) for name in fields if name in shows)
+    return json_response(data)
+
+
+# The app's HTML handlers for 404 and 500 are matched by code before any
+# exception class, so those codes are registered here explicitly
+@api.errorhandler(HTTPException)
+@api.errorhandler(404)
+@api.errorhandler(500)
+def http_error(error):
+    return json_response(
+        {"error": {"code": error.code, "message": error.description}},
+        status=error.code,
+    )
+
+
+@api.errorhandler(OperationalError)
+def database_error(error):
+    if getattr(error.orig, "pgcode", None) != QUERY_CANCELED:
+        raise error
+    return json_response(
+        {"error": {"code": 503, "message": "The query took too long."}},
+        status=503,
+    )
+
+
+@api.route("/venues")
+def venues():
+    return entity_list(
+        Venue, Show.venue_id, "api.venues", VENUE_FIELDS + ("num_upcoming_shows",)
+    )
+
+
+@api.route("/venues/<int:venue_id>")
+def venue(venue_id):
+    return entity_detail(Venue, venue_id, Show.venue_id, Artist, VENUE_FIELDS)
+
+
+@api.route("/artists")
+def artists():
+    return entity_list(
+        Artist, Show.artist_id, "api.artists", ARTIST_FIELDS + ("num_upcoming_shows",)
+    )
+
+
+@api.route("/artists/<int:artist_id>")
+def artist(artist_id):
+    return entity_detail(Artist, artist_id, Show.artist_id, Venue, ARTIST_FIELDS)
+
+
+@api.route("/artists/<int:artist_id>/slots")
+def artist_slots(artist_id):
+    """Open slots for the artist at ?venue_id= (see slots.py)."""
+    venue_id, start, end, length = search_args()
+    if venue_id is None:
+        abort(400, "venue_id is required.")
+    db.get_or_404(Artist, artist_id)
+    db.get_or_404(Venue, venue_id)
+    slots = find_slots(artist_id, venue_id, start, end, length)
+    return json_response(
+        {
+            "data": [
+                {"start_time": slot_start, "end_time": slot_end}
+                for slot_start, slot_end in slots
+            ],
+            "length_minutes": length // timedelta(minutes=1),
+        }
+    )
+
+
+@api.route("/shows")
+def shows():
+    fields = selected_fields(SHOW_FIELDS)
+    rows, next_key = show_page(
+        after=parse_cursor_arg("after"),
+        start=parse_datetime_arg("from"),
+        end=parse_datetime_arg("to"),
+        limit=page_limit(),
+    )
+    return json_response(
+        {
+            "data": [{name: getattr(row, name) for name in fields} for row in rows],
+            "next": next_url("api.shows", next_key and format_cursor(next_key)),
+        }
+    )
+
+
+@api.route("/shows/batch", methods=["POST"])
+def shows_batch():
+    """Create shows from a JSON list of {artist_id, venue_id, start_time}.
+
+    Times are "YYYY-MM-DD HH:MM:SS", as in `flask import`; end_time is
+    optional. Answers 201 with one result per row when every show was
+    created, else 422.
+    """
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list) or not rows:
+        abort(400, "Expected a non-empty JSON list of shows.")
+    limit = current_app.config["SHOW_BATCH_MAX_ROWS"]
+    if len(rows) > limit:
+        abort(413, f"At most {limit} shows can be booked at once.")
+
+    results = book_shows(
+        row if isinstance(row, dict) else ValueError("expected a JSON object")
+        for row in rows
+    )
+    created = sum("id" in result for result in results)
+    return json_response(
+        {"data": results, "created": created, "rejected": len(results) - created},
+        status=201 if created == len(results) else 422,
+    )
+
+
+@api.route("/export/<any(venues, artists, shows):kind>.<any(csv, ndjson):format>")
+@statement_timeout("export")
+def export_table(kind, format):
+    """Every row of a table, streamed as it is read."""
+    response = Response(
+        stream_with_context(export(kind, format)), mimetype=FORMATS[format]
+    )
+    response.headers["Content-Disposition"] = f"attachment; filename={kind}.{format}"
+    return response
@@ -1,15 +1,75 @@
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from logging import FileHandler, Formatter
 
-import babel
-import dateutil.parser
-from flask import Flask, flash, redirect, render_template, request, url_for
+from flask import (
+    Flask,
+    flash,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
 from flask_migrate import Migrate
 from flask_moment import Moment
-
-from forms import ArtistForm, ShowForm, VenueForm
-from models import db, Album, Artist, Availability, Show, Song, Venue
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import selectinload
+
+from api import api
+from assets import Assets, assets_command
+from booking import book_shows, read_lines
+from cache import PageCache
+from conditional import conditional
+from database import (
+    QUERY_CANCELED,
+    init_statement_timeouts,
+    pool_stats,
+    statement_timeout,
+)
+from exporter import export_command
+from filters import format_datetime
+from forms import GENRES, ArtistForm, ShowBatchForm, ShowForm, VenueForm
+from importer import import_command
+from instrumentation import Instrumentation, request_log_handler, request_logger
+from models import (
+    DEFAULT_SHOW_DURATION,
+    db,
+    Album,
+    Artist,
+    Availability,
+    Show,
+    Song,
+    Venue,
+)
+from queries import (
+    artist_availability,
+    artist_list,
+    artist_version,
+    artists_version,
+    search,
+    show_page,
+    show_sections,
+    shows_version,
+    venue_areas,
+    venue_version,
+    venues_version,
+)
+from request_args import (
+    format_cursor,
+    parse_cursor_arg,
+    parse_datetime_arg,
+    parse_int_arg,
+)
+from routing import init_replica_routing, read_only
+from seed import seed_command
+from slots import find_slots, search_args
+from soft_delete import (
+    DeletedParentError,
+    init_soft_delete,
+    purge_command,
+    soft_delete,
+)
+from templating import init_bytecode_cache, listing_yield_per, render_listing
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -18,23 +78,29 @@ from models import db, Album, Artist, Availability, Show, Song, Venue
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object("config")
+init_bytecode_cache(app)
 db.init_app(app)
+init_statement_timeouts(app, db)
+init_replica_routing(db)
+init_soft_delete(db)
 migrate = Migrate(app, db)
+page_cache = PageCache(app, db)
+instrumentation = Instrumentation(app, db)
+assets = Assets(app)
+app.register_blueprint(api)
+app.cli.add_command(import_command)
+app.cli.add_command(export_command)
+app.cli.add_command(seed_command)
+app.cli.add_command(assets_command)
+app.cli.add_command(purge_command)
+
+# SQLSTATE raised when a row conflicts with an EXCLUDE constraint
+EXCLUSION_VIOLATION = "23P01"
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
-
-def format_datetime(value, format="medium"):
-    date = dateutil.parser.parse(value)
-    if format == "full":
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == "medium":
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale="en")
-
-
 app.jinja_env.filters["datetime"] = format_datetime
 
 # ----------------------------------------------------------------------------#
@@ -43,6 +109,7 @@ app.jinja_env.filters["datetime"] = format_datetime
 
 
 @app.route("/")
+@page_cache.cached("venues", "artists")
 def index():
     # Bonus: Show 10 most recently listed venues and artists
     recent_venues = Venue.query.order_by(Venue.id.desc()).limit(10).all()
@@ -57,90 +124,65 @@ def index():
 
 
 @app.route("/venues")
+@page_cache.cached("venues", "shows")
+@conditional(venues_version, "venues", "shows")
 def venues():
-    # Get all venues
-    venues = Venue.query.all()
+    genre = request.args.get("genre")
+    # Grouping and upcoming show counts are done in one aggregate query
+    data = venue_areas(datetime.now(), genre=genre, yield_per=listing_yield_per())
 
-    # Group venues by (city, state)
-    areas = {}  # Dictionary: {(city, state): [venue1, venue2, ...]}
-    now = datetime.now()
-
-    for venue in venues:
-        key = (venue.city, venue.state)
-
-        # Count upcoming shows for this venue
-        num_upcoming = len([show for show in venue.shows if show.start_time > now])
-
-        venue_data = {
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": num_upcoming,
-        }
-
-        if key not in areas:
-            areas[key] = []
-        areas[key].append(venue_data)
-
-    # Convert to list format expected by template
-    data = [
-        {"city": city, "state": state, "venues": venues}
-        for (city, state), venues in areas.items()
-    ]
-
-    return render_template("pages/venues.html", areas=data)
+    return render_listing("pages/venues.html", areas=data, genres=GENRES, genre=genre)
 
 
 @app.route("/venues/search", methods=["POST"])
+@read_only
+@statement_timeout("search")
 def search_venues():
     search_term = request.form.get("search_term", "")
-    venues = Venue.query.filter(Venue.name.ilike(f"%{search_term}%")).all()
-    now = datetime.now()
-
-    response = {
-        "count": len(venues),
-        "data": [
-            {
-                "id": v.id,
-                "name": v.name,
-                "num_upcoming_shows": len([s for s in v.shows if s.start_time > now]),
-            }
-            for v in venues
-        ],
-    }
+    page = max(request.form.get("page", 1, type=int), 1)
+    response = search(
+        Venue,
+        Show.venue_id,
+        search_term,
+        datetime.now(),
+        page=page,
+        per_page=app.config["SEARCH_PAGE_SIZE"],
+    )
     return render_template(
-        "pages/search_venues.html", results=response, search_term=search_term
+        "pages/search_venues.html",
+        results=response,
+        search_term=search_term,
+        page=page,
+        per_page=app.config["SEARCH_PAGE_SIZE"],
     )
 
 
 @app.route("/venues/<int:venue_id>")
+@page_cache.cached("venue:{venue_id}")
+@conditional(venue_version, "venue:{venue_id}", "artists")
 def show_venue(venue_id):
-    # Query venue by id
-    venue = Venue.query.get(venue_id)
-    now = datetime.now()
-
-    # Split shows into past and upcoming
-    past_shows = []
-    upcoming_shows = []
-
-    for show in venue.shows:
-        show_data = {
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": str(show.start_time),
-        }
-        if show.start_time < now:
-            past_shows.append(show_data)
-        else:
-            upcoming_shows.append(show_data)
+    venue = db.get_or_404(Venue, venue_id)
+
+    # Past and upcoming shows are split and capped in SQL
+    shows = show_sections(
+        Show.venue_id,
+        venue_id,
+        Artist,
+        datetime.now(),
+        limit=app.config["DETAIL_SHOWS_LIMIT"],
+    )
+    page_cache.tag(
+        *(
+            f"artist:{show['artist_id']}"
+            for show in shows["past_shows"] + shows["upcoming_shows"]
+        )
+    )
 
     # Build data dict for template
     data = {
         "id": venue.id,
         "name": venue.name,
-        "genres": (
-            venue.genres.split(",") if venue.genres else []
-        ),  # Convert string back to list
+        "genres": venue.genres,
         "address": venue.address,
         "city": venue.city,
         "state": venue.state,
@@ -150,10 +192,7 @@ def show_venue(venue_id):
         "seeking_talent": venue.seeking_talent,
         "seeking_description": venue.seeking_description,
         "image_link": venue.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
+        **shows,
     }
 
     return render_template("pages/show_venue.html", venue=data)
@@ -188,7 +227,7 @@ def create_venue_submission():
             image_link=request.form.get("image_link"),
             facebook_link=request.form.get("facebook_link"),
             website=request.form.get("website_link"),
-            genres=",".join(request.form.getlist("genres")),
+            genres=request.form.getlist("genres"),
             seeking_talent=request.form.get("seeking_talent") == "y",
             seeking_description=request.form.get("seeking_description"),
         )
@@ -208,8 +247,8 @@ def create_venue_submission():
 @app.route("/venues/<venue_id>", methods=["DELETE"])
 def delete_venue(venue_id):
     try:
-        venue = Venue.query.get(venue_id)
-        db.session.delete(venue)
+        # Shows and the venue row are removed later by `flask purge`
+        soft_delete(Venue.query.get(venue_id))
         db.session.commit()
         return {"success": True}
     except Exception:
@@ -222,8 +261,7 @@ def delete_venue(venue_id):
 @app.route("/venues/<venue_id>/delete", methods=["POST"])
 def delete_venue_post(venue_id):
     try:
-        venue = Venue.query.get(venue_id)
-        db.session.delete(venue)
+        soft_delete(Venue.query.get(venue_id))
         db.session.commit()
         flash("Venue deleted successfully.")
     except Exception:
@@ -237,61 +275,72 @@ def delete_venue_post(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route("/artists")
+@page_cache.cached("artists")
+@conditional(artists_version, "artists")
 def artists():
-    # Query all artists from database
-    artists = Artist.query.all()
-    # Convert to list of dicts for template
-    data = [{"id": artist.id, "name": artist.name} for artist in artists]
-    return render_template("pages/artists.html", artists=data)
+    genre = request.args.get("genre")
+    data = artist_list(genre=genre, yield_per=listing_yield_per())
+    return render_listing(
+        "pages/artists.html", artists=data, genres=GENRES, genre=genre
+    )
 
 
 @app.route("/artists/search", methods=["POST"])
+@read_only
+@statement_timeout("search")
 def search_artists():
     search_term = request.form.get("search_term", "")
-    artists = Artist.query.filter(Artist.name.ilike(f"%{search_term}%")).all()
-    now = datetime.now()
-
-    response = {
-        "count": len(artists),
-        "data": [
-            {
-                "id": a.id,
-                "name": a.name,
-                "num_upcoming_shows": len([s for s in a.shows if s.start_time > now]),
-            }
-            for a in artists
-        ],
-    }
+    page = max(request.form.get("page", 1, type=int), 1)
+    response = search(
+        Artist,
+        Show.artist_id,
+        search_term,
+        datetime.now(),
+        page=page,
+        per_page=app.config["SEARCH_PAGE_SIZE"],
+    )
     return render_template(
-        "pages/search_artists.html", results=response, search_term=search_term
+        "pages/search_artists.html",
+        results=response,
+        search_term=search_term,
+        page=page,
+        per_page=app.config["SEARCH_PAGE_SIZE"],
     )
 
 
 @app.route("/artists/<int:artist_id>")
+@page_cache.cached("artist:{artist_id}")
+@conditional(artist_version, "artist:{artist_id}", "venues")
 def show_artist(artist_id):
-    # Query artist by id
-    artist = Artist.query.get(artist_id)
-    now = datetime.now()
-
-    # Split shows into past and upcoming
-    past_shows = []
-    upcoming_shows = []
-
-    for show in artist.shows:
-        show_data = {
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "venue_image_link": show.venue.image_link,
-            "start_time": str(show.start_time),
-        }
-        if show.start_time < now:
-            past_shows.append(show_data)
-        else:
-            upcoming_shows.append(show_data)
+    # Availability, albums and their songs are each fetched in one query
+    artist = db.get_or_404(
+        Artist,
+        artist_id,
+        options=[
+            selectinload(Artist.availability),
+            selectinload(Artist.albums).selectinload(Album.songs),
+        ],
+    )
+
+    # Past and upcoming shows are split and capped in SQL
+    shows = show_sections(
+        Show.artist_id,
+        artist_id,
+        Venue,
+        datetime.now(),
+        limit=app.config["DETAIL_SHOWS_LIMIT"],
+    )
+    page_cache.tag(
+        *(
+            f"venue:{show['venue_id']}"
+            for show in shows["past_shows"] + shows["upcoming_shows"]
+        ),
+        *(f"album:{album.id}" for album in artist.albums),
+    )
 
     # Get availability windows
     availability = [
-        {"id": a.id, "start_time": str(a.start_time), "end_time": str(a.end_time)}
+        {"id": a.id, "start_time": a.start_time, "end_time": a.end_time}
         for a in artist.availability
     ]
 
@@ -310,7 +359,7 @@ def show_artist(artist_id):
     data = {
         "id": artist.id,
         "name": artist.name,
-        "genres": artist.genres.split(",") if artist.genres else [],
+        "genres": artist.genres,
         "city": artist.city,
         "state": artist.state,
         "phone": artist.phone,
@@ -319,10 +368,7 @@ def show_artist(artist_id):
         "seeking_venue": artist.seeking_venue,
         "seeking_description": artist.seeking_description,
         "image_link": artist.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
+        **shows,
         "availability": availability,
         "albums": albums,
     }
@@ -343,7 +389,7 @@ def edit_artist(artist_id):
         artist={
             "id": artist.id,
             "name": artist.name,
-            "genres": artist.genres.split(",") if artist.genres else [],
+            "genres": artist.genres,
             "city": artist.city,
             "state": artist.state,
             "phone": artist.phone,
@@ -365,7 +411,7 @@ def edit_artist_submission(artist_id):
         artist.city = request.form.get("city")
         artist.state = request.form.get("state")
         artist.phone = request.form.get("phone")
-        artist.genres = ",".join(request.form.getlist("genres"))
+        artist.genres = request.form.getlist("genres")
         artist.facebook_link = request.form.get("facebook_link")
         artist.image_link = request.form.get("image_link")
         artist.website = request.form.get("website_link")
@@ -390,10 +436,16 @@ def add_availability(artist_id):
         db.session.add(availability)
         db.session.commit()
         flash("Availability added!")
+    except DeletedParentError as e:
+        db.session.rollback()
+        flash(f"{e}. Availability could not be added.")
     except Exception as e:
         db.session.rollback()
-        print(f"ERROR: {e}")
-        flash("Error adding availability.")
+        if getattr(getattr(e, "orig", None), "pgcode", None) == EXCLUSION_VIOLATION:
+            flash("That window overlaps an existing availability window.")
+        else:
+            print(f"ERROR: {e}")
+            flash("Error adding availability.")
     finally:
         db.session.close()
     return redirect(url_for("show_artist", artist_id=artist_id))
@@ -415,6 +467,32 @@ def delete_availability(artist_id, avail_id):
     return redirect(url_for("show_artist", artist_id=artist_id))
 
 
+@app.route("/artists/<int:artist_id>/slots")
+def artist_slots(artist_id):
+    """Open slots for the artist at a venue; the search form is on the artist page."""
+    artist = db.get_or_404(Artist, artist_id)
+    venue_id, start, end, length = search_args()
+    venue = slots = None
+    if venue_id is not None:
+        venue = db.session.get(Venue, venue_id)
+        if venue is None:
+            flash(f"Venue {venue_id} does not exist.")
+        else:
+            slots = find_slots(artist_id, venue_id, start, end, length)
+    return render_template(
+        "pages/artist_slots.html",
+        artist={"id": artist.id, "name": artist.name},
+        venue=venue and {"id": venue.id, "name": venue.name},
+        search={
+            "venue_id": venue_id,
+            "from": start,
+            "to": end,
+            "length": length // timedelta(minutes=1),
+        },
+        slots=slots,
+    )
+
+
 #  Albums & Songs
 #  ----------------------------------------------------------------
 @app.route("/artists/<int:artist_id>/albums", methods=["POST"])
@@ -466,7 +544,7 @@ def edit_venue(venue_id):
         venue={
             "id": venue.id,
             "name": venue.name,
-            "genres": venue.genres.split(",") if venue.genres else [],
+            "genres": venue.genres,
             "address": venue.address,
             "city": venue.city,
             "state": venue.state,
@@ -489,7 +567,7 @@ def edit_venue_submission(venue_id):
         venue.state = request.form.get("state")
         venue.address = request.form.get("address")
         venue.phone = request.form.get("phone")
-        venue.genres = ",".join(request.form.getlist("genres"))
+        venue.genres = request.form.getlist("genres")
         venue.facebook_link = request.form.get("facebook_link")
         venue.image_link = request.form.get("image_link")
         venue.website = request.form.get("website_link")
@@ -530,7 +608,7 @@ def create_artist_submission():
             image_link=request.form.get("image_link"),
             facebook_link=request.form.get("facebook_link"),
             website=request.form.get("website_link"),
-            genres=",".join(request.form.getlist("genres")),
+            genres=request.form.getlist("genres"),
             seeking_venue=request.form.get("seeking_venue") == "y",
             seeking_description=request.form.get("seeking_description"),
         )
@@ -551,20 +629,44 @@ def create_artist_submission():
 
 
 @app.route("/shows")
+@conditional(shows_version, "shows", "venues", "artists")
 def shows():
-    shows = Show.query.all()
+    after = parse_cursor_arg("after")
+    start = parse_datetime_arg("from")
+    end = parse_datetime_arg("to")
+    per_page = parse_int_arg(
+        "per_page",
+        default=app.config["SHOWS_PAGE_SIZE"],
+        minimum=1,
+        maximum=app.config["SHOWS_MAX_PAGE_SIZE"],
+    )
+
+    # One joined query per page, keyset-paginated on (start_time, id)
+    rows, next_key = show_page(after=after, start=start, end=end, limit=per_page)
     data = [
         {
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": str(show.start_time),
+            "venue_id": row.venue_id,
+            "venue_name": row.venue_name,
+            "artist_id": row.artist_id,
+            "artist_name": row.artist_name,
+            "artist_image_link": row.artist_image_link,
+            "start_time": row.start_time,
         }
-        for show in shows
+        for row in rows
     ]
-    return render_template("pages/shows.html", shows=data)
+
+    next_url = None
+    if next_key is not None:
+        next_url = url_for(
+            "shows",
+            after=format_cursor(next_key),
+            **{
+                name: request.args[name]
+                for name in ("from", "to", "per_page")
+                if request.args.get(name)
+            },
+        )
+    return render_listing("pages/shows.html", shows=data, next_url=next_url)
 
 
 @app.route("/shows/create")
@@ -575,7 +677,7 @@ def create_shows():
 
 @app.route("/shows/create", methods=["POST"])
 def create_show_submission():
-    form = ShowForm()
+    form = ShowForm(request.form)
 
     if not form.validate():
         flash("Invalid form submission. Please check required fields.")
@@ -586,27 +688,37 @@ def create_show_submission():
         start_time_str = request.form.get("start_time")
         start_time = datetime.strptime(start_time_str, "%Y-%m-%d %H:%M:%S")
 
-        # Check artist availability
-        artist = Artist.query.get(artist_id)
-        if artist.availability:  # If artist has set availability windows
-            is_available = any(
-                avail.start_time <= start_time <= avail.end_time
-                for avail in artist.availability
-            )
-            if not is_available:
-                flash(f"Artist {artist.name} is not available at that time.")
-                return render_template("forms/new_show.html", form=form)
+        # Check artist availability with one indexed containment lookup
+        has_windows, is_available = artist_availability(artist_id, start_time)
+        if has_windows and not is_available:
+            artist = db.session.get(Artist, artist_id)
+            flash(f"Artist {artist.name} is not available at that time.")
+            return render_template("forms/new_show.html", form=form)
+
+        end_time = form.end_time.data or start_time + DEFAULT_SHOW_DURATION
+        if end_time <= start_time:
+            flash("A show must end after it starts.")
+            return render_template("forms/new_show.html", form=form)
 
         show = Show(
             venue_id=request.form.get("venue_id"),
             artist_id=artist_id,
             start_time=start_time,
+            end_time=end_time,
         )
         db.session.add(show)
         db.session.commit()
         flash("Show was successfully listed!")
+    except DeletedParentError as e:
+        db.session.rollback()
+        flash(f"{e}. Show could not be listed.")
+        return render_template("forms/new_show.html", form=form)
     except Exception as e:
         db.session.rollback()
+        # Checked by the database, so concurrent bookings cannot both win
+        if getattr(getattr(e, "orig", None), "pgcode", None) == EXCLUSION_VIOLATION:
+            flash("The venue already has a show booked at that time.")
+            return render_template("forms/new_show.html", form=form)
         print(f"ERROR: {e}")
         flash("An error occurred. Show could not be listed.")
     finally:
@@ -614,6 +726,47 @@ def create_show_submission():
     return redirect(url_for("index"))
 
 
+@app.route("/shows/batch", methods=["GET", "POST"])
+def create_shows_batch():
+    """Book many shows at once; each line is checked and reported."""
+    form = ShowBatchForm(request.form)
+    if request.method == "GET" or not form.validate():
+        return render_template("forms/new_shows.html", form=form)
+
+    rows = read_lines(form.shows.data)
+    limit = app.config["SHOW_BATCH_MAX_ROWS"]
+    if len(rows) > limit:
+        flash(f"At most {limit} shows can be booked at once.")
+        return render_template("forms/new_shows.html", form=form)
+
+    results = book_shows(rows)
+    created = sum("id" in result for result in results)
+    flash(f"{created} of {len(results)} shows were listed.")
+    return render_template(
+        "forms/new_shows.html", form=form, results=zip(rows, results)
+    )
+
+
+#  Operations
+#  ----------------------------------------------------------------
+
+
+@app.route("/status/pool")
+def pool_status():
+    return {
+        bind or "default": pool_stats(engine, app.config["DB_MAX_OVERFLOW"])
+        for bind, engine in db.engines.items()
+    }
+
+
+@app.errorhandler(OperationalError)
+def database_error(error):
+    if getattr(error.orig, "pgcode", None) != QUERY_CANCELED:
+        raise error
+    app.logger.warning("Statement timeout on %s: %s", request.path, error.orig)
+    return render_template("errors/500.html"), 503
+
+
 @app.errorhandler(404)
 def not_found_error(_error):
     return render_template("errors/404.html"), 404
@@ -634,5 +787,10 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info("errors")
 
+    if app.config["REQUEST_LOG_PATH"]:
+        request_logger.setLevel(logging.INFO)
+        request_logger.propagate = False
+        request_logger.addHandler(request_log_handler(app.config["REQUEST_LOG_PATH"]))
+
 if __name__ == "__main__":
     app.run()
@@ -0,0 +1,218 @@
+"""Bundled, fingerprinted and precompressed static assets.
+
+`flask assets build` concatenates each bundle in BUNDLES, minifies it,
+names it after a hash of its content and writes gzip (and, when the
+`brotli` package is installed, brotli) variants next to it in
+static/dist, along with a manifest of the current file names.
+
+Templates link bundles with asset_urls(name). Without a build, e.g. in
+development, that falls back to the separate source files. Built files
+are served from /assets with a far-future immutable Cache-Control, as
+their names change with their content, and in the best precompressed
+encoding the client accepts.
+
+Minification uses rcssmin and rjsmin when they are installed; otherwise
+CSS comments and whitespace are stripped and JS is only concatenated.
+Most of the JS is already minified vendor code.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+import click
+from flask import abort, current_app, request, send_file, url_for
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional
+    brotli = None
+try:
+    import rcssmin
+except ImportError:  # pragma: no cover - optional
+    rcssmin = None
+try:
+    import rjsmin
+except ImportError:  # pragma: no cover - optional
+    rjsmin = None
+
+# Bundle name: source files under static/, in load order
+BUNDLES = {
+    "main.css": [
+        "css/bootstrap.min.css",
+        "css/layout.main.css",
+        "css/main.css",
+        "css/main.responsive.css",
+        "css/main.quickfix.css",
+    ],
+    "head.js": [
+        "js/libs/modernizr-2.8.2.min.js",
+        "js/libs/moment.min.js",
+    ],
+    # Deferred: runs after jQuery, in the order the separate tags ran
+    "main.js": [
+        "js/script.js",
+        "js/libs/bootstrap-3.1.1.min.js",
+        "js/plugins.js",
+    ],
+}
+DIST = "dist"
+MANIFEST = "manifest.json"
+# Content-Encoding: file suffix, most preferred first
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    text = re.sub(r"/\*(?!!).*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    return re.sub(r"\s*([{};,>])\s*", r"\1", text).strip()
+
+
+def absolute_urls(text, source, static_url):
+    """Make the relative url()s in `source` absolute, as bundles move."""
+    base = posixpath.dirname(f"{static_url}/{source}")
+
+    def rewrite(match):
+        quote, url = match.groups()
+        if url.startswith(("/", "data:", "http:", "https:", "#")):
+            return match.group(0)
+        return f"url({quote}{posixpath.normpath(posixpath.join(base, url))}{quote})"
+
+    return re.sub(r"""url\((['"]?)([^'")]+)\1\)""", rewrite, text)
+
+
+def minify_js(text):
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+    return text
+
+
+def build_bundle(static_folder, static_url, name, sources):
+    """Write one bundle and its compressed variants; return its file name."""
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding="utf-8") as file:
+            parts.append(file.read())
+    if name.endswith(".css"):
+        content = "\n".join(
+            minify_css(absolute_urls(part, source, static_url))
+            for part, source in zip(parts, sources)
+        )
+    else:
+        # A newline and a semicolon keep files from running into each other
+        content = "\n;".join(minify_js(part) for part in parts)
+    data = content.encode()
+
+    stem, extension = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    filename = f"{stem}.{digest}{extension}"
+    path = os.path.join(static_folder, DIST, filename)
+    with open(path, "wb") as file:
+        file.write(data)
+    with open(path + ".gz", "wb") as file:
+        # mtime=0 keeps the output identical between builds
+        file.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as file:
+            file.write(brotli.compress(data, quality=11))
+    return filename
+
+
+def build(static_folder, static_url="/static"):
+    """Build every bundle, write the manifest and return it."""
+    os.makedirs(os.path.join(static_folder, DIST), exist_ok=True)
+    manifest = {
+        name: build_bundle(static_folder, static_url, name, sources)
+        for name, sources in BUNDLES.items()
+    }
+    with open(os.path.join(static_folder, DIST, MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def load_manifest(app):
+    try:
+        with open(os.path.join(app.static_folder, DIST, MANIFEST)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.manifest = load_manifest(app)
+        app.add_url_rule("/assets/<path:filename>", "assets", self.serve)
+        app.jinja_env.globals["asset_urls"] = self.urls
+        app.extensions["assets"] = self
+
+    def urls(self, name):
+        """URLs to load bundle `name`: the built file, or its sources."""
+        if name in self.manifest:
+            return [url_for("assets", filename=self.manifest[name])]
+        return [url_for("static", filename=source) for source in BUNDLES[name]]
+
+    def serve(self, filename):
+        folder = os.path.join(current_app.static_folder, DIST)
+        path = os.path.normpath(os.path.join(folder, filename))
+        if not path.startswith(folder + os.sep) or not os.path.isfile(path):
+            abort(404)
+
+        encoding = None
+        for name, suffix in ENCODINGS:
+            if name in request.accept_encodings and os.path.isfile(path + suffix):
+                encoding, path = name, path + suffix
+                break
+        response = send_file(
+            path,
+            mimetype=mimetype(filename),
+            conditional=True,
+            max_age=31536000,
+        )
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Cache-Control"] = IMMUTABLE
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+def mimetype(filename):
+    if filename.endswith(".css"):
+        return "text/css"
+    if filename.endswith(".js"):
+        return "text/javascript"
+    return None
+
+
+@click.group("assets")
+def assets_command():
+    """Build static asset bundles."""
+
+
+@assets_command.command("build")
+@with_appcontext
+def build_command():
+    """Bundle, minify, fingerprint and precompress the static assets."""
+    manifest = build(current_app.static_folder, current_app.static_url_path)
+    folder = os.path.join(current_app.static_folder, DIST)
+    for name, filename in manifest.items():
+        path = os.path.join(folder, filename)
+        sizes = [
+            f"{suffix.lstrip('.') or 'raw'} {os.path.getsize(path + suffix)}"
+            for suffix in ("", ".gz", ".br")
+            if os.path.exists(path + suffix)
+        ]
+        click.echo(f"{name} -> {filename} ({', '.join(sizes)} bytes)")
+    # Old builds stay in place so pages cached with their names still load
+    current_app.extensions["assets"].manifest = manifest
@@ -0,0 +1,84 @@
+"""Response time of the JSON API against the HTML routes serving the same data.
+
+Run from the repository root against the test database, which is created
+and dropped by the run:
+
+    python -m benchmarks.api_vs_html [--venues 200] [--shows 2000] [--repeat 20]
+
+The page cache is disabled so every request reaches the query layer.
+"""
+
+import argparse
+import os
+import timeit
+from datetime import datetime, timedelta
+
+os.environ["TEST_DATABASE"] = "true"
+os.environ["PAGE_CACHE_TYPE"] = "null"
+
+from app import app, db, Artist, Show, Venue  # noqa: E402
+
+
+def seed(venues, shows):
+    base = datetime.now() - timedelta(days=shows // 20)
+    venue_rows = [
+        Venue(name=f"Venue {i}", city=f"City {i % 20}", state="CA", address="1 St")
+        for i in range(venues)
+    ]
+    artist_rows = [
+        Artist(name=f"Artist {i}", city=f"City {i % 20}", state="CA", genres=["Jazz"])
+        for i in range(venues)
+    ]
+    db.session.add_all(venue_rows + artist_rows)
+    db.session.flush()
+    db.session.add_all(
+        Show(
+            venue_id=venue_rows[i % venues].id,
+            artist_id=artist_rows[i * 7 % venues].id,
+            start_time=base + timedelta(hours=i),
+        )
+        for i in range(shows)
+    )
+    db.session.commit()
+    return venue_rows[0].id, artist_rows[0].id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=200)
+    parser.add_argument("--shows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        try:
+            venue_id, artist_id = seed(args.venues, args.shows)
+            pairs = (
+                ("venue list", "/venues", "/api/v1/venues?limit=200"),
+                ("artist list", "/artists", "/api/v1/artists?limit=200"),
+                ("shows", "/shows?per_page=100", "/api/v1/shows?limit=100"),
+                ("venue", f"/venues/{venue_id}", f"/api/v1/venues/{venue_id}"),
+                ("artist", f"/artists/{artist_id}", f"/api/v1/artists/{artist_id}"),
+            )
+            client = app.test_client()
+            print(
+                f"{'':<12} {'html ms':>8} {'json ms':>8} {'html KB':>8} {'json KB':>8}"
+            )
+            for name, html_url, json_url in pairs:
+                times, sizes = [], []
+                for url in (html_url, json_url):
+                    sizes.append(len(client.get(url).data) / 1024)
+                    timer = timeit.Timer(lambda: client.get(url))
+                    times.append(min(timer.repeat(number=1, repeat=args.repeat)))
+                print(
+                    f"{name:<12} {times[0] * 1e3:8.2f} {times[1] * 1e3:8.2f}"
+                    f" {sizes[0]:8.1f} {sizes[1]:8.1f}"
+                )
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Per-row cost of the `datetime` Jinja filter, before and after caching.
+
+Run from the repository root:
+
+    python -m benchmarks.datetime_filter [--rows 2000] [--repeat 5]
+
+"before" replays the original filter: the view stringified the datetime,
+the filter parsed it back with dateutil and babel rebuilt the pattern.
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from filters import DATETIME_FORMATS, format_datetime, format_datetime_cached
+
+
+def legacy_format_datetime(value, format="medium"):
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(
+        date, DATETIME_FORMATS.get(format, format), locale="en"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # A listing page: a handful of shows per day, so timestamps repeat
+    base = datetime(2030, 1, 1, 19, 0)
+    times = [base + timedelta(hours=(i % 500) * 5) for i in range(args.rows)]
+
+    def before():
+        for value in times:
+            legacy_format_datetime(str(value), "full")
+
+    def after_cold():
+        format_datetime_cached.cache_clear()
+        for value in times:
+            format_datetime(value, "full")
+
+    def after_warm():
+        for value in times:
+            format_datetime(value, "full")
+
+    after_warm()
+    for name, fn in (
+        ("before", before),
+        ("after (cold cache)", after_cold),
+        ("after (warm cache)", after_warm),
+    ):
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f"{name:<20} {best / args.rows * 1e6:8.2f} us/row")
+
+
+if __name__ == "__main__":
+    main()
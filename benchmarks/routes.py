@@ -0,0 +1,204 @@
+"""Latency and throughput of every read route, as JSON.
+
+Seed the database first, then run the driver against it:
+
+    flask seed --reset --venues 50000 --artists 100000 --shows 2000000
+    python -m benchmarks.routes [--requests 200] [--output results.json]
+
+Requests go through the Flask test client, so the numbers cover the app
+and the database but not a WSGI server or the network. Entity ids are
+drawn from a random generator seeded per route (seed and route name), so
+two runs on the same dataset request the same pages, whatever routes are
+added or selected, and their results can be compared between commits.
+The page cache is off unless --cache is given. Routes that write (the
+create, edit and delete submissions, POST /shows/batch and its API) are not
+exercised, as they would change the dataset under later runs. The exports
+read a whole table per request, so they only run when named with --route,
+e.g. `--route export_venues_csv --requests 5`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+TERMS = ["Venue 1", "Artist 2", "Jazz", "Spring", "CA", "rock", "hop"]
+
+# Full-table exports, run only when named with --route
+EXPORTS = [
+    f"export_{kind}_{format}"
+    for kind in ("venues", "artists", "shows")
+    for format in ("csv", "ndjson")
+]
+
+
+def routes(venues, artists):
+    """(name, factory) pairs; factory(rng) gives (method, url, form data)."""
+    return [
+        ("index", lambda rng: ("GET", "/", None)),
+        ("venues", lambda rng: ("GET", "/venues", None)),
+        ("venues?genre", lambda rng: ("GET", "/venues?genre=Jazz", None)),
+        ("artists", lambda rng: ("GET", "/artists", None)),
+        ("shows", lambda rng: ("GET", "/shows", None)),
+        (
+            "show_venue",
+            lambda rng: ("GET", f"/venues/{rng.randint(1, venues)}", None),
+        ),
+        (
+            "show_artist",
+            lambda rng: ("GET", f"/artists/{rng.randint(1, artists)}", None),
+        ),
+        (
+            "search_venues",
+            lambda rng: ("POST", "/venues/search", {"search_term": rng.choice(TERMS)}),
+        ),
+        (
+            "search_artists",
+            lambda rng: ("POST", "/artists/search", {"search_term": rng.choice(TERMS)}),
+        ),
+        ("create_venue_form", lambda rng: ("GET", "/venues/create", None)),
+        ("create_artist_form", lambda rng: ("GET", "/artists/create", None)),
+        ("create_show_form", lambda rng: ("GET", "/shows/create", None)),
+        (
+            "edit_venue_form",
+            lambda rng: ("GET", f"/venues/{rng.randint(1, venues)}/edit", None),
+        ),
+        (
+            "edit_artist_form",
+            lambda rng: ("GET", f"/artists/{rng.randint(1, artists)}/edit", None),
+        ),
+        (
+            "artist_slots",
+            lambda rng: (
+                "GET",
+                f"/artists/{rng.randint(1, artists)}/slots"
+                f"?venue_id={rng.randint(1, venues)}",
+                None,
+            ),
+        ),
+        ("create_shows_batch_form", lambda rng: ("GET", "/shows/batch", None)),
+        ("api_venues", lambda rng: ("GET", "/api/v1/venues", None)),
+        ("api_artists", lambda rng: ("GET", "/api/v1/artists", None)),
+        ("api_shows", lambda rng: ("GET", "/api/v1/shows", None)),
+        (
+            "api_venue",
+            lambda rng: ("GET", f"/api/v1/venues/{rng.randint(1, venues)}", None),
+        ),
+        (
+            "api_artist",
+            lambda rng: ("GET", f"/api/v1/artists/{rng.randint(1, artists)}", None),
+        ),
+        (
+            "api_artist_slots",
+            lambda rng: (
+                "GET",
+                f"/api/v1/artists/{rng.randint(1, artists)}/slots"
+                f"?venue_id={rng.randint(1, venues)}",
+                None,
+            ),
+        ),
+    ] + [(name, export_request(name)) for name in EXPORTS]
+
+
+def export_request(name):
+    _, kind, format = name.split("_")
+    return lambda rng: ("GET", f"/api/v1/export/{kind}.{format}", None)
+
+
+def percentile(samples, p):
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="Per route.")
+    parser.add_argument("--warmup", type=int, default=10, help="Per route.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache", action="store_true", help="Keep the page cache.")
+    parser.add_argument("--route", action="append", help="Only these routes.")
+    parser.add_argument("--output", help="Write the JSON here instead of stdout.")
+    args = parser.parse_args()
+
+    if not args.cache:
+        os.environ["PAGE_CACHE_TYPE"] = "null"
+    from app import app, db, Artist, Show, Venue
+    from sqlalchemy import func, select
+
+    with app.app_context():
+        counts = {
+            model.__tablename__: db.session.scalar(
+                select(func.count()).select_from(model)
+            )
+            for model in (Venue, Artist, Show)
+        }
+        db.session.remove()
+    if not counts["Venue"] or not counts["Artist"]:
+        sys.exit("The database is empty; run `flask seed` first.")
+
+    client = app.test_client()
+    results = {}
+    for name, make_request in routes(counts["Venue"], counts["Artist"]):
+        skipped = (name not in args.route) if args.route else (name in EXPORTS)
+        if skipped:
+            continue
+        rng = random.Random(f"{args.seed}:{name}")
+        for _ in range(args.warmup):
+            method, url, data = make_request(rng)
+            client.open(url, method=method, data=data).get_data()
+
+        timings = []
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            method, url, data = make_request(rng)
+            request_started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            # Streamed pages and exports are only rendered as they are read
+            response.get_data()
+            timings.append((time.perf_counter() - request_started) * 1000)
+            if response.status_code != 200:
+                sys.exit(f"{method} {url} returned {response.status_code}")
+        elapsed = time.perf_counter() - started
+
+        results[name] = {
+            "requests": len(timings),
+            "throughput_rps": round(len(timings) / elapsed, 1),
+            "mean_ms": round(statistics.fmean(timings), 2),
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "p99_ms": round(percentile(timings, 99), 2),
+        }
+        print(f"{name:<20} {results[name]['p50_ms']:8.2f} ms p50", file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "dataset": counts,
+        "requests_per_route": args.requests,
+        "seed": args.seed,
+        "page_cache": args.cache,
+        "routes": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
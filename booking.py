@@ -0,0 +1,67 @@
+"""Booking many shows in one request, e.g. a whole tour.
+
+Each row is validated by ShowForm, then the batch is checked as a set by
+the importer's check_shows: a fixed number of queries for existing venues
+and artists, availability windows and clashing shows, however many rows
+there are. Accepted rows are inserted in one flush and committed in one
+transaction. Every row gets a result, in order.
+"""
+
+import csv
+import io
+
+from sqlalchemy.exc import DBAPIError
+
+from forms import ShowForm
+from importer import check_shows, show_values, validate
+from models import db, Show
+
+# end_time is optional
+FIELDS = ("artist_id", "venue_id", "start_time", "end_time")
+
+
+def read_lines(text):
+    """Rows of `artist_id, venue_id, start_time[, end_time]` lines.
+
+    Blank lines are skipped.
+    """
+    rows = []
+    for fields in csv.reader(io.StringIO(text)):
+        if not any(field.strip() for field in fields):
+            continue
+        if len(fields) not in (len(FIELDS) - 1, len(FIELDS)):
+            rows.append(ValueError("expected artist_id, venue_id, start_time"))
+        else:
+            rows.append(dict(zip(FIELDS, (field.strip() for field in fields))))
+    return rows
+
+
+def book_shows(rows):
+    """Create shows from dicts of ShowForm fields.
+
+    Rows may also be exceptions, reported as invalid. Returns one result
+    per row: {"row": n, "id": show_id} when the show was created, or
+    {"row": n, "error": message} when it was rejected.
+    """
+    batch = list(enumerate(rows, 1))
+    valid, errors = validate(ShowForm, show_values, batch)
+    if valid:
+        valid, rejected = check_shows(valid)
+        errors += rejected
+    results = {line: {"row": line, "error": message} for line, message in errors}
+
+    shows = [(line, Show(**values)) for line, values in valid]
+    if shows:
+        db.session.add_all(show for _, show in shows)
+        try:
+            db.session.flush()
+            ids = {line: show.id for line, show in shows}
+            db.session.commit()
+        except DBAPIError as error:
+            # e.g. a clashing show committed since the checks ran
+            db.session.rollback()
+            message = str(error.orig).strip().splitlines()[0]
+            ids = {}
+            results.update((line, {"row": line, "error": message}) for line, _ in shows)
+        results.update((line, {"row": line, "id": id}) for line, id in ids.items())
+    return [results[line] for line, _ in batch]
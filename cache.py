@@ -0,0 +1,363 @@
+"""Rendered-page cache with entity-tagged invalidation.
+
+Each cached page records the version of every tag it was built from, such
+as "venue:3" (one entity) or "venues" (any venue; used by listings). A
+write bumps the versions of the tags it touches, and a page whose recorded
+versions no longer match is treated as a miss. Tags are collected from the
+session on flush and bumped on commit, so every write path invalidates
+exactly the pages built from the rows it changed.
+
+The default backend is an in-process LRU with a TTL. Set PAGE_CACHE_TYPE
+to "redis" (with PAGE_CACHE_REDIS_URL) to share the cache between workers,
+or to "null" to disable it. CLI commands that write (`flask import`,
+`flask seed`) can only reach the web workers' caches through Redis; with
+the LRU they warn that workers serve stale pages for up to PAGE_CACHE_TTL.
+
+Replicas lag the primary, so a page missed right after an invalidation
+could be rendered from rows the replica has not caught up on, then stored
+under the new versions until its TTL. For REPLICA_READ_YOUR_WRITES seconds
+after a tag is bumped, its pages are rendered from the primary, and pages
+that still read a replica in that window are not stored.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import wraps
+
+from flask import Response, current_app, g, request, session
+from sqlalchemy import event, inspect, select
+from werkzeug.http import unquote_etag
+
+from models import Album, Artist, Availability, Show, Song, Venue
+from routing import primary_reads, used_replica
+
+LOCAL_INVALIDATION = (
+    "Warning: the page cache is per process (PAGE_CACHE_TYPE=lru); running"
+    " web workers serve their cached pages for up to PAGE_CACHE_TTL seconds."
+    " Use PAGE_CACHE_TYPE=redis to invalidate them from the command line."
+)
+
+
+class LRUBackend:
+    """Per-process store: LRU-evicted entries plus never-evicted counters.
+
+    Tag versions live outside the LRU: if an evicted version read back as
+    zero, pages stored before the bump would match again. They are only
+    comparable within this process, so they are kept out of ETags.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.counters = {}
+        self.bumped = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_counters(self, names):
+        with self.lock:
+            return [self.counters.get(name, 0) for name in names]
+
+    def get_bumped(self, names):
+        with self.lock:
+            return max((self.bumped.get(name, 0) for name in names), default=0)
+
+    def incr(self, names):
+        now = time.time()
+        with self.lock:
+            for name in names:
+                self.counters[name] = self.counters.get(name, 0) + 1
+                self.bumped[name] = now
+
+    def clear(self):
+        # Tag versions stay: clients may hold ETags built from them
+        with self.lock:
+            self.entries.clear()
+
+
+class RedisBackend:
+    """Store shared by every worker; needs the optional `redis` package."""
+
+    def __init__(self, url, prefix="fyyur:page:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def get_counters(self, names):
+        if not names:
+            return []
+        values = self.client.mget([self.prefix + "tag:" + name for name in names])
+        return [int(value or 0) for value in values]
+
+    def get_bumped(self, names):
+        if not names:
+            return 0
+        values = self.client.mget([self.prefix + "bumped:" + name for name in names])
+        return max(float(value or 0) for value in values)
+
+    def incr(self, names):
+        now = time.time()
+        with self.client.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.incr(self.prefix + "tag:" + name)
+                pipe.set(self.prefix + "bumped:" + name, now)
+            pipe.execute()
+
+    def clear(self):
+        tags = self.prefix + "tag:"
+        keys = [
+            key
+            for key in self.client.scan_iter(match=self.prefix + "*")
+            if not key.decode().startswith(tags)
+        ]
+        if keys:
+            self.client.delete(*keys)
+
+
+VALIDATOR_HEADERS = ("ETag", "Last-Modified", "Cache-Control")
+
+
+def cached_response(body, headers):
+    """A cached page, or 304 if the client already has its ETag."""
+    etag = headers.get("ETag")
+    if etag is not None and request.if_none_match.contains_weak(unquote_etag(etag)[0]):
+        return Response(status=304, headers=headers)
+    return Response(body, headers=headers)
+
+
+def entity_tags(obj):
+    """Tags of the pages that render `obj`."""
+    if isinstance(obj, Venue):
+        return {f"venue:{obj.id}", "venues"}
+    if isinstance(obj, Artist):
+        return {f"artist:{obj.id}", "artists"}
+    if isinstance(obj, Show):
+        return {f"venue:{obj.venue_id}", f"artist:{obj.artist_id}", "shows"}
+    if isinstance(obj, (Availability, Album)):
+        return {f"artist:{obj.artist_id}"}
+    if isinstance(obj, Song):
+        return {f"album:{obj.album_id}"}
+    return set()
+
+
+def cascade_tags(db_session, obj):
+    """Tags of the pages that render rows the database deletes with `obj`.
+
+    Foreign keys cascade deletes without loading the children, and soft
+    deletes hide them, so the shows of a venue or artist never reach the
+    session; the pages listing them are found here before the flush.
+    """
+    if isinstance(obj, Venue):
+        ids = select(Show.artist_id).where(Show.venue_id == obj.id).distinct()
+        return {"shows"} | {f"artist:{id}" for id in db_session.scalars(ids)}
+    if isinstance(obj, Artist):
+        ids = select(Show.venue_id).where(Show.artist_id == obj.id).distinct()
+        albums = select(Album.id).where(Album.artist_id == obj.id)
+        return (
+            {"shows"}
+            | {f"venue:{id}" for id in db_session.scalars(ids)}
+            | {f"album:{id}" for id in db_session.scalars(albums)}
+        )
+    if isinstance(obj, Album):
+        return {f"album:{obj.id}"}
+    return set()
+
+
+def song_artist_tags(db_session, songs):
+    """Tags of the artists whose pages list `songs`; songs only know their album."""
+    album_ids = {song.album_id for song in songs} - {None}
+    if not album_ids:
+        return set()
+    ids = select(Album.artist_id).where(Album.id.in_(album_ids)).distinct()
+    return {f"artist:{id}" for id in db_session.scalars(ids)}
+
+
+def is_soft_deleted_now(obj):
+    """Whether this flush sets `obj`'s deleted_at; its shows go with it."""
+    state = inspect(obj)
+    return "deleted_at" in state.attrs and bool(state.attrs.deleted_at.history.added)
+
+
+class PageCache:
+    def __init__(self, app=None, db=None):
+        self.backend = None
+        self.ttl = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        cache_type = app.config.get("PAGE_CACHE_TYPE", "lru")
+        if cache_type == "redis":
+            self.backend = RedisBackend(app.config["PAGE_CACHE_REDIS_URL"])
+        elif cache_type == "lru":
+            self.backend = LRUBackend(app.config.get("PAGE_CACHE_SIZE", 1024))
+        else:
+            self.backend = None
+        self.ttl = app.config.get("PAGE_CACHE_TTL", 60)
+        app.extensions["page_cache"] = self
+
+        event.listen(db.session, "before_flush", self.collect_cascades)
+        event.listen(db.session, "after_flush", self.collect_tags)
+        event.listen(db.session, "after_commit", self.invalidate_pending)
+        event.listen(db.session, "after_rollback", self.discard_pending)
+
+    @property
+    def local(self):
+        """Whether invalidations stay in this process, e.g. a CLI command's."""
+        return isinstance(self.backend, LRUBackend)
+
+    # Invalidation
+
+    def collect_cascades(self, db_session, flush_context, instances):
+        removed = list(db_session.deleted) + [
+            obj for obj in db_session.dirty if is_soft_deleted_now(obj)
+        ]
+        songs = [
+            obj
+            for obj in db_session.new | db_session.dirty | db_session.deleted
+            if isinstance(obj, Song)
+        ]
+        if self.backend is None or not (removed or songs):
+            return
+        pending = db_session.info.setdefault("page_cache_tags", set())
+        with db_session.no_autoflush:
+            for obj in removed:
+                pending |= cascade_tags(db_session, obj)
+            pending |= song_artist_tags(db_session, songs)
+
+    def collect_tags(self, db_session, flush_context):
+        pending = db_session.info.setdefault("page_cache_tags", set())
+        for obj in db_session.new | db_session.deleted:
+            pending |= entity_tags(obj)
+        for obj in db_session.dirty:
+            if db_session.is_modified(obj):
+                pending |= entity_tags(obj)
+
+    def invalidate_pending(self, db_session):
+        tags = db_session.info.pop("page_cache_tags", None)
+        if tags:
+            self.invalidate(*tags)
+
+    def discard_pending(self, db_session):
+        db_session.info.pop("page_cache_tags", None)
+
+    def invalidate(self, *tags):
+        if self.backend is not None:
+            self.backend.incr(sorted(tags))
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    # Lookup
+
+    def versions(self, tags):
+        """The current versions of `tags`, or None unless they are shared.
+
+        They move on every commit that touches the tags, whatever order
+        the transactions started in; see conditional.py. Per-process
+        versions would differ between workers and restarts, so only the
+        shared backend's are given.
+        """
+        if self.backend is None or self.local:
+            return None
+        tags = sorted(tags)
+        return tuple(zip(tags, self.backend.get_counters(tags)))
+
+    def settling(self, names):
+        """Whether any of `names` was bumped too recently to trust replicas."""
+        window = current_app.config.get("REPLICA_READ_YOUR_WRITES", 0)
+        return self.backend.get_bumped(names) > time.time() - window
+
+    def tag(self, *tags):
+        """Add tags to the page being rendered, e.g. entities it links to."""
+        if "page_cache_tags" in g:
+            g.page_cache_tags.update(tags)
+
+    def cached(self, *tags):
+        """Cache a view's rendered page under its full path.
+
+        `tags` may use the view arguments, e.g. "venue:{venue_id}". Pages
+        are not cached while flashed messages are pending, since those are
+        rendered into the page and consumed by it, nor when they are
+        streamed. Validator headers set by an inner @conditional are cached
+        with the page, so hits can still answer 304.
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if self.backend is None or "_flashes" in session:
+                    return view(**kwargs)
+
+                key = request.full_path
+                entry = self.backend.get(key)
+                if entry is not None:
+                    body, versions, headers = entry
+                    current = self.backend.get_counters(list(versions))
+                    if current == list(versions.values()):
+                        return cached_response(body, headers)
+
+                g.page_cache_tags = {tag.format(**kwargs) for tag in tags}
+                # Read versions before rendering so a write that lands
+                # while the page is built leaves it already stale
+                names = sorted(g.page_cache_tags)
+                before = dict(zip(names, self.backend.get_counters(names)))
+                settling = self.settling(names)
+                with primary_reads() if settling else nullcontext():
+                    body = view(**kwargs)
+                names = sorted(g.page_cache_tags - set(before))
+                before.update(zip(names, self.backend.get_counters(names)))
+                # Tags added while rendering could not route it to the primary
+                if used_replica() and self.settling(sorted(before)):
+                    return body
+                if isinstance(body, str):
+                    self.backend.set(key, (body, before, {}), self.ttl)
+                elif (
+                    isinstance(body, Response)
+                    and body.status_code == 200
+                    and not body.is_streamed
+                ):
+                    # Keep the validators set by @conditional with the page
+                    headers = {
+                        name: body.headers[name]
+                        for name in VALIDATOR_HEADERS
+                        if name in body.headers
+                    }
+                    entry = (body.get_data(as_text=True), before, headers)
+                    self.backend.set(key, entry, self.ttl)
+                return body
+
+            return wrapper
+
+        return decorator
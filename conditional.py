@@ -0,0 +1,64 @@
+"""Conditional GET for pages summarised by a cheap validator query.
+
+A validator returns a tuple of values (latest updated_at and row counts,
+see queries.py) that changes whenever the page would. Its hash is sent as
+a weak ETag, and a request whose If-None-Match carries it gets an empty
+304 before the view or its queries run.
+
+Timestamps and counts alone can go stale: a transaction that started
+before another but commits after it moves neither the latest updated_at
+nor any count. So with the shared (Redis) page cache, the ETag also
+covers the versions of the page's tags, which are bumped after every
+commit that touches them. The per-process LRU's versions differ between
+workers and restarts, so with it, as with the null cache, only the
+validator is used and ETags stay comparable between processes.
+
+Last-Modified is sent for information only. Deleting a row does not move
+any timestamp forward, so If-Modified-Since is not trusted to answer 304.
+"""
+
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+
+def conditional(validator, *tags):
+    """Answer 304 when the page's validator matches the client's ETag.
+
+    `validator(now, **view_args)` returns the page's version tuple, or None
+    to leave the request to the view (e.g. to 404). `tags` are page cache
+    tags, formatted with the view arguments, whose versions are part of
+    the ETag. Pages are not validated while flashed messages are pending,
+    as the page cache does.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if "_flashes" in session:
+                return view(**kwargs)
+            # Versions first: a commit in between changes the next ETag
+            page_cache = current_app.extensions["page_cache"]
+            versions = page_cache.versions([tag.format(**kwargs) for tag in tags])
+            version = validator(datetime.now(), **kwargs)
+            if version is None:
+                return view(**kwargs)
+
+            etag = hashlib.sha1(repr((versions, version)).encode()).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(**kwargs))
+                timestamps = [value for value in version if isinstance(value, datetime)]
+                if timestamps:
+                    response.last_modified = max(timestamps)
+            response.set_etag(etag, weak=True)
+            # Let browsers and proxies store the page but revalidate each use
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,94 @@
+"""Per-request statement timeouts and connection pool statistics.
+
+Each request runs under the statement_timeout budget of its kind of route
+(config.STATEMENT_TIMEOUTS), so one slow query cannot hold a connection
+indefinitely. Outside requests (CLI commands, imports, purges) statements
+run under the server's default.
+
+Pooled connections keep their timeout as a session setting, re-set only
+when a checkout needs a different one; a connection a request left with a
+short budget is reset before a CLI command uses it. Behind PgBouncer in transaction
+mode a session setting would leak to other clients, so it is set with
+SET LOCAL at the start of every transaction instead.
+"""
+
+from functools import wraps
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# SQLSTATE of a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
+
+def statement_timeout(budget):
+    """Run a view under the named STATEMENT_TIMEOUTS budget."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            return view(**kwargs)
+
+        wrapper.statement_timeout = budget
+        return wrapper
+
+    return decorator
+
+
+def request_timeout():
+    """The current request's statement_timeout in ms, or None."""
+    if not has_request_context():
+        return None
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, "statement_timeout", None)
+    if budget is None:
+        budget = "read" if request.method in ("GET", "HEAD") else "write"
+    return current_app.config["STATEMENT_TIMEOUTS"][budget]
+
+
+def set_connection_timeout(dbapi_connection, connection_record, connection_proxy):
+    # None is the server's default, which new connections start with
+    timeout = request_timeout()
+    if connection_record.info.get("statement_timeout") == timeout:
+        return
+    # Committed straight away so a later rollback cannot undo it
+    with dbapi_connection.cursor() as cursor:
+        if timeout is None:
+            cursor.execute("RESET statement_timeout")
+        else:
+            cursor.execute("SET statement_timeout = %s", (timeout,))
+    dbapi_connection.commit()
+    connection_record.info["statement_timeout"] = timeout
+
+
+def set_transaction_timeout(session, transaction, connection):
+    timeout = request_timeout()
+    if timeout is not None:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+def init_statement_timeouts(app, db):
+    if app.config.get("DB_PGBOUNCER"):
+        event.listen(db.session, "after_begin", set_transaction_timeout)
+    else:
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, "checkout", set_connection_timeout)
+
+
+def pool_stats(engine, max_overflow):
+    """Occupancy of an engine's pool; saturation 1.0 means checkouts wait."""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    capacity = pool.size() + max_overflow
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "capacity": capacity,
+        "saturation": round(pool.checkedout() / capacity, 3) if capacity else None,
+    }
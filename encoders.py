@@ -0,0 +1,21 @@
+"""JSON encoding to bytes, with orjson when it is installed."""
+
+import json
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=_default, separators=(",", ":")).encode()
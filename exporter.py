@@ -0,0 +1,90 @@
+"""Streaming export of venues, artists and shows as CSV or NDJSON.
+
+Rows are read through a server-side cursor (`yield_per`) and encoded in
+chunks as they arrive, so memory use does not depend on the table size.
+Used by the /api/v1/export endpoints and the `flask export` command.
+
+Columns are the id followed by the fields `flask import` reads, under the
+same names and in the same formats, so an export can be imported again.
+Bookkeeping columns (updated_at, deleted_at) are left out.
+"""
+
+import csv
+import io
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+
+from encoders import dumps
+from importer import field_columns
+from models import db, Artist, Show, Venue
+
+EXPORTS = {"venues": Venue, "artists": Artist, "shows": Show}
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Rows fetched per round trip and encoded into one chunk
+CHUNK_SIZE = 1000
+
+
+def export_rows(kind):
+    """Yield chunks of rows of `kind`, by id, from a server-side cursor."""
+    model = EXPORTS[kind]
+    fields = [column.label(name) for name, column in field_columns(kind)]
+    stmt = select(model.id, *fields).order_by(model.id)
+    if model is Show:
+        # Shows of soft-deleted venues and artists are left out with them
+        stmt = stmt.join(Show.venue).join(Show.artist)
+    result = db.session.execute(stmt, execution_options={"yield_per": CHUNK_SIZE})
+    yield list(result.keys())
+    yield from result.partitions()
+
+
+def csv_value(value):
+    # Same list and boolean formats the importer reads
+    if isinstance(value, list):
+        return ",".join(value)
+    if isinstance(value, bool):
+        return "y" if value else ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(next(chunks))
+    for rows in chunks:
+        writer.writerows([csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def encode_ndjson(chunks):
+    keys = next(chunks)
+    for rows in chunks:
+        yield b"".join(dumps(dict(zip(keys, row))) + b"\n" for row in rows)
+
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson}
+
+
+def export(kind, format):
+    """Generate the encoded export of `kind` as chunks of bytes."""
+    return ENCODERS[format](export_rows(kind))
+
+
+@click.command("export")
+@click.argument("kind", type=click.Choice(sorted(EXPORTS)))
+@click.argument("file", type=click.File("wb"), default="-")
+@click.option(
+    "--format", type=click.Choice(sorted(FORMATS)), default="csv", show_default=True
+)
+@with_appcontext
+def export_command(kind, file, format):
+    """Export venues, artists or shows to FILE (stdout by default)."""
+    for chunk in export(kind, format):
+        file.write(chunk)
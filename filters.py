@@ -0,0 +1,44 @@
+"""Jinja filters.
+
+`format_datetime` runs once per row on the listing and detail pages, so it
+works on datetime objects directly, compiles each babel pattern once per
+(format, locale) and memoizes formatted results in a bounded LRU; the same
+show times are rendered over and over across pages and requests.
+"""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import dateutil.parser
+from babel import Locale
+from babel.dates import parse_pattern
+
+DATETIME_FORMATS = {
+    "full": "EEEE MMMM, d, y 'at' h:mma",
+    "medium": "EE MM, dd, y h:mma",
+}
+
+# Distinct timestamps kept per process; each entry is a few hundred bytes
+DATETIME_CACHE_SIZE = 8192
+
+
+@lru_cache(maxsize=64)
+def compiled_pattern(format, locale):
+    return parse_pattern(DATETIME_FORMATS.get(format, format)), Locale.parse(locale)
+
+
+@lru_cache(maxsize=DATETIME_CACHE_SIZE)
+def format_datetime_cached(value, format, locale):
+    pattern, locale = compiled_pattern(format, locale)
+    # babel treats naive datetimes as UTC; do the same so output matches
+    # babel.dates.format_datetime
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format="medium", locale="en"):
+    if not isinstance(value, datetime):
+        # Strings are still accepted for templates that pass them in
+        value = dateutil.parser.parse(value)
+    return format_datetime_cached(value, format, locale)
@@ -6,18 +6,57 @@ from wtforms import (
     SelectMultipleField,
     DateTimeField,
     BooleanField,
+    TextAreaField,
 )
-from wtforms.validators import DataRequired
+from wtforms.validators import DataRequired, Optional
+
+GENRES = [
+    "Alternative",
+    "Blues",
+    "Classical",
+    "Country",
+    "Electronic",
+    "Folk",
+    "Funk",
+    "Hip-Hop",
+    "Heavy Metal",
+    "Instrumental",
+    "Jazz",
+    "Musical Theatre",
+    "Pop",
+    "Punk",
+    "R&B",
+    "Reggae",
+    "Rock n Roll",
+    "Soul",
+    "Other",
+]
+
+
+# The form's own format, then ISO 8601 as in JSON responses and exports
+SHOW_TIME_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"]
 
 
 class ShowForm(Form):
     artist_id = StringField("artist_id", validators=[DataRequired()])
     venue_id = StringField("venue_id", validators=[DataRequired()])
     start_time = DateTimeField(
-        "start_time", validators=[DataRequired()], default=datetime.today()
+        "start_time",
+        validators=[DataRequired()],
+        format=SHOW_TIME_FORMATS,
+        default=datetime.today(),
+    )
+    # Defaults to DEFAULT_SHOW_DURATION after the start
+    end_time = DateTimeField(
+        "end_time", validators=[Optional()], format=SHOW_TIME_FORMATS
     )
 
 
+class ShowBatchForm(Form):
+    # One show per line: artist_id, venue_id, start_time[, end_time]
+    shows = TextAreaField("shows", validators=[DataRequired()])
+
+
 class VenueForm(Form):
     name = StringField("name", validators=[DataRequired()])
     city = StringField("city", validators=[DataRequired()])
@@ -84,27 +123,7 @@ class VenueForm(Form):
     genres = SelectMultipleField(
         "genres",
         validators=[DataRequired()],
-        choices=[
-            ("Alternative", "Alternative"),
-            ("Blues", "Blues"),
-            ("Classical", "Classical"),
-            ("Country", "Country"),
-            ("Electronic", "Electronic"),
-            ("Folk", "Folk"),
-            ("Funk", "Funk"),
-            ("Hip-Hop", "Hip-Hop"),
-            ("Heavy Metal", "Heavy Metal"),
-            ("Instrumental", "Instrumental"),
-            ("Jazz", "Jazz"),
-            ("Musical Theatre", "Musical Theatre"),
-            ("Pop", "Pop"),
-            ("Punk", "Punk"),
-            ("R&B", "R&B"),
-            ("Reggae", "Reggae"),
-            ("Rock n Roll", "Rock n Roll"),
-            ("Soul", "Soul"),
-            ("Other", "Other"),
-        ],
+        choices=[(genre, genre) for genre in GENRES],
     )
     facebook_link = StringField("facebook_link")
     website_link = StringField("website_link")
@@ -179,27 +198,7 @@ class ArtistForm(Form):
     genres = SelectMultipleField(
         "genres",
         validators=[DataRequired()],
-        choices=[
-            ("Alternative", "Alternative"),
-            ("Blues", "Blues"),
-            ("Classical", "Classical"),
-            ("Country", "Country"),
-            ("Electronic", "Electronic"),
-            ("Folk", "Folk"),
-            ("Funk", "Funk"),
-            ("Hip-Hop", "Hip-Hop"),
-            ("Heavy Metal", "Heavy Metal"),
-            ("Instrumental", "Instrumental"),
-            ("Jazz", "Jazz"),
-            ("Musical Theatre", "Musical Theatre"),
-            ("Pop", "Pop"),
-            ("Punk", "Punk"),
-            ("R&B", "R&B"),
-            ("Reggae", "Reggae"),
-            ("Rock n Roll", "Rock n Roll"),
-            ("Soul", "Soul"),
-            ("Other", "Other"),
-        ],
+        choices=[(genre, genre) for genre in GENRES],
     )
     facebook_link = StringField("facebook_link")
 
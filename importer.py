@@ -0,0 +1,308 @@
+"""`flask import`: bulk-load venues, artists or shows from CSV or JSONL.
+
+Columns are named like the fields of VenueForm, ArtistForm and ShowForm,
+and every row is validated by that form. In CSV, genres are separated by
+commas inside one quoted field. Shows must also reference existing
+venues and artists, pass the artist availability check and not overlap
+another show of the same venue or artist.
+
+Valid rows are inserted with one executemany per batch and committed per
+batch. A row that fails validation, or that the database rejects, is
+reported with its line number and skipped; the rest of the batch is kept.
+"""
+
+import csv
+import json
+import time
+from collections import defaultdict
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError
+from werkzeug.datastructures import MultiDict
+
+from cache import LOCAL_INVALIDATION, entity_tags
+from forms import ArtistForm, ShowForm, VenueForm
+from models import DEFAULT_SHOW_DURATION, db, Artist, Show, Venue
+from queries import booked_shows, unavailable_shows
+
+LIST_FIELDS = {"genres"}
+
+
+def venue_values(form):
+    return {
+        "name": form.name.data,
+        "city": form.city.data,
+        "state": form.state.data,
+        "address": form.address.data,
+        "phone": form.phone.data or None,
+        "image_link": form.image_link.data or None,
+        "facebook_link": form.facebook_link.data or None,
+        "website": form.website_link.data or None,
+        "genres": form.genres.data,
+        "seeking_talent": form.seeking_talent.data,
+        "seeking_description": form.seeking_description.data or None,
+    }
+
+
+def artist_values(form):
+    return {
+        "name": form.name.data,
+        "city": form.city.data,
+        "state": form.state.data,
+        "phone": form.phone.data or None,
+        "image_link": form.image_link.data or None,
+        "facebook_link": form.facebook_link.data or None,
+        "website": form.website_link.data or None,
+        "genres": form.genres.data,
+        "seeking_venue": form.seeking_venue.data,
+        "seeking_description": form.seeking_description.data or None,
+    }
+
+
+def id_value(field):
+    # Reported like the form's own errors, e.g. to API clients
+    try:
+        return int(field.data)
+    except ValueError:
+        raise ValueError(f"{field.name}: Not a valid id.") from None
+
+
+def show_values(form):
+    start_time = form.start_time.data
+    end_time = form.end_time.data or start_time + DEFAULT_SHOW_DURATION
+    if end_time <= start_time:
+        raise ValueError("end_time: Must be after start_time.")
+    return {
+        "venue_id": id_value(form.venue_id),
+        "artist_id": id_value(form.artist_id),
+        "start_time": start_time,
+        "end_time": end_time,
+    }
+
+
+def check_shows(rows):
+    """Split (line, values) show rows into accepted rows and errors.
+
+    Runs four queries per batch whatever its size: known venue ids, known
+    artist ids, the availability check and clashes with existing shows.
+    Rows of the batch that overlap an earlier row are rejected too.
+    """
+    venue_ids = {values["venue_id"] for _, values in rows}
+    artist_ids = {values["artist_id"] for _, values in rows}
+    venues = set(db.session.scalars(select(Venue.id).where(Venue.id.in_(venue_ids))))
+    artists = set(
+        db.session.scalars(select(Artist.id).where(Artist.id.in_(artist_ids)))
+    )
+    known = [
+        (line, values)
+        for line, values in rows
+        if values["venue_id"] in venues and values["artist_id"] in artists
+    ]
+    unavailable = unavailable_shows(
+        (line, values["artist_id"], values["start_time"]) for line, values in known
+    )
+    booked = booked_shows(
+        (
+            line,
+            values["venue_id"],
+            values["artist_id"],
+            values["start_time"],
+            values["end_time"],
+        )
+        for line, values in known
+    )
+
+    accepted, errors = [], []
+    # (start, end) of the rows accepted so far, by venue and by artist
+    taken = defaultdict(list)
+    for line, values in rows:
+        start, end = values["start_time"], values["end_time"]
+        owners = (("venue", values["venue_id"]), ("artist", values["artist_id"]))
+        if values["venue_id"] not in venues:
+            errors.append((line, f"venue {values['venue_id']} does not exist"))
+        elif values["artist_id"] not in artists:
+            errors.append((line, f"artist {values['artist_id']} does not exist"))
+        elif line in unavailable:
+            errors.append(
+                (line, f"artist {values['artist_id']} is not available at that time")
+            )
+        elif line in booked or any(
+            other_start < end and start < other_end
+            for owner in owners
+            for other_start, other_end in taken[owner]
+        ):
+            errors.append((line, "the venue or artist already has a show at that time"))
+        else:
+            for owner in owners:
+                taken[owner].append((start, end))
+            accepted.append((line, values))
+    return accepted, errors
+
+
+# kind: (model, form, form -> column values, batch check)
+KINDS = {
+    "venues": (Venue, VenueForm, venue_values, None),
+    "artists": (Artist, ArtistForm, artist_values, None),
+    "shows": (Show, ShowForm, show_values, check_shows),
+}
+
+
+# Model columns filled from a form field of another name
+COLUMNS = {"website_link": "website"}
+
+
+def field_columns(kind):
+    """(form field name, mapped column) pairs a `kind` row is imported into."""
+    model, form_class, _, _ = KINDS[kind]
+    form = form_class(MultiDict(), meta={"csrf": False})
+    return [
+        (field.name, getattr(model, COLUMNS.get(field.name, field.name)))
+        for field in form
+    ]
+
+
+def formdata(row):
+    """A MultiDict as the form would receive it from a browser."""
+    data = MultiDict()
+    for name, value in row.items():
+        if value is None or name is None:
+            continue
+        if name in LIST_FIELDS and isinstance(value, str):
+            value = [item.strip() for item in value.split(",") if item.strip()]
+        if isinstance(value, bool):
+            value = "y" if value else ""
+        for item in value if isinstance(value, list) else [value]:
+            data.add(name, str(item))
+    return data
+
+
+def read_rows(file, format):
+    """Yield (line number, row dict) pairs."""
+    if format == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line, text in enumerate(file, start=1):
+            if text.strip():
+                try:
+                    row = json.loads(text)
+                except ValueError as error:
+                    yield line, error
+                    continue
+                if not isinstance(row, dict):
+                    row = ValueError("expected a JSON object")
+                yield line, row
+
+
+def validate(form_class, to_values, batch):
+    valid, errors = [], []
+    for line, row in batch:
+        if isinstance(row, Exception):
+            errors.append((line, f"invalid row: {row}"))
+            continue
+        # Rows come from files and API clients, not from a rendered form
+        form = form_class(formdata(row), meta={"csrf": False})
+        if not form.validate():
+            errors.append(
+                (
+                    line,
+                    "; ".join(
+                        f"{name}: {' '.join(messages)}"
+                        for name, messages in form.errors.items()
+                    ),
+                )
+            )
+            continue
+        try:
+            valid.append((line, to_values(form)))
+        except ValueError as error:
+            errors.append((line, str(error)))
+    return valid, errors
+
+
+def insert_batch(model, rows):
+    """Insert (line, values) rows; return the inserted rows and the errors.
+
+    The whole batch goes in one executemany. If the database rejects it,
+    rows are retried one by one in savepoints to find the bad ones.
+    """
+    stmt = insert(model).returning(model)
+    try:
+        with db.session.begin_nested():
+            inserted = db.session.scalars(stmt, [values for _, values in rows]).all()
+        return inserted, []
+    except DBAPIError:
+        inserted, errors = [], []
+        for line, values in rows:
+            try:
+                with db.session.begin_nested():
+                    inserted += db.session.scalars(stmt, [values]).all()
+            except DBAPIError as error:
+                errors.append((line, str(error.orig).strip().splitlines()[0]))
+        return inserted, errors
+
+
+def import_rows(kind, rows, batch_size, on_error):
+    """Import (line, row) pairs; return the number of rows read and imported.
+
+    Core inserts bypass the session events that invalidate cached pages,
+    so the pages of each batch's inserted rows are invalidated once it is
+    committed.
+    """
+    model, form_class, to_values, check = KINDS[kind]
+    page_cache = current_app.extensions["page_cache"]
+    read = imported = 0
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        read += len(batch)
+        valid, errors = validate(form_class, to_values, batch)
+        if check is not None and valid:
+            valid, rejected = check(valid)
+            errors += rejected
+        inserted = []
+        if valid:
+            inserted, failed = insert_batch(model, valid)
+            errors += failed
+            imported += len(inserted)
+        tags = set().union(*map(entity_tags, inserted))
+        db.session.commit()
+        if tags:
+            page_cache.invalidate(*tags)
+        for line, message in sorted(errors):
+            on_error(line, message)
+    return read, imported
+
+
+@click.command("import")
+@click.argument("kind", type=click.Choice(sorted(KINDS)))
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option(
+    "--format",
+    type=click.Choice(["csv", "jsonl"]),
+    help="Input format; defaults to the file extension, or csv.",
+)
+@click.option("--batch-size", default=1000, show_default=True, type=click.IntRange(1))
+@with_appcontext
+def import_command(kind, file, format, batch_size):
+    """Import venues, artists or shows from a CSV or JSONL FILE ("-" for stdin)."""
+    if format is None:
+        format = "jsonl" if file.name.endswith((".jsonl", ".ndjson")) else "csv"
+
+    def report(line, message):
+        click.echo(f"{file.name}:{line}: {message}", err=True)
+
+    started = time.perf_counter()
+    read, imported = import_rows(kind, read_rows(file, format), batch_size, report)
+    elapsed = time.perf_counter() - started
+    if imported and current_app.extensions["page_cache"].local:
+        click.echo(LOCAL_INVALIDATION, err=True)
+    click.echo(
+        f"Imported {imported} of {read} {kind} in {elapsed:.2f}s"
+        f" ({imported / elapsed if elapsed else 0:.0f} rows/s),"
+        f" {read - imported} rejected."
+    )
@@ -0,0 +1,103 @@
+"""Per-request timing and SQL statistics.
+
+Every request records its wall time and the number, total time and rows
+of the SQL statements it ran. They are returned in a Server-Timing header
+and, when a request log is configured, appended to it as one JSON object
+per line.
+
+The log is written by a QueueListener thread, so a slow disk never holds
+up a response.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+request_logger = logging.getLogger("fyyur.requests")
+
+
+class JSONLinesFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, separators=(",", ":"))
+
+
+def request_log_handler(path):
+    """A QueueHandler whose records are written to `path` by a thread."""
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, logging.FileHandler(path))
+    listener.start()
+    atexit.register(listener.stop)
+    # Records are encoded before they are queued, so the thread only writes
+    handler = QueueHandler(records)
+    handler.setFormatter(JSONLinesFormatter())
+    handler.listener = listener
+    return handler
+
+
+class Instrumentation:
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, "before_cursor_execute", self.before_execute)
+                event.listen(engine, "after_cursor_execute", self.after_execute)
+
+    # SQL
+
+    def before_execute(self, conn, cursor, statement, parameters, context, many):
+        conn.info["query_started"] = time.perf_counter()
+
+    def after_execute(self, conn, cursor, statement, parameters, context, many):
+        if not has_request_context() or "request_started" not in g:
+            return
+        started = conn.info.pop("query_started", None)
+        if started is not None:
+            g.db_time += time.perf_counter() - started
+        g.queries += 1
+        # Rows returned or affected; server-side cursors report -1
+        g.rows += max(cursor.rowcount, 0)
+
+    # Requests
+
+    def start(self):
+        g.request_started = time.perf_counter()
+        g.db_time = 0.0
+        g.queries = 0
+        g.rows = 0
+
+    def finish(self, response):
+        if "request_started" not in g:
+            return response
+        wall_ms = (time.perf_counter() - g.request_started) * 1000
+        db_ms = g.db_time * 1000
+        response.headers["Server-Timing"] = (
+            f"app;dur={wall_ms:.1f}, "
+            f'db;dur={db_ms:.1f};desc="{g.queries} queries, {g.rows} rows"'
+        )
+        if request_logger.handlers:
+            request_logger.info(
+                {
+                    "time": datetime.now(timezone.utc).isoformat(),
+                    "method": request.method,
+                    "path": request.full_path.rstrip("?"),
+                    "endpoint": request.endpoint,
+                    "status": response.status_code,
+                    "wall_ms": round(wall_ms, 2),
+                    "db_ms": round(db_ms, 2),
+                    "queries": g.queries,
+                    "rows": g.rows,
+                }
+            )
+        return response
@@ -0,0 +1,61 @@
+"""add updated_at columns
+
+Revision ID: 1f6d3b8e52ac
+Revises: e47c3a90f5b1
+Create Date: 2026-10-17 14:12:40.518226
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "1f6d3b8e52ac"
+down_revision = "e47c3a90f5b1"
+branch_labels = None
+depends_on = None
+
+TABLES = ["Venue", "Artist", "Show", "Availability", "Album", "Song"]
+
+# Tables whose latest change is read across all rows by the page validators
+INDEXED = ["Venue", "Artist", "Show"]
+
+
+def upgrade():
+    # now() is evaluated once by ADD COLUMN, so existing rows take the
+    # migration time without a table rewrite
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column(
+                "updated_at",
+                sa.DateTime(),
+                server_default=sa.text("now()"),
+                nullable=False,
+            ),
+        )
+
+    with op.get_context().autocommit_block():
+        for table in INDEXED:
+            op.create_index(
+                f"ix_{table}_updated_at",
+                table,
+                ["updated_at"],
+                unique=False,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in reversed(INDEXED):
+            op.drop_index(
+                f"ix_{table}_updated_at",
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
+
+    for table in reversed(TABLES):
+        op.drop_column(table, "updated_at")
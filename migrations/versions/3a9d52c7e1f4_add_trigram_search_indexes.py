@@ -0,0 +1,40 @@
+"""add trigram search indexes
+
+Revision ID: 3a9d52c7e1f4
+Revises: f886b15ec138
+Create Date: 2026-10-17 09:12:41.503218
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3a9d52c7e1f4"
+down_revision = "f886b15ec138"
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = {
+    "Venue": ("name", "city", "state", "genres"),
+    "Artist": ("name", "city", "state", "genres"),
+}
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, columns in SEARCH_COLUMNS.items():
+        for column in columns:
+            op.create_index(
+                f"ix_{table}_{column}_trgm",
+                table,
+                [column],
+                unique=False,
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+            )
+
+
+def downgrade():
+    for table, columns in SEARCH_COLUMNS.items():
+        for column in columns:
+            op.drop_index(f"ix_{table}_{column}_trgm", table_name=table)
@@ -0,0 +1,55 @@
+"""cascade deletes in the database
+
+Revision ID: 5c8e2f417a90
+Revises: 1f6d3b8e52ac
+Create Date: 2026-10-17 16:03:12.204817
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5c8e2f417a90"
+down_revision = "1f6d3b8e52ac"
+branch_labels = None
+depends_on = None
+
+# (table, column, referenced table)
+FOREIGN_KEYS = [
+    ("Show", "venue_id", "Venue"),
+    ("Show", "artist_id", "Artist"),
+    ("Availability", "artist_id", "Artist"),
+    ("Album", "artist_id", "Artist"),
+    ("Song", "album_id", "Album"),
+]
+
+
+def replace_foreign_keys(ondelete):
+    # The rows already satisfy the old keys, so the new ones are added NOT
+    # VALID and validated after the ALTERs have committed. VALIDATE scans
+    # under a SHARE UPDATE EXCLUSIVE lock, which lets writes through.
+    for table, column, referred in FOREIGN_KEYS:
+        name = f"{table}_{column}_fkey"
+        op.drop_constraint(name, table, type_="foreignkey")
+        op.create_foreign_key(
+            name,
+            table,
+            referred,
+            [column],
+            ["id"],
+            ondelete=ondelete,
+            postgresql_not_valid=True,
+        )
+    with op.get_context().autocommit_block():
+        for table, column, _ in FOREIGN_KEYS:
+            op.execute(
+                f'ALTER TABLE "{table}" VALIDATE CONSTRAINT "{table}_{column}_fkey"'
+            )
+
+
+def upgrade():
+    replace_foreign_keys("CASCADE")
+
+
+def downgrade():
+    replace_foreign_keys(None)
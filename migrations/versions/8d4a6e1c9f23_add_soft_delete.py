@@ -0,0 +1,50 @@
+"""add deleted_at for soft deletes
+
+Revision ID: 8d4a6e1c9f23
+Revises: 5c8e2f417a90
+Create Date: 2026-10-17 17:25:48.930112
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8d4a6e1c9f23"
+down_revision = "5c8e2f417a90"
+branch_labels = None
+depends_on = None
+
+TABLES = ["Venue", "Artist"]
+
+
+def upgrade():
+    # A nullable column without a default is added without a table rewrite
+    for table in TABLES:
+        op.add_column(table, sa.Column("deleted_at", sa.DateTime(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(
+                f"ix_{table}_deleted_at",
+                table,
+                ["deleted_at"],
+                unique=False,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text("deleted_at IS NOT NULL"),
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in reversed(TABLES):
+            op.drop_index(
+                f"ix_{table}_deleted_at",
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
+
+    for table in reversed(TABLES):
+        op.drop_column(table, "deleted_at")
@@ -0,0 +1,78 @@
+"""add Availability window exclusion constraint
+
+Revision ID: 9b2f6c84a1d3
+Revises: d5e8a1f3b270
+Create Date: 2026-10-17 13:40:08.615927
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9b2f6c84a1d3"
+down_revision = "d5e8a1f3b270"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    # The constraint cannot be added while windows overlap, so first merge
+    # each artist's overlapping (or touching) windows into the earliest row
+    # of the run and delete the rest.
+    op.execute(
+        """
+        WITH ordered AS (
+            SELECT id, artist_id, start_time, end_time,
+                   max(end_time) OVER (
+                       PARTITION BY artist_id ORDER BY start_time, id
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ) AS previous_end
+            FROM "Availability"
+        ), runs AS (
+            SELECT *, count(*) FILTER (
+                       WHERE previous_end IS NULL OR previous_end < start_time
+                   ) OVER (PARTITION BY artist_id ORDER BY start_time, id) AS run
+            FROM ordered
+        ), merged AS (
+            SELECT artist_id, run, min(id) AS keep_id,
+                   min(start_time) AS start_time, max(end_time) AS end_time
+            FROM runs
+            GROUP BY artist_id, run
+        ), updated AS (
+            UPDATE "Availability" a
+            SET start_time = m.start_time, end_time = m.end_time
+            FROM merged m
+            WHERE a.id = m.keep_id
+        )
+        DELETE FROM "Availability" a
+        USING runs r JOIN merged m ON m.artist_id = r.artist_id AND m.run = r.run
+        WHERE a.id = r.id AND a.id <> m.keep_id
+        """
+    )
+
+    op.drop_index(
+        "ix_Availability_artist_id_start_time_end_time", table_name="Availability"
+    )
+    # Written out by hand: op.create_exclude_constraint() only accepts
+    # plain column names, not the tsrange() expression
+    op.execute(
+        """
+        ALTER TABLE "Availability"
+        ADD CONSTRAINT "ex_Availability_artist_id_window"
+        EXCLUDE USING gist (
+            artist_id WITH =, tsrange(start_time, end_time, '[]') WITH &&
+        )
+        """
+    )
+
+
+def downgrade():
+    op.drop_constraint("ex_Availability_artist_id_window", "Availability")
+    op.create_index(
+        "ix_Availability_artist_id_start_time_end_time",
+        "Availability",
+        ["artist_id", "start_time", "end_time"],
+        unique=False,
+    )
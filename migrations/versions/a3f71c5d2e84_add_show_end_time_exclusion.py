@@ -0,0 +1,76 @@
+"""add Show end_time and venue booking exclusion constraint
+
+Revision ID: a3f71c5d2e84
+Revises: 8d4a6e1c9f23
+Create Date: 2026-10-17 19:12:37.204518
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a3f71c5d2e84"
+down_revision = "8d4a6e1c9f23"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    # Two shows at one venue at the same time cannot both be kept, and which
+    # to move or cancel is not for a migration to decide
+    duplicates = op.get_bind().execute(sa.text("""
+                SELECT venue_id, start_time, array_agg(id ORDER BY id)
+                FROM "Show"
+                GROUP BY venue_id, start_time
+                HAVING count(*) > 1
+                ORDER BY venue_id, start_time
+                LIMIT 20
+                """)).all()
+    if duplicates:
+        raise RuntimeError(
+            "Shows at the same venue and start time must be rescheduled or "
+            "deleted first: "
+            + "; ".join(
+                f"venue {venue_id} at {start_time}: shows {ids}"
+                for venue_id, start_time, ids in duplicates
+            )
+        )
+
+    # Existing shows last the default two hours (models.DEFAULT_SHOW_DURATION)
+    op.add_column("Show", sa.Column("end_time", sa.DateTime(), nullable=True))
+    op.execute("""UPDATE "Show" SET end_time = start_time + interval '2 hours'""")
+
+    # The constraint cannot be added while a venue's shows overlap, so cut
+    # each such show short at the start of the venue's next one. Start
+    # times are distinct per venue, so no show is left empty.
+    op.execute("""
+        WITH following AS (
+            SELECT id, lead(start_time) OVER (
+                       PARTITION BY venue_id ORDER BY start_time, id
+                   ) AS next_start
+            FROM "Show"
+        )
+        UPDATE "Show" s
+        SET end_time = f.next_start
+        FROM following f
+        WHERE s.id = f.id AND f.next_start < s.end_time
+        """)
+    op.alter_column("Show", "end_time", nullable=False)
+    op.create_check_constraint("ck_Show_end_time", "Show", "end_time > start_time")
+
+    # Written out by hand: op.create_exclude_constraint() only accepts
+    # plain column names, not the tsrange() expression
+    op.execute("""
+        ALTER TABLE "Show"
+        ADD CONSTRAINT "ex_Show_venue_id_booking"
+        EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)
+        """)
+
+
+def downgrade():
+    op.drop_constraint("ex_Show_venue_id_booking", "Show")
+    op.drop_constraint("ck_Show_end_time", "Show")
+    op.drop_column("Show", "end_time")
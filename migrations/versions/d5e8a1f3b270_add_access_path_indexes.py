@@ -0,0 +1,57 @@
+"""add access path indexes
+
+Revision ID: d5e8a1f3b270
+Revises: 7c41e0b9d2a6
+Create Date: 2026-10-17 11:26:54.917302
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d5e8a1f3b270"
+down_revision = "7c41e0b9d2a6"
+branch_labels = None
+depends_on = None
+
+# (name, table, columns). Venue.id DESC on the home page is served by a
+# backward scan of the primary key, so it needs no index of its own.
+INDEXES = [
+    ("ix_Show_venue_id_start_time", "Show", ["venue_id", "start_time"]),
+    ("ix_Show_artist_id_start_time", "Show", ["artist_id", "start_time"]),
+    (
+        "ix_Availability_artist_id_start_time_end_time",
+        "Availability",
+        ["artist_id", "start_time", "end_time"],
+    ),
+    ("ix_Album_artist_id", "Album", ["artist_id"]),
+    ("ix_Song_album_id", "Song", ["album_id"]),
+    ("ix_Venue_state_city_id", "Venue", ["state", "city", "id"]),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction. If a build
+    # fails it leaves an INVALID index behind; if_not_exists would then skip
+    # it, so drop any invalid index before re-running.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
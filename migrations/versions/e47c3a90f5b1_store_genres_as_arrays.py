@@ -0,0 +1,74 @@
+"""store genres as arrays
+
+Revision ID: e47c3a90f5b1
+Revises: 9b2f6c84a1d3
+Create Date: 2026-10-17 15:02:33.184772
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "e47c3a90f5b1"
+down_revision = "9b2f6c84a1d3"
+branch_labels = None
+depends_on = None
+
+TABLES = ("Venue", "Artist")
+
+
+def upgrade():
+    for table in TABLES:
+        op.drop_index(f"ix_{table}_genres_trgm", table_name=table)
+        op.add_column(
+            table,
+            sa.Column(
+                "genre_list",
+                postgresql.ARRAY(sa.String()),
+                server_default="{}",
+                nullable=False,
+            ),
+        )
+        # Split the comma-joined strings, dropping blanks and whitespace
+        op.execute(
+            f"""
+            UPDATE "{table}" SET genre_list = ARRAY(
+                SELECT btrim(genre)
+                FROM unnest(string_to_array(genres, ',')) AS genre
+                WHERE btrim(genre) <> ''
+            )
+            WHERE genres IS NOT NULL
+            """
+        )
+        op.drop_column(table, "genres")
+        op.alter_column(table, "genre_list", new_column_name="genres")
+        op.create_index(
+            f"ix_{table}_genres",
+            table,
+            ["genres"],
+            unique=False,
+            postgresql_using="gin",
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(f"ix_{table}_genres", table_name=table)
+        op.alter_column(
+            table,
+            "genres",
+            type_=sa.String(length=120),
+            server_default=None,
+            nullable=True,
+            postgresql_using="left(array_to_string(genres, ','), 120)",
+        )
+        op.create_index(
+            f"ix_{table}_genres_trgm",
+            table,
+            ["genres"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={"genres": "gin_trgm_ops"},
+        )
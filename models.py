@@ -1,10 +1,63 @@
+from datetime import timedelta
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event, text
+from sqlalchemy.dialects.postgresql import ARRAY, ExcludeConstraint
+
+from routing import RoutingSession
+
+# Read-only requests may read from replicas; see routing.py
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+# Extensions the indexes below depend on; migrations create them as well
+for extension in ("pg_trgm", "btree_gist"):
+    event.listen(
+        db.metadata,
+        "before_create",
+        DDL(f"CREATE EXTENSION IF NOT EXISTS {extension}"),
+    )
+
 
-db = SQLAlchemy()
+def trigram_index(table, column):
+    return db.Index(
+        f"ix_{table}_{column}_trgm",
+        column,
+        postgresql_using="gin",
+        postgresql_ops={column: "gin_trgm_ops"},
+    )
+
+
+def updated_at_column():
+    # Set on insert and by every ORM update; conditional GETs compare it
+    return db.Column(
+        db.DateTime,
+        nullable=False,
+        default=db.func.now(),
+        server_default=db.func.now(),
+        onupdate=db.func.now(),
+    )
+
+
+def tombstone_index(table):
+    # Only soft-deleted rows, for the purge to find; live rows cost nothing
+    return db.Index(
+        f"ix_{table}_deleted_at",
+        "deleted_at",
+        postgresql_where=text("deleted_at IS NOT NULL"),
+    )
 
 
 class Venue(db.Model):
     __tablename__ = "Venue"
+    __table_args__ = (
+        trigram_index("Venue", "name"),
+        trigram_index("Venue", "city"),
+        trigram_index("Venue", "state"),
+        db.Index("ix_Venue_genres", "genres", postgresql_using="gin"),
+        db.Index("ix_Venue_state_city_id", "state", "city", "id"),
+        db.Index("ix_Venue_updated_at", "updated_at"),
+        tombstone_index("Venue"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -14,74 +67,162 @@ class Venue(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.Column(
+        ARRAY(db.String), nullable=False, default=list, server_default="{}"
+    )
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = updated_at_column()
+    deleted_at = db.Column(db.DateTime)  # Soft deleted; see soft_delete.py
+    # Shows are deleted by the foreign key, not loaded and deleted one by one
     shows = db.relationship(
-        "Show", backref="venue", lazy=True, cascade="all, delete-orphan"
+        "Show",
+        backref="venue",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
 class Artist(db.Model):
     __tablename__ = "Artist"
+    __table_args__ = (
+        trigram_index("Artist", "name"),
+        trigram_index("Artist", "city"),
+        trigram_index("Artist", "state"),
+        db.Index("ix_Artist_genres", "genres", postgresql_using="gin"),
+        db.Index("ix_Artist_updated_at", "updated_at"),
+        tombstone_index("Artist"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.Column(
+        ARRAY(db.String), nullable=False, default=list, server_default="{}"
+    )
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = updated_at_column()
+    deleted_at = db.Column(db.DateTime)
     shows = db.relationship(
-        "Show", backref="artist", lazy=True, cascade="all, delete-orphan"
+        "Show",
+        backref="artist",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
+# How long a show listed without an end time takes its venue
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
+
+def default_end_time(context):
+    return context.get_current_parameters()["start_time"] + DEFAULT_SHOW_DURATION
+
+
 class Show(db.Model):
     __tablename__ = "Show"
+    # A venue hosts one show at a time; shows may follow back to back. The
+    # constraint's GiST index also answers "what is on at the venue then".
+    __table_args__ = (
+        db.Index("ix_Show_start_time_id", "start_time", "id"),
+        db.Index("ix_Show_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_Show_artist_id_start_time", "artist_id", "start_time"),
+        db.Index("ix_Show_updated_at", "updated_at"),
+        # Empty ranges overlap nothing, so would escape the exclusion
+        db.CheckConstraint("end_time > start_time", name="ck_Show_end_time"),
+        ExcludeConstraint(
+            ("venue_id", "="),
+            (text("tsrange(start_time, end_time)"), "&&"),
+            name="ex_Show_venue_id_booking",
+            using="gist",
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"), nullable=False)
-    artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"), nullable=False)
+    venue_id = db.Column(
+        db.Integer, db.ForeignKey("Venue.id", ondelete="CASCADE"), nullable=False
+    )
+    artist_id = db.Column(
+        db.Integer, db.ForeignKey("Artist.id", ondelete="CASCADE"), nullable=False
+    )
     start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+    updated_at = updated_at_column()
 
 
 class Availability(db.Model):
     __tablename__ = "Availability"
+    # Windows are closed ranges. The constraint's GiST index also answers
+    # "which window contains T" for an artist.
+    __table_args__ = (
+        ExcludeConstraint(
+            ("artist_id", "="),
+            (text("tsrange(start_time, end_time, '[]')"), "&&"),
+            name="ex_Availability_artist_id_window",
+            using="gist",
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"), nullable=False)
+    artist_id = db.Column(
+        db.Integer, db.ForeignKey("Artist.id", ondelete="CASCADE"), nullable=False
+    )
     start_time = db.Column(db.DateTime, nullable=False)  # Available from
     end_time = db.Column(db.DateTime, nullable=False)  # Available until
+    updated_at = updated_at_column()
     artist = db.relationship(
         "Artist",
-        backref=db.backref("availability", lazy=True, cascade="all, delete-orphan"),
+        backref=db.backref(
+            "availability",
+            lazy=True,
+            cascade="all, delete-orphan",
+            passive_deletes=True,
+        ),
     )
 
 
 class Album(db.Model):
     __tablename__ = "Album"
+    __table_args__ = (db.Index("ix_Album_artist_id", "artist_id"),)
 
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"), nullable=False)
+    artist_id = db.Column(
+        db.Integer, db.ForeignKey("Artist.id", ondelete="CASCADE"), nullable=False
+    )
     name = db.Column(db.String(120), nullable=False)
     year = db.Column(db.Integer)
+    updated_at = updated_at_column()
     artist = db.relationship(
-        "Artist", backref=db.backref("albums", lazy=True, cascade="all, delete-orphan")
+        "Artist",
+        backref=db.backref(
+            "albums", lazy=True, cascade="all, delete-orphan", passive_deletes=True
+        ),
     )
     songs = db.relationship(
-        "Song", backref="album", lazy=True, cascade="all, delete-orphan"
+        "Song",
+        backref="album",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
 class Song(db.Model):
     __tablename__ = "Song"
+    __table_args__ = (db.Index("ix_Song_album_id", "album_id"),)
 
     id = db.Column(db.Integer, primary_key=True)
-    album_id = db.Column(db.Integer, db.ForeignKey("Album.id"), nullable=False)
+    album_id = db.Column(
+        db.Integer, db.ForeignKey("Album.id", ondelete="CASCADE"), nullable=False
+    )
     name = db.Column(db.String(120), nullable=False)
+    updated_at = updated_at_column()
@@ -0,0 +1,522 @@
+"""Read-side queries shared by the views.
+
+Each function issues a fixed number of SQL statements regardless of how
+much data the entities involved have, and returns plain dicts/tuples in the
+shape the templates expect.
+"""
+
+from itertools import groupby
+
+from sqlalchemy import (
+    DateTime,
+    and_,
+    Integer,
+    case,
+    column,
+    exists,
+    false,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    true,
+    tuple_,
+    union_all,
+    values,
+)
+
+from forms import GENRES
+from models import db, Album, Artist, Availability, Show, Song, Venue
+
+
+def columns(model):
+    """Every column of `model` as mapped attributes.
+
+    Unlike `model.__table__.columns`, these make the statement an ORM one,
+    which the soft delete scope (see soft_delete.py) applies to.
+    """
+    return [getattr(model, column.key) for column in model.__table__.columns]
+
+
+def counterpart(fk_column):
+    """The model on the other side of a show from the owner `fk_column` refers to."""
+    return Artist if fk_column.key == "venue_id" else Venue
+
+
+def upcoming_show_counts(fk_column, now):
+    """Subquery of (fk, num_upcoming_shows) for shows starting after now.
+
+    The counterpart is joined so shows of soft-deleted ones are not counted.
+    """
+    other = counterpart(fk_column)
+    other_fk = Show.artist_id if other is Artist else Show.venue_id
+    return (
+        select(fk_column.label("owner_id"), func.count().label("num_upcoming_shows"))
+        .join(other, other.id == other_fk)
+        .where(Show.start_time > now)
+        .group_by(fk_column)
+        .subquery()
+    )
+
+
+def fetch(stmt, yield_per=None):
+    """Execute `stmt`; with `yield_per`, stream rows from a server-side cursor."""
+    if yield_per:
+        stmt = stmt.execution_options(yield_per=yield_per)
+    return db.session.execute(stmt)
+
+
+def venue_areas(now, genre=None, yield_per=None):
+    """Venues grouped by (city, state) with their upcoming show counts.
+
+    A single GROUP BY query; only upcoming shows are read, so the cost does
+    not grow with show history. `genre` keeps venues listing that genre,
+    answered by the GIN index on Venue.genres.
+
+    With `yield_per` the areas and their venues are generated lazily from
+    a server-side cursor, for streamed pages; each area's venues must be
+    consumed before the next area.
+    """
+    upcoming = upcoming_show_counts(Show.venue_id, now)
+    stmt = (
+        select(
+            Venue.id,
+            Venue.name,
+            Venue.city,
+            Venue.state,
+            func.coalesce(upcoming.c.num_upcoming_shows, 0),
+        )
+        .outerjoin(upcoming, upcoming.c.owner_id == Venue.id)
+        .order_by(Venue.state, Venue.city, Venue.id)
+    )
+    if genre:
+        stmt = stmt.where(Venue.genres.contains([genre]))
+    rows = fetch(stmt, yield_per)
+
+    collect = iter if yield_per else list
+    areas = (
+        {
+            "city": city,
+            "state": state,
+            "venues": collect(
+                {"id": venue_id, "name": name, "num_upcoming_shows": num_upcoming}
+                for venue_id, name, _, _, num_upcoming in venues
+            ),
+        }
+        for (state, city), venues in groupby(rows, key=lambda row: (row[3], row[2]))
+    )
+    return areas if yield_per else list(areas)
+
+
+def artist_list(genre=None, yield_per=None):
+    """All artists by id, optionally only those listing `genre`.
+
+    With `yield_per` they are generated lazily from a server-side cursor.
+    """
+    stmt = select(Artist.id, Artist.name).order_by(Artist.id)
+    if genre:
+        stmt = stmt.where(Artist.genres.contains([genre]))
+    artists = (
+        {"id": artist_id, "name": name} for artist_id, name in fetch(stmt, yield_per)
+    )
+    return artists if yield_per else list(artists)
+
+
+def entity_page(model, fk_column, now, genre=None, after=None, limit=50):
+    """One page of venues or artists ordered by id, for the JSON API.
+
+    `after` is the last id of the previous page, so each page is a range
+    scan of the primary key. Returns the rows as dicts with every column
+    plus num_upcoming_shows, and the id to pass as `after` next, or None
+    on the last page.
+    """
+    upcoming = upcoming_show_counts(fk_column, now)
+    stmt = (
+        select(
+            *columns(model),
+            func.coalesce(upcoming.c.num_upcoming_shows, 0).label("num_upcoming_shows"),
+        )
+        .outerjoin(upcoming, upcoming.c.owner_id == model.id)
+        .order_by(model.id)
+        .limit(limit + 1)
+    )
+    if genre:
+        stmt = stmt.where(model.genres.contains([genre]))
+    if after is not None:
+        stmt = stmt.where(model.id > after)
+    rows = [dict(row) for row in db.session.execute(stmt).mappings()]
+
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_key = rows[-1]["id"]
+    return rows, next_key
+
+
+def escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search(model, fk_column, term, now, page=1, per_page=20):
+    """Rank `model` rows matching `term` in name, city, state or genres.
+
+    Name, city and state are matched with ILIKE through their trigram GIN
+    indexes. Genres are matched against the genre vocabulary: every known
+    genre containing the term (plus the term itself) is looked up through
+    the GIN index on the genres array. Ranking uses word similarity, with
+    name matches weighted highest. Returns the total number of matches and
+    one page of results, both from a single query.
+    """
+    pattern = f"%{escape_like(term)}%"
+    genres = [genre for genre in GENRES if term.lower() in genre.lower()]
+    if term and term not in genres:
+        genres.append(term)
+    genre_match = model.genres.overlap(genres)
+    term = literal(term)
+    upcoming = upcoming_show_counts(fk_column, now)
+    rank = func.greatest(
+        func.word_similarity(term, model.name),
+        case((genre_match, 0.8), else_=0.0),
+        0.6 * func.word_similarity(term, model.city),
+        0.6 * func.word_similarity(term, model.state),
+    )
+    stmt = (
+        select(
+            model.id,
+            model.name,
+            func.coalesce(upcoming.c.num_upcoming_shows, 0),
+            func.count().over(),
+        )
+        .outerjoin(upcoming, upcoming.c.owner_id == model.id)
+        .where(
+            or_(
+                *(
+                    column.ilike(pattern, escape="\\")
+                    for column in (model.name, model.city, model.state)
+                ),
+                genre_match,
+            )
+        )
+        .order_by(rank.desc(), model.name, model.id)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    )
+    rows = db.session.execute(stmt).all()
+
+    return {
+        "count": rows[0][3] if rows else 0,
+        "data": [
+            {"id": entity_id, "name": name, "num_upcoming_shows": num_upcoming}
+            for entity_id, name, num_upcoming, _ in rows
+        ],
+    }
+
+
+def show_page(after=None, start=None, end=None, limit=30):
+    """One page of shows ordered by (start_time, id), with venue and artist.
+
+    `after` is the (start_time, id) key of the last show on the previous
+    page; `start`/`end` bound start_time. All three become range conditions
+    on the (start_time, id) index. Returns the rows and the key to pass as
+    `after` for the next page, or None on the last page.
+    """
+    stmt = (
+        select(
+            Show.id,
+            Show.start_time,
+            Show.venue_id,
+            Venue.name.label("venue_name"),
+            Show.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id)
+        .order_by(Show.start_time, Show.id)
+        .limit(limit + 1)
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(Show.start_time, Show.id) > tuple_(*after))
+    if start is not None:
+        stmt = stmt.where(Show.start_time >= start)
+    if end is not None:
+        stmt = stmt.where(Show.start_time < end)
+    rows = db.session.execute(stmt).all()
+
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_key = (rows[-1].start_time, rows[-1].id)
+    return rows, next_key
+
+
+def show_sections(owner_column, owner_id, other, now, limit=30):
+    """Past and upcoming shows of one venue or artist, for its detail page.
+
+    `owner_column` is Show.venue_id or Show.artist_id and `other` the model
+    on the other side of the show, whose id, name and image are returned
+    under `<other>_*` keys. Each section is capped at `limit` rows (soonest
+    upcoming, most recent past first) by two LIMITed range scans of the
+    (owner, start_time) index; the section totals come from a second
+    query, so the page costs the same however many shows there are.
+    """
+    prefix = other.__tablename__.lower()
+    other_fk = getattr(Show, f"{prefix}_id")
+    base = (
+        select(
+            Show.start_time,
+            other_fk.label(f"{prefix}_id"),
+            other.name.label(f"{prefix}_name"),
+            other.image_link.label(f"{prefix}_image_link"),
+        )
+        .join(other, other.id == other_fk)
+        .where(owner_column == owner_id)
+    )
+    upcoming = (
+        base.add_columns(false().label("past"))
+        .where(Show.start_time >= now)
+        .order_by(Show.start_time)
+        .limit(limit)
+    )
+    past = (
+        base.add_columns(true().label("past"))
+        .where(Show.start_time < now)
+        .order_by(Show.start_time.desc())
+        .limit(limit)
+    )
+    # Joined like the listed shows, so the totals match them
+    counts = (
+        select(
+            func.count().filter(Show.start_time < now),
+            func.count().filter(Show.start_time >= now),
+        )
+        .select_from(Show)
+        .join(other, other.id == other_fk)
+        .where(owner_column == owner_id)
+    )
+
+    past_count, upcoming_count = db.session.execute(counts).one()
+    past_shows, upcoming_shows = [], []
+    for row in db.session.execute(union_all(upcoming, past)).mappings():
+        show = dict(row)
+        (past_shows if show.pop("past") else upcoming_shows).append(show)
+    # UNION ALL does not promise to keep each branch's order
+    upcoming_shows.sort(key=lambda show: show["start_time"])
+    past_shows.sort(key=lambda show: show["start_time"], reverse=True)
+
+    return {
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": past_count,
+        "upcoming_shows_count": upcoming_count,
+    }
+
+
+# Same expression as the Availability exclusion constraint, so its GiST
+# index can serve containment lookups
+AVAILABILITY_WINDOW = func.tsrange(
+    Availability.start_time, Availability.end_time, literal_column("'[]'")
+)
+
+
+def artist_availability(artist_id, at):
+    """Return (has_windows, is_available_at) for an artist in one query.
+
+    Artists without any availability windows can be booked at any time.
+    """
+    own = Availability.artist_id == artist_id
+    return db.session.execute(
+        select(
+            exists().where(own),
+            exists().where(own, AVAILABILITY_WINDOW.op("@>")(at)),
+        )
+    ).one()
+
+
+def unavailable_shows(candidates):
+    """Keys of (key, artist_id, start_time) candidates the artist can't play.
+
+    The set-based form of artist_availability, for checking a batch of
+    shows in one query.
+    """
+    # An empty VALUES list is a syntax error; candidates may be a generator
+    candidates = list(candidates)
+    if not candidates:
+        return set()
+    rows = values(
+        column("key", Integer),
+        column("artist_id", Integer),
+        column("start_time", DateTime),
+        name="candidate",
+    ).data(candidates)
+    own = Availability.artist_id == rows.c.artist_id
+    stmt = select(rows.c.key).where(
+        exists().where(own),
+        ~exists().where(own, AVAILABILITY_WINDOW.op("@>")(rows.c.start_time)),
+    )
+    return set(db.session.scalars(stmt))
+
+
+# Same expression as the Show exclusion constraint, for its GiST index
+SHOW_TIMES = func.tsrange(Show.start_time, Show.end_time)
+
+
+def show_overlaps(venue_id, artist_id, start, end):
+    """Live shows of the venue or of the artist that overlap [start, end).
+
+    The venue side is answered by the exclusion constraint's index, the
+    artist side by (artist_id, start_time). Shows are joined to their venue
+    so that those of a soft-deleted venue free the artist at once. Shows
+    of a soft-deleted artist still hold their venue's time: the exclusion
+    constraint keeps them until `flask purge`.
+    """
+    return (
+        select(Show.start_time, Show.end_time)
+        .join(Show.venue)
+        .where(
+            or_(
+                and_(
+                    Show.venue_id == venue_id,
+                    SHOW_TIMES.op("&&")(func.tsrange(start, end)),
+                ),
+                and_(
+                    Show.artist_id == artist_id,
+                    Show.start_time < end,
+                    Show.end_time > start,
+                ),
+            )
+        )
+    )
+
+
+def booked_shows(candidates):
+    """Keys of candidates that overlap a show of the same venue or artist.
+
+    Candidates are (key, venue_id, artist_id, start_time, end_time) rows,
+    checked in one query for the whole batch.
+    """
+    candidates = list(candidates)
+    if not candidates:
+        return set()
+    rows = values(
+        column("key", Integer),
+        column("venue_id", Integer),
+        column("artist_id", Integer),
+        column("start_time", DateTime),
+        column("end_time", DateTime),
+        name="candidate",
+    ).data(candidates)
+    overlaps = show_overlaps(
+        rows.c.venue_id, rows.c.artist_id, rows.c.start_time, rows.c.end_time
+    )
+    stmt = select(rows.c.key).where(overlaps.exists())
+    return set(db.session.scalars(stmt))
+
+
+def availability_windows(artist_id, start, end):
+    """(start_time, end_time) of an artist's windows overlapping [start, end].
+
+    Sorted by start time. The overlap test uses the exclusion constraint's
+    GiST index. None when the artist has no windows at all, and so can be
+    booked at any time.
+    """
+    own = Availability.artist_id == artist_id
+    stmt = (
+        select(Availability.start_time, Availability.end_time)
+        .where(
+            own,
+            AVAILABILITY_WINDOW.op("&&")(
+                func.tsrange(start, end, literal_column("'[]'"))
+            ),
+        )
+        .order_by(Availability.start_time)
+    )
+    windows = [tuple(row) for row in db.session.execute(stmt)]
+    if not windows and not db.session.scalar(select(exists().where(own))):
+        return None
+    return windows
+
+
+def booked_times(venue_id, artist_id, start, end):
+    """Sorted (start_time, end_time) of the venue's and artist's shows in range."""
+    stmt = show_overlaps(venue_id, artist_id, start, end).order_by(Show.start_time)
+    return [tuple(row) for row in db.session.execute(stmt)]
+
+
+# Page validators. Each reads, in one statement, the latest updated_at and
+# the row count of everything a page is built from; counts catch deletes,
+# which leave no timestamp behind. They return None when the page's own
+# entity does not exist. Soft-deleted rows are counted too: deleting one
+# moves updated_at anyway, and filtering them out would turn the counts'
+# index-only scans into table scans.
+
+
+def latest_change(model, *criteria):
+    """Scalar subqueries for max(updated_at) and count(*) of matching rows."""
+    return (
+        select(func.max(model.updated_at)).where(*criteria).scalar_subquery(),
+        select(func.count()).select_from(model).where(*criteria).scalar_subquery(),
+    )
+
+
+def run_validator(*columns):
+    stmt = select(*columns).execution_options(include_deleted=True)
+    return tuple(db.session.execute(stmt).one())
+
+
+def venues_version(now):
+    # Upcoming counts change as shows start, so count the upcoming range
+    return run_validator(
+        *latest_change(Venue),
+        *latest_change(Show, Show.start_time > now),
+    )
+
+
+def artists_version(now):
+    return run_validator(*latest_change(Artist))
+
+
+def shows_version(now):
+    return run_validator(
+        *latest_change(Show),
+        select(func.max(Venue.updated_at)).scalar_subquery(),
+        select(func.max(Artist.updated_at)).scalar_subquery(),
+    )
+
+
+def detail_version(model, entity_id, owner_column, other, now, *related):
+    """Validator for a venue or artist page and the shows listed on it.
+
+    Any change to an entity on the other side of its shows changes the
+    version, since their names and images are rendered on the page.
+    """
+    version = run_validator(
+        select(model.updated_at).where(model.id == entity_id).scalar_subquery(),
+        *latest_change(Show, owner_column == entity_id),
+        # Shows move from upcoming to past as time passes
+        select(func.count())
+        .where(owner_column == entity_id, Show.start_time < now)
+        .scalar_subquery(),
+        select(func.max(other.updated_at)).scalar_subquery(),
+        *related,
+    )
+    return None if version[0] is None else version
+
+
+def venue_version(now, venue_id):
+    return detail_version(Venue, venue_id, Show.venue_id, Artist, now)
+
+
+def artist_version(now, artist_id):
+    songs = Song.album_id.in_(select(Album.id).where(Album.artist_id == artist_id))
+    return detail_version(
+        Artist,
+        artist_id,
+        Show.artist_id,
+        Venue,
+        now,
+        *latest_change(Availability, Availability.artist_id == artist_id),
+        *latest_change(Album, Album.artist_id == artist_id),
+        *latest_change(Song, songs),
+    )
@@ -0,0 +1,54 @@
+"""Query string parsing shared by the HTML views and the JSON API.
+
+Malformed values abort with 400 rather than being ignored.
+"""
+
+from datetime import datetime
+
+from flask import abort, request
+
+
+def parse_datetime_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+
+def parse_int_arg(name, default=None, minimum=None, maximum=None):
+    # An empty value, as a blank form field submits, means the default
+    raw = request.args.get(name)
+    if not raw:
+        value = default
+    else:
+        try:
+            value = int(raw)
+        except ValueError:
+            abort(400)
+    if value is None:
+        return None
+    if minimum is not None and value < minimum:
+        abort(400)
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+
+def format_cursor(key):
+    # Show cursors are "<start_time isoformat>_<show id>"
+    start_time, show_id = key
+    return f"{start_time.isoformat()}_{show_id}"
+
+
+def parse_cursor_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        start_time, show_id = value.rsplit("_", 1)
+        return datetime.fromisoformat(start_time), int(show_id)
+    except ValueError:
+        abort(400)
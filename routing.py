@@ -0,0 +1,118 @@
+"""Send the reads of read-only requests to replica binds.
+
+Replicas are the SQLALCHEMY_BINDS whose key starts with "replica" (see
+DATABASE_REPLICA_URLS in config.py). A request reads from one of them,
+picked at random, when it is a GET/HEAD or a view marked @read_only, and
+the session has not written anything. Everything else goes to the
+primary: writes, SELECT ... FOR UPDATE, raw SQL, CLI commands.
+
+A client that has just written reads from the primary for
+REPLICA_READ_YOUR_WRITES seconds, tracked in its session cookie, so the
+page it is redirected to shows its change despite replica lag. Writes
+are noticed on flush and, for bulk statements that bypass the unit of
+work (imports, purges), when they are executed.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import CompoundSelect, Select, event
+
+REPLICA_PREFIX = "replica"
+
+
+def read_only(view):
+    """Let a view that is not a GET read from a replica, e.g. a search form."""
+
+    @wraps(view)
+    def wrapper(**kwargs):
+        return view(**kwargs)
+
+    wrapper.read_only = True
+    return wrapper
+
+
+def is_read_only_request():
+    if not has_request_context():
+        return False
+    if request.method not in ("GET", "HEAD"):
+        view = current_app.view_functions.get(request.endpoint)
+        if not getattr(view, "read_only", False):
+            return False
+    if g.get("read_primary"):
+        return False
+    return session.get("read_primary_until", 0) < time.time()
+
+
+@contextmanager
+def primary_reads():
+    """Send the reads made inside the block to the primary."""
+    g.read_primary = True
+    try:
+        yield
+    finally:
+        g.pop("read_primary", None)
+
+
+def used_replica():
+    """Whether this request has read from a replica."""
+    return g.get("replica_bind") is not None
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.reads_from_replica(clause):
+            engines = self._db.engines
+            if "replica_bind" not in g:
+                replicas = [key for key in engines if is_replica(key)]
+                g.replica_bind = random.choice(replicas) if replicas else None
+            if g.replica_bind is not None:
+                return engines[g.replica_bind]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def reads_from_replica(self, clause):
+        # Once anything has gone to the primary, later reads follow it.
+        # ORM-enabled UNIONs arrive without a clause; every write has one.
+        if self._flushing or (
+            clause is not None
+            and (
+                not isinstance(clause, (Select, CompoundSelect))
+                or clause._for_update_arg is not None
+            )
+        ):
+            self.info["pinned"] = True
+        return not self.info.get("pinned") and is_read_only_request()
+
+
+def is_replica(bind_key):
+    return bind_key is not None and bind_key.startswith(REPLICA_PREFIX)
+
+
+def note_write(db_session, flush_context):
+    db_session.info["wrote"] = True
+
+
+def note_bulk_write(orm_execute_state):
+    if (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        orm_execute_state.session.info["wrote"] = True
+
+
+def remember_write(db_session):
+    """Keep this client's reads on the primary for a while after a write."""
+    if has_request_context() and db_session.info.pop("wrote", False):
+        window = current_app.config["REPLICA_READ_YOUR_WRITES"]
+        session["read_primary_until"] = time.time() + window
+
+
+def init_replica_routing(db):
+    event.listen(db.session, "after_flush", note_write)
+    event.listen(db.session, "do_orm_execute", note_bulk_write)
+    event.listen(db.session, "after_commit", remember_write)
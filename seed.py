@@ -0,0 +1,197 @@
+"""`flask seed`: fill the database with a deterministic synthetic catalogue.
+
+The same options and --seed always produce the same rows with the same
+ids, so benchmark results can be compared between commits. Show times
+are spread over the year either side of the day the command runs, so the
+past/upcoming split is the same whatever the date.
+
+Rows are generated in batches and loaded with COPY.
+"""
+
+import csv
+import io
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, text
+
+from cache import LOCAL_INVALIDATION
+from forms import GENRES
+from models import (
+    DEFAULT_SHOW_DURATION,
+    db,
+    Album,
+    Artist,
+    Availability,
+    Show,
+    Song,
+    Venue,
+)
+
+STATES = ["CA", "NY", "TX", "WA", "IL", "FL", "OR", "MA", "CO", "TN"]
+CITIES = ["Springfield", "Riverside", "Franklin", "Greenville", "Bristol", "Salem"]
+
+
+def copy_rows(table, columns, rows, batch_size):
+    """COPY `rows` into `table` in batches; return the number loaded."""
+    cursor = db.session.connection().connection.dbapi_connection.cursor()
+    sql = f'COPY "{table}" ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)'
+    count = 0
+    rows = iter(rows)
+    while True:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        batch = 0
+        for row in rows:
+            writer.writerow(row)
+            batch += 1
+            if batch == batch_size:
+                break
+        if not batch:
+            return count
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+        count += batch
+
+
+def pg_array(values):
+    return "{" + ",".join(f'"{value}"' for value in values) + "}"
+
+
+def entity_rows(rng, kind, count):
+    for i in range(1, count + 1):
+        city = rng.choice(CITIES)
+        row = [
+            f"{kind} {i}",
+            f"{city} {rng.randrange(50)}",
+            rng.choice(STATES),
+            pg_array(rng.sample(GENRES, rng.randint(1, 3))),
+            f"555-{rng.randrange(10000):04d}",
+        ]
+        if kind == "Venue":
+            row.append(f"{rng.randrange(1, 999)} Main St")
+        yield row
+
+
+# Shows start in the first hour of a random three-hour block, one per
+# block per venue, so a venue's shows never overlap
+SHOW_BLOCK = timedelta(hours=3)
+BLOCKS_PER_YEAR = timedelta(days=365) // SHOW_BLOCK
+
+
+def show_rows(rng, venues, artists, count, today):
+    # Venues take turns, and each walks its own permutation of the blocks:
+    # a random offset plus a stride coprime with their number. No block is
+    # used twice at a venue, without tracking them or retrying when full.
+    blocks = 2 * BLOCKS_PER_YEAR
+    stride = rng.randrange(1, blocks)
+    while math.gcd(stride, blocks) != 1:
+        stride = rng.randrange(1, blocks)
+    offsets = [rng.randrange(blocks) for _ in range(venues)]
+    for n in range(count):
+        venue, turn = n % venues, n // venues
+        block = (offsets[venue] + turn * stride) % blocks - BLOCKS_PER_YEAR
+        start_time = today + block * SHOW_BLOCK + timedelta(minutes=rng.randrange(60))
+        yield [
+            venue + 1,
+            rng.randint(1, artists),
+            start_time,
+            start_time + DEFAULT_SHOW_DURATION,
+        ]
+
+
+def availability_rows(rng, artists, today):
+    # One window per artist, so the exclusion constraint always holds
+    for artist_id in range(1, artists + 1):
+        start = today + timedelta(days=rng.randrange(-30, 300))
+        yield [artist_id, start, start + timedelta(days=rng.randint(1, 60))]
+
+
+@click.command("seed")
+@click.option("--venues", default=1000, show_default=True, type=click.IntRange(1))
+@click.option("--artists", default=2000, show_default=True, type=click.IntRange(1))
+@click.option("--shows", default=20000, show_default=True, type=click.IntRange(0))
+@click.option("--albums", default=2, show_default=True, help="Albums per artist.")
+@click.option("--songs", default=5, show_default=True, help="Songs per album.")
+@click.option("--seed", default=42, show_default=True, help="Random seed.")
+@click.option("--batch-size", default=10000, show_default=True)
+@click.option("--reset", is_flag=True, help="Empty the catalogue tables first.")
+@with_appcontext
+def seed_command(venues, artists, shows, albums, songs, seed, batch_size, reset):
+    """Generate a synthetic catalogue of venues, artists and shows."""
+    models = (Song, Album, Availability, Show, Artist, Venue)
+    if shows > venues * 2 * BLOCKS_PER_YEAR:
+        raise click.UsageError("Too many shows for the venues to host; add venues.")
+    if not reset and any(
+        db.session.scalar(
+            select(func.count())
+            .select_from(model)
+            .execution_options(include_deleted=True)
+        )
+        for model in models
+    ):
+        raise click.UsageError("The catalogue is not empty; pass --reset.")
+    # Restarting the sequences even when empty keeps the ids deterministic
+    tables = ", ".join(f'"{model.__tablename__}"' for model in models)
+    db.session.execute(text(f"TRUNCATE {tables} RESTART IDENTITY"))
+
+    rng = random.Random(seed)
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    started = time.perf_counter()
+    entity_columns = ["name", "city", "state", "genres", "phone"]
+    loads = [
+        (
+            "Venue",
+            entity_columns + ["address"],
+            entity_rows(rng, "Venue", venues),
+        ),
+        ("Artist", entity_columns, entity_rows(rng, "Artist", artists)),
+        (
+            "Show",
+            ["venue_id", "artist_id", "start_time", "end_time"],
+            show_rows(rng, venues, artists, shows, today),
+        ),
+        (
+            "Availability",
+            ["artist_id", "start_time", "end_time"],
+            availability_rows(rng, artists, today),
+        ),
+        (
+            "Album",
+            ["artist_id", "name", "year"],
+            (
+                [artist_id, f"Album {n}", rng.randint(1970, 2025)]
+                for artist_id in range(1, artists + 1)
+                for n in range(1, albums + 1)
+            ),
+        ),
+        (
+            "Song",
+            ["album_id", "name"],
+            (
+                [album_id, f"Song {n}"]
+                for album_id in range(1, artists * albums + 1)
+                for n in range(1, songs + 1)
+            ),
+        ),
+    ]
+    total = 0
+    for table, columns, rows in loads:
+        count = copy_rows(table, columns, rows, batch_size)
+        click.echo(f"{table}: {count} rows")
+        total += count
+    db.session.commit()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+    page_cache = current_app.extensions["page_cache"]
+    page_cache.clear()
+    if page_cache.local:
+        click.echo(LOCAL_INVALIDATION, err=True)
+
+    elapsed = time.perf_counter() - started
+    click.echo(f"Seeded {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)")
@@ -0,0 +1,103 @@
+"""Finding the times a show can be booked for an artist at a venue.
+
+Open slots are the artist's availability windows, merged, minus the time
+taken by the venue's and the artist's existing shows. Artists without
+windows are available throughout the range. A show of `length` fits in a
+slot if it can start at its start and end by its end, so every slot is at
+least `length` long.
+
+Both the windows and the shows arrive sorted from their indexes, and
+each step is one linear sweep, so the cost stays proportional to the
+number of windows and shows in the range, thousands included.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import abort, current_app
+
+from queries import availability_windows, booked_times
+from request_args import parse_datetime_arg, parse_int_arg
+
+
+def merge(intervals):
+    """Union of (start, end) intervals sorted by start; touching ones join."""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract(intervals, taken):
+    """Parts of merged `intervals` outside merged `taken`, both sorted."""
+    free = []
+    taken = iter(taken)
+    busy = next(taken, None)
+    for start, end in intervals:
+        # Skip what ends before this interval; it ends before the rest too
+        while busy is not None and busy[1] <= start:
+            busy = next(taken, None)
+        while busy is not None and busy[0] < end:
+            if busy[0] > start:
+                free.append((start, busy[0]))
+            if busy[1] >= end:
+                start = end
+                break
+            start = busy[1]
+            busy = next(taken, None)
+        if start < end:
+            free.append((start, end))
+    return free
+
+
+def open_slots(windows, shows, start, end, length):
+    """Free (start, end) periods in [start, end] at least `length` long.
+
+    `windows` are sorted (start, end) availability windows, or None when
+    the artist is always available; `shows` are sorted (start, end) shows.
+    """
+    if windows is None:
+        windows = [(start, end)]
+    bounded = merge(
+        (max(window_start, start), min(window_end, end))
+        for window_start, window_end in windows
+        if window_start < end and window_end > start
+    )
+    taken = merge(shows)
+    return [
+        (slot_start, slot_end)
+        for slot_start, slot_end in subtract(bounded, taken)
+        if slot_end - slot_start >= length
+    ]
+
+
+def find_slots(artist_id, venue_id, start, end, length):
+    """Open slots for a show of `length` by the artist at the venue."""
+    windows = availability_windows(artist_id, start, end)
+    shows = booked_times(venue_id, artist_id, start, end)
+    return open_slots(windows, shows, start, end, length)
+
+
+def search_args():
+    """(venue_id, start, end, length) from the query string; 400 if invalid.
+
+    `from` defaults to now and `to` to SLOT_SEARCH_DAYS later; `length` is
+    in minutes. venue_id is None when not given.
+    """
+    config = current_app.config
+    venue_id = parse_int_arg("venue_id", minimum=1)
+    start = parse_datetime_arg("from") or datetime.now().replace(
+        second=0, microsecond=0
+    )
+    end = parse_datetime_arg("to") or start + timedelta(days=config["SLOT_SEARCH_DAYS"])
+    minutes = parse_int_arg(
+        "length", default=config["SLOT_SHOW_LENGTH_MINUTES"], minimum=1
+    )
+    if end <= start:
+        abort(400, "to must be after from.")
+    if end > start + timedelta(days=config["SLOT_SEARCH_MAX_DAYS"]):
+        abort(400, f"Search at most {config['SLOT_SEARCH_MAX_DAYS']} days at once.")
+    return venue_id, start, end, timedelta(minutes=minutes)
@@ -0,0 +1,225 @@
+"""Soft deletion of venues and artists.
+
+Deleting a venue or artist only sets its deleted_at, a one-row UPDATE.
+Every ORM query made through the session then leaves tombstoned rows out,
+including where they are joined in. Queries over shows join the venue or
+artist, so shows of a deleted one disappear from the listings, counts,
+detail pages and exports with it. Core table selects (`select(table)`)
+are not ORM queries; select mapped attributes instead (queries.columns).
+
+`flask purge` removes tombstoned rows for good, along with their shows,
+availability, albums and songs, in small batches with a cap on rows
+deleted per second, so it can run next to live traffic.
+
+Pass execution_options(include_deleted=True) to see tombstoned rows.
+Flushing a new show, availability window, album or song that belongs to
+a tombstoned venue or artist raises DeletedParentError.
+"""
+
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, inspect, select
+from sqlalchemy.orm import with_loader_criteria
+
+from models import db, Album, Artist, Availability, Show, Song, Venue
+
+SOFT_DELETED = (Venue, Artist)
+
+# Rows that reference a tombstoned entity, deleted before it, innermost
+# first: (model, criterion given the entity's id)
+DEPENDANTS = {
+    Venue: [(Show, lambda venue_id: Show.venue_id == venue_id)],
+    Artist: [
+        (Show, lambda artist_id: Show.artist_id == artist_id),
+        (Availability, lambda artist_id: Availability.artist_id == artist_id),
+        (
+            Song,
+            lambda artist_id: Song.album_id.in_(
+                select(Album.id).where(Album.artist_id == artist_id)
+            ),
+        ),
+        (Album, lambda artist_id: Album.artist_id == artist_id),
+    ],
+}
+
+
+def soft_delete(obj):
+    obj.deleted_at = datetime.now()
+
+
+def live_only(execute_state):
+    """Add `deleted_at IS NULL` for every soft-deleted model a query reads."""
+    if (
+        not execute_state.is_select
+        or execute_state.is_column_load
+        or execute_state.is_relationship_load
+        or execute_state.execution_options.get("include_deleted", False)
+    ):
+        return
+    execute_state.statement = execute_state.statement.options(
+        *(
+            with_loader_criteria(
+                model, model.deleted_at.is_(None), include_aliases=True
+            )
+            for model in SOFT_DELETED
+        )
+    )
+
+
+class DeletedParentError(ValueError):
+    """A write would attach a row to a soft-deleted venue or artist."""
+
+
+# Foreign keys of rows that belong to a venue or artist: (model, attribute,
+# the live ids among some ids); the scope leaves tombstoned parents out
+PARENTS = [
+    (Show, "venue_id", lambda ids: select(Venue.id).where(Venue.id.in_(ids))),
+    (Show, "artist_id", lambda ids: select(Artist.id).where(Artist.id.in_(ids))),
+    (
+        Availability,
+        "artist_id",
+        lambda ids: select(Artist.id).where(Artist.id.in_(ids)),
+    ),
+    (Album, "artist_id", lambda ids: select(Artist.id).where(Artist.id.in_(ids))),
+    (
+        Song,
+        "album_id",
+        lambda ids: select(Album.id).join(Album.artist).where(Album.id.in_(ids)),
+    ),
+]
+
+
+def reject_deleted_parents(db_session, flush_context, instances):
+    """Refuse to flush rows whose venue, artist or album is gone.
+
+    The foreign keys still accept tombstoned parents until they are
+    purged. One query per kind of parent written, not per row.
+    """
+    for model, key, live_ids in PARENTS:
+        ids = set()
+        for obj in db_session.new | db_session.dirty:
+            if not isinstance(obj, model):
+                continue
+            state = inspect(obj)
+            value = getattr(obj, key)
+            # Views may pass ids as strings; the database rejects bad ones
+            if (obj in db_session.new or state.attrs[key].history.added) and (
+                isinstance(value, int) or str(value).isdigit()
+            ):
+                ids.add(int(value))
+        if not ids:
+            continue
+        with db_session.no_autoflush:
+            missing = ids - set(db_session.scalars(live_ids(ids)))
+        if missing:
+            parent = key.removesuffix("_id").capitalize()
+            raise DeletedParentError(f"{parent} {min(missing)} does not exist")
+
+
+def init_soft_delete(db):
+    event.listen(db.session, "do_orm_execute", live_only)
+    event.listen(db.session, "before_flush", reject_deleted_parents)
+
+
+class Throttle:
+    """Sleep as needed to keep a running total under `rate` per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.total = 0
+
+    def add(self, count):
+        self.total += count
+        if self.rate:
+            ahead = self.total / self.rate - (time.monotonic() - self.started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    @property
+    def per_second(self):
+        return self.total / max(time.monotonic() - self.started, 1e-9)
+
+
+def delete_in_batches(model, criterion, batch_size, throttle):
+    """Delete the rows of `model` matching `criterion`, one commit per batch."""
+    deleted = 0
+    while True:
+        batch = select(model.id).where(criterion).limit(batch_size)
+        result = db.session.execute(
+            delete(model)
+            .where(model.id.in_(batch.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        deleted += result.rowcount
+        throttle.add(result.rowcount)
+        if result.rowcount < batch_size:
+            return deleted
+
+
+def tombstones(model):
+    stmt = (
+        select(model.id)
+        .where(model.deleted_at.is_not(None))
+        .order_by(model.deleted_at)
+        .execution_options(include_deleted=True)
+    )
+    return db.session.scalars(stmt).all()
+
+
+def purge(batch_size=1000, rate=None, report=None):
+    """Remove every tombstoned row and its dependants; return rows deleted.
+
+    `report(model, entity_id, counts, throttle)` is called after each
+    entity is gone, with the rows deleted per table.
+    """
+    throttle = Throttle(rate)
+    for model in SOFT_DELETED:
+        for entity_id in tombstones(model):
+            counts = {}
+            for dependant, criterion in DEPENDANTS[model]:
+                counts[dependant.__tablename__] = delete_in_batches(
+                    dependant, criterion(entity_id), batch_size, throttle
+                )
+            # Anything added since is removed by the foreign key cascades
+            result = db.session.execute(
+                delete(model)
+                .where(model.id == entity_id, model.deleted_at.is_not(None))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            counts[model.__tablename__] = result.rowcount
+            throttle.add(result.rowcount)
+            if report is not None:
+                report(model, entity_id, counts, throttle)
+    return throttle.total
+
+
+@click.command("purge")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option(
+    "--rate", type=int, help="Most rows to delete per second (default: no limit)."
+)
+@click.option("--watch", is_flag=True, help="Keep running, purging new tombstones.")
+@click.option("--interval", default=60, show_default=True, help="Seconds between runs.")
+@with_appcontext
+def purge_command(batch_size, rate, watch, interval):
+    """Delete soft-deleted venues and artists and everything under them."""
+
+    def report(model, entity_id, counts, throttle):
+        rows = ", ".join(f"{table} {count}" for table, count in counts.items())
+        click.echo(
+            f"{model.__tablename__} {entity_id} purged ({rows}); "
+            f"{throttle.total} rows at {throttle.per_second:.0f} rows/s"
+        )
+
+    while True:
+        total = purge(batch_size, rate, report)
+        click.echo(f"Purged {total} rows")
+        if not watch:
+            return
+        time.sleep(interval)
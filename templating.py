@@ -0,0 +1,57 @@
+"""Streamed listing pages and the persistent template bytecode cache.
+
+With STREAM_LISTINGS on, the venue, artist and show listings are sent as
+they render: the layout goes out before the rows are read, and rows come
+from a server-side cursor STREAM_YIELD_PER at a time, so memory does not
+grow with the catalogue. A streamed page is not stored in the page cache,
+its Server-Timing only covers the time to the first byte, and an error
+while rows are read can only cut the page short.
+
+Compiled templates are written to TEMPLATE_BYTECODE_CACHE_DIR, so a new
+worker loads them instead of compiling every template again.
+"""
+
+import os
+
+from flask import current_app, render_template, stream_template
+from jinja2 import FileSystemBytecodeCache
+
+
+def listing_yield_per():
+    """Rows to read at a time for a streamed listing, or None to read all."""
+    if current_app.config["STREAM_LISTINGS"]:
+        return current_app.config["STREAM_YIELD_PER"]
+    return None
+
+
+def buffered(chunks, size):
+    """Join small chunks so each write to the client carries `size` chars."""
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def render_listing(template_name, **context):
+    """Render a listing page whole, or stream it with STREAM_LISTINGS."""
+    if not current_app.config["STREAM_LISTINGS"]:
+        return render_template(template_name, **context)
+    chunks = stream_template(template_name, **context)
+    return current_app.response_class(
+        buffered(chunks, current_app.config["STREAM_BUFFER_SIZE"]),
+        mimetype="text/html",
+    )
+
+
+def init_bytecode_cache(app):
+    directory = app.config.get("TEMPLATE_BYTECODE_CACHE_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
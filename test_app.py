@@ -3,14 +3,59 @@ Tests for Fyyur application.
 Run with: pytest test_app.py -v
 """
 
+import atexit
+import json
+import logging
 import os
+import gzip
+import random
+import re
+import shutil
+import time
+import babel.dates
+import flask
 import pytest
 from datetime import datetime, timedelta
 
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import create_engine, event, insert, select, text
+
 # Set test database BEFORE importing app
 os.environ["TEST_DATABASE"] = "true"
 
-from app import app, db, Venue, Artist, Show, Availability, Album, Song
+from app import (
+    app,
+    assets,
+    db,
+    page_cache,
+    Venue,
+    Artist,
+    Show,
+    Availability,
+    Album,
+    Song,
+)
+import exporter
+from assets import BUNDLES, build
+from cache import LRUBackend, cascade_tags
+from database import request_timeout
+from filters import DATETIME_FORMATS, format_datetime, format_datetime_cached
+from forms import GENRES
+from instrumentation import request_log_handler, request_logger
+import soft_delete as soft_delete_module
+from seed import BLOCKS_PER_YEAR, show_rows
+from slots import merge, open_slots, subtract
+from soft_delete import purge, soft_delete
+from templating import init_bytecode_cache
+from queries import (
+    artist_availability,
+    artist_list,
+    search,
+    show_page,
+    show_sections,
+    unavailable_shows,
+    venue_areas,
+)
 
 
 @pytest.fixture
@@ -19,6 +64,9 @@ def client():
     app.config["TESTING"] = True
     app.config["WTF_CSRF_ENABLED"] = False
 
+    # Ids are reused once tables are recreated; start every test cold
+    page_cache.clear()
+
     with app.test_client() as client:
         with app.app_context():
             db.create_all()
@@ -37,7 +85,7 @@ def sample_venue(client):
             state="CA",
             address="123 Test St",
             phone="555-1234",
-            genres="Jazz,Rock",
+            genres=["Jazz", "Rock"],
             facebook_link="https://facebook.com/testvenue",
             website="https://testvenue.com",
             seeking_talent=True,
@@ -58,7 +106,7 @@ def sample_artist(client):
             city="Los Angeles",
             state="CA",
             phone="555-5678",
-            genres="Pop,Electronic",
+            genres=["Pop", "Electronic"],
             facebook_link="https://facebook.com/testartist",
             website="https://testartist.com",
             seeking_venue=True,
@@ -86,7 +134,7 @@ class TestModels:
         """Test creating an artist."""
         with app.app_context():
             artist = Artist(
-                name="New Artist", city="Chicago", state="IL", genres="Blues"
+                name="New Artist", city="Chicago", state="IL", genres=["Blues"]
             )
             db.session.add(artist)
             db.session.commit()
@@ -152,6 +200,38 @@ class TestModels:
 
             assert Show.query.get(show_id) is None
 
+    def test_venue_delete_is_one_statement(self, client, sample_venue, sample_artist):
+        """Test that the database, not the ORM, deletes a venue's shows."""
+        with app.app_context():
+            db.session.add_all(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=datetime.now() + timedelta(days=day),
+                )
+                for day in range(5)
+            )
+            db.session.commit()
+            db.session.expunge_all()
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            with app.app_context():
+                db.session.delete(db.session.get(Venue, sample_venue))
+                db.session.commit()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+        assert [s for s in statements if s.startswith("DELETE")] == [
+            'DELETE FROM "Venue" WHERE "Venue".id = %(id)s'
+        ]
+        with app.app_context():
+            assert Show.query.count() == 0
+
     def test_cascade_delete_artist(self, client, sample_artist):
         """Test that deleting an artist cascades to availability and albums."""
         with app.app_context():
@@ -240,6 +320,1617 @@ class TestRoutes:
         assert response.status_code == 200
 
 
+class TestVenueAreas:
+    """Test the aggregate query behind the venues listing."""
+
+    def test_groups_by_city_and_counts_upcoming(
+        self, client, sample_venue, sample_artist
+    ):
+        """Test venues are grouped by area with only upcoming shows counted."""
+        with app.app_context():
+            db.session.add_all(
+                [
+                    Venue(
+                        name="Other SF",
+                        city="San Francisco",
+                        state="CA",
+                        address="1 Other St",
+                    ),
+                    Venue(
+                        name="NYC Venue",
+                        city="New York",
+                        state="NY",
+                        address="2 Main St",
+                    ),
+                    Show(
+                        venue_id=sample_venue,
+                        artist_id=sample_artist,
+                        start_time=datetime.now() + timedelta(days=3),
+                    ),
+                    Show(
+                        venue_id=sample_venue,
+                        artist_id=sample_artist,
+                        start_time=datetime.now() - timedelta(days=3),
+                    ),
+                ]
+            )
+            db.session.commit()
+
+            areas = venue_areas(datetime.now())
+
+        assert [(a["city"], a["state"]) for a in areas] == [
+            ("San Francisco", "CA"),
+            ("New York", "NY"),
+        ]
+        counts = {v["name"]: v["num_upcoming_shows"] for v in areas[0]["venues"]}
+        assert counts == {"Test Venue": 1, "Other SF": 0}
+
+
+class TestShowsListing:
+    """Test keyset pagination and time windows on the shows listing."""
+
+    @pytest.fixture
+    def five_shows(self, client, sample_venue, sample_artist):
+        base = datetime(2030, 1, 1, 20, 0)
+        with app.app_context():
+            db.session.add_all(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=base + timedelta(days=day),
+                )
+                for day in range(5)
+            )
+            db.session.commit()
+        return base
+
+    def test_pages_follow_cursor(self, client, five_shows):
+        """Test that following next links visits every show exactly once."""
+        seen = []
+        url = "/shows?per_page=2"
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200
+            seen.append(response.data.count(b"tile-show"))
+            match = re.search(rb'href="(/shows\?[^"]+)"', response.data)
+            url = match.group(1).decode().replace("&amp;", "&") if match else None
+        assert seen == [2, 2, 1]
+
+    def test_show_page_keyset(self, client, five_shows):
+        """Test that a page starts strictly after the cursor key."""
+        with app.app_context():
+            rows, next_key = show_page(limit=2)
+            assert next_key == (rows[-1].start_time, rows[-1].id)
+            rows, _ = show_page(after=next_key, limit=2)
+        assert rows[0].start_time == five_shows + timedelta(days=2)
+        assert rows[0].venue_name == "Test Venue"
+        assert rows[0].artist_name == "Test Artist"
+
+    def test_time_window(self, client, five_shows):
+        """Test from/to filters on start_time."""
+        with app.app_context():
+            rows, next_key = show_page(
+                start=five_shows + timedelta(days=1),
+                end=five_shows + timedelta(days=3),
+            )
+        assert [row.start_time.day for row in rows] == [2, 3]
+        assert next_key is None
+
+        response = client.get("/shows?from=2030-01-02&to=2030-01-03")
+        assert response.data.count(b"tile-show") == 1
+
+    def test_invalid_arguments(self, client):
+        """Test that malformed cursors and dates are rejected."""
+        assert client.get("/shows?after=garbage").status_code == 400
+        assert client.get("/shows?from=yesterday").status_code == 400
+        assert client.get("/shows?per_page=0").status_code == 400
+        assert client.get("/shows?per_page=ten").status_code == 400
+        assert client.get("/shows?per_page=").status_code == 200
+
+
+class TestStreamedListings:
+    """Test streamed rendering of the listing pages."""
+
+    @pytest.fixture
+    def catalogue(self, client, sample_venue, sample_artist):
+        with app.app_context():
+            db.session.add_all(
+                Venue(name=f"Venue {i}", city=city, state="CA", address="1")
+                for i, city in enumerate(["Fresno", "Fresno", "Oakland", "Davis"])
+            )
+            db.session.add_all(
+                Artist(name=f"Artist {i}", city="Fresno", state="CA") for i in range(5)
+            )
+            db.session.add(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=datetime(2030, 1, 1, 20, 0),
+                )
+            )
+            db.session.commit()
+
+    def test_streamed_pages_match_rendered(self, client, catalogue, monkeypatch):
+        """Test that streaming changes how pages are sent, not what they say."""
+        monkeypatch.setattr(page_cache, "backend", None)
+        urls = ["/venues", "/venues?genre=Jazz", "/artists", "/shows"]
+        rendered = [client.get(url) for url in urls]
+
+        monkeypatch.setitem(app.config, "STREAM_LISTINGS", True)
+        monkeypatch.setitem(app.config, "STREAM_YIELD_PER", 2)
+        monkeypatch.setitem(app.config, "STREAM_BUFFER_SIZE", 512)
+        for url, whole in zip(urls, rendered):
+            response = client.get(url)
+            assert response.is_streamed
+            chunks = list(response.iter_encoded())
+            assert len(chunks) > 1
+            assert b"".join(chunks) == whole.data
+
+    def test_streamed_pages_are_not_cached(self, client, catalogue, monkeypatch):
+        """Test that a streamed page is read from the database every time."""
+        monkeypatch.setitem(app.config, "STREAM_LISTINGS", True)
+        client.get("/artists").get_data()
+        _, statements = count_statements(client, "/artists")
+        assert statements > 0
+
+    def test_lazy_queries(self, client, catalogue):
+        """Test that yield_per returns generators with the same content."""
+        with app.app_context():
+            now = datetime.now()
+            areas = venue_areas(now, yield_per=2)
+            assert not isinstance(areas, list)
+            lazy = [dict(area, venues=list(area["venues"])) for area in areas]
+            assert lazy == venue_areas(now)
+            assert list(artist_list(yield_per=2)) == artist_list()
+
+    def test_bytecode_cache(self, client, tmp_path, monkeypatch):
+        """Test that compiled templates are written to the cache directory."""
+        monkeypatch.setitem(app.config, "TEMPLATE_BYTECODE_CACHE_DIR", str(tmp_path))
+        monkeypatch.setattr(app.jinja_env, "bytecode_cache", None)
+        init_bytecode_cache(app)
+        app.jinja_env.cache.clear()
+        assert client.get("/").status_code == 200
+        assert any(tmp_path.iterdir())
+
+
+class TestApi:
+    """Test the JSON read API."""
+
+    def test_venue_list(self, client, sample_venue, sample_artist):
+        """Test that the venue list returns JSON with upcoming show counts."""
+        with app.app_context():
+            db.session.add(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=datetime.now() + timedelta(days=1),
+                )
+            )
+            db.session.commit()
+        response = client.get("/api/v1/venues")
+        assert response.status_code == 200
+        assert response.mimetype == "application/json"
+        venue = response.json["data"][0]
+        assert venue["name"] == "Test Venue"
+        assert venue["genres"] == ["Jazz", "Rock"]
+        assert venue["num_upcoming_shows"] == 1
+        assert response.json["next"] is None
+
+    def test_field_selection(self, client, sample_artist):
+        """Test that ?fields= limits each object to the named fields."""
+        response = client.get("/api/v1/artists?fields=id,name")
+        assert response.json["data"] == [{"id": sample_artist, "name": "Test Artist"}]
+
+        response = client.get(f"/api/v1/artists/{sample_artist}?fields=name")
+        assert response.json == {"name": "Test Artist"}
+
+        response = client.get("/api/v1/artists?fields=password")
+        assert response.status_code == 400
+        assert response.json["error"]["code"] == 400
+
+    def test_list_pagination(self, client):
+        """Test that following next links visits every venue once."""
+        with app.app_context():
+            db.session.add_all(
+                Venue(name=f"Venue {i}", city="Austin", state="TX", address="1 St")
+                for i in range(5)
+            )
+            db.session.commit()
+        names, url = [], "/api/v1/venues?limit=2&fields=name"
+        while url:
+            response = client.get(url)
+            names += [venue["name"] for venue in response.json["data"]]
+            url = response.json["next"]
+        assert names == [f"Venue {i}" for i in range(5)]
+
+    def test_show_list(self, client, sample_venue, sample_artist):
+        """Test show pagination with the same cursors as the HTML listing."""
+        base = datetime(2030, 1, 1, 20, 0)
+        with app.app_context():
+            db.session.add_all(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=base + timedelta(days=day),
+                )
+                for day in range(3)
+            )
+            db.session.commit()
+        response = client.get("/api/v1/shows?limit=2")
+        first = response.json
+        assert [show["start_time"] for show in first["data"]] == [
+            "2030-01-01T20:00:00",
+            "2030-01-02T20:00:00",
+        ]
+        assert first["data"][0]["venue_name"] == "Test Venue"
+        second = client.get(first["next"]).json
+        assert len(second["data"]) == 1
+        assert second["next"] is None
+
+    def test_detail_shows(self, client, sample_venue, sample_artist):
+        """Test that detail endpoints include past and upcoming shows."""
+        with app.app_context():
+            db.session.add(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=datetime.now() - timedelta(days=1),
+                )
+            )
+            db.session.commit()
+        response = client.get(f"/api/v1/venues/{sample_venue}")
+        assert response.json["address"] == "123 Test St"
+        assert response.json["past_shows_count"] == 1
+        assert response.json["past_shows"][0]["artist_name"] == "Test Artist"
+        assert response.json["upcoming_shows"] == []
+
+    def test_detail_skips_show_queries(self, client, sample_venue):
+        """Test that show sections are only queried when requested."""
+        url = f"/api/v1/venues/{sample_venue}"
+        _, statements = count_statements(client, url + "?fields=id,name")
+        assert statements == 1
+        _, statements = count_statements(client, url)
+        assert statements == 3
+
+    def test_not_found(self, client):
+        """Test that errors are returned as JSON."""
+        response = client.get("/api/v1/artists/999")
+        assert response.status_code == 404
+        assert response.json["error"]["code"] == 404
+        assert client.get("/api/v1/shows?after=garbage").status_code == 400
+
+
+class TestImport:
+    """Test the `flask import` command."""
+
+    def run(self, path, *args):
+        return app.test_cli_runner().invoke(args=["import", *args, str(path)])
+
+    def test_import_venues_csv(self, client, tmp_path):
+        """Test that valid rows are imported and invalid ones reported."""
+        path = tmp_path / "venues.csv"
+        path.write_text(
+            "name,city,state,address,genres,seeking_talent\n"
+            'Club A,Austin,TX,1 Main St,"Jazz, Blues",y\n'
+            "Club B,Austin,XX,2 Main St,Jazz,\n"
+            "Club C,Dallas,TX,3 Main St,Rock n Roll,\n"
+            f"Club D,{'x' * 200},TX,4 Main St,Jazz,\n"
+        )
+        result = self.run(path, "venues", "--batch-size", "2")
+        assert result.exit_code == 0
+        assert "Imported 2 of 4 venues" in result.output
+        assert "venues.csv:3: state: Not a valid choice" in result.output
+        # Rejected by the database, leaving the rest of its batch in place
+        assert "venues.csv:5: value too long" in result.output
+
+        with app.app_context():
+            club = Venue.query.filter_by(name="Club A").one()
+            assert club.genres == ["Jazz", "Blues"]
+            assert club.seeking_talent is True
+            assert Venue.query.count() == 2
+
+    def test_import_invalidates_inserted_rows(self, client, tmp_path):
+        """Test that only the pages of committed rows are invalidated."""
+        path = tmp_path / "venues.csv"
+        path.write_text(
+            "name,city,state,address,genres\n"
+            "Club A,Austin,TX,1 Main St,Jazz\n"
+            f"Club B,{'x' * 200},TX,2 Main St,Jazz\n"
+        )
+        before = dict(page_cache.backend.counters)
+        result = self.run(path, "venues")
+        assert "Imported 1 of 2 venues" in result.output
+        assert "PAGE_CACHE_TYPE=redis" in result.output
+        with app.app_context():
+            venue_id = Venue.query.one().id
+        bumped = {
+            tag
+            for tag, version in page_cache.backend.counters.items()
+            if version != before.get(tag)
+        }
+        assert bumped == {f"venue:{venue_id}", "venues"}
+
+    def test_import_shows_jsonl(self, client, sample_venue, sample_artist, tmp_path):
+        """Test foreign key and availability checks on imported shows."""
+        with app.app_context():
+            db.session.add(
+                Availability(
+                    artist_id=sample_artist,
+                    start_time=datetime(2030, 1, 1),
+                    end_time=datetime(2030, 1, 31),
+                )
+            )
+            db.session.commit()
+        rows = [
+            {"venue_id": sample_venue, "artist_id": sample_artist},
+            {"venue_id": 999, "artist_id": sample_artist},
+            {"venue_id": sample_venue, "artist_id": sample_artist},
+        ]
+        rows[0]["start_time"] = "2030-01-10 20:00:00"
+        rows[1]["start_time"] = "2030-01-11 20:00:00"
+        rows[2]["start_time"] = "2030-03-01 20:00:00"
+        path = tmp_path / "shows.jsonl"
+        path.write_text("\n".join(json.dumps(row) for row in rows) + "\nnot json\n")
+
+        result = self.run(path, "shows")
+        assert "Imported 1 of 4 shows" in result.output
+        assert "shows.jsonl:2: venue 999 does not exist" in result.output
+        assert "shows.jsonl:3: artist" in result.output
+        assert "shows.jsonl:4: invalid row" in result.output
+        with app.app_context():
+            assert Show.query.one().start_time == datetime(2030, 1, 10, 20)
+
+    def test_unavailable_shows_without_candidates(self, client):
+        """Test that an empty batch, even as a generator, runs no query."""
+        with app.app_context():
+            assert unavailable_shows(row for row in []) == set()
+
+
+class TestExport:
+    """Test the streaming CSV/NDJSON export."""
+
+    def test_csv_endpoint(self, client, sample_venue):
+        """Test a CSV export, with genres in the importer's list format."""
+        response = client.get("/api/v1/export/venues.csv")
+        assert response.status_code == 200
+        assert response.mimetype == "text/csv"
+        assert response.is_streamed
+        header, row = response.get_data(as_text=True).splitlines()
+        assert header.startswith("id,name,city,state,address")
+        assert '"Jazz,Rock"' in row
+
+    def test_ndjson_endpoint(self, client, sample_venue, sample_artist):
+        """Test an NDJSON export of shows, one object per line."""
+        with app.app_context():
+            db.session.add(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=datetime(2030, 1, 1, 20),
+                )
+            )
+            db.session.commit()
+        response = client.get("/api/v1/export/shows.ndjson")
+        (line,) = response.data.splitlines()
+        show = json.loads(line)
+        assert show["venue_id"] == sample_venue
+        assert show["start_time"] == "2030-01-01T20:00:00"
+
+    def test_rows_are_streamed_in_chunks(self, client, monkeypatch):
+        """Test that rows are encoded chunk by chunk as they are fetched."""
+        monkeypatch.setattr(exporter, "CHUNK_SIZE", 2)
+        with app.app_context():
+            db.session.add_all(
+                Artist(name=f"Artist {i}", city="Austin", state="TX") for i in range(5)
+            )
+            db.session.commit()
+            chunks = list(exporter.export("artists", "ndjson"))
+        assert [chunk.count(b"\n") for chunk in chunks] == [2, 2, 1]
+
+    def test_cli(self, client, sample_artist, tmp_path):
+        """Test that `flask export` writes the same output to a file."""
+        path = tmp_path / "artists.csv"
+        result = app.test_cli_runner().invoke(args=["export", "artists", str(path)])
+        assert result.exit_code == 0
+        assert "Test Artist" in path.read_text()
+
+    @pytest.mark.parametrize("format", ["csv", "ndjson"])
+    def test_export_can_be_imported(
+        self, client, sample_venue, sample_artist, tmp_path, format
+    ):
+        """Test that exports use the importer's field names and formats."""
+        with app.app_context():
+            venue = db.session.get(Venue, sample_venue)
+            venue.website = "https://example.com"
+            # The sample's "Rock" is not one of the form's choices
+            venue.genres = ["Jazz", "Blues"]
+            db.session.add(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=datetime(2030, 1, 1, 20),
+                )
+            )
+            db.session.commit()
+        exported = {}
+        for kind in ("venues", "shows"):
+            data = client.get(f"/api/v1/export/{kind}.{format}").data
+            assert b"updated_at" not in data and b"deleted_at" not in data
+            exported[kind] = data.decode()
+        assert "website_link" in exported["venues"]
+
+        # Free the venue's slot so the show can be booked again
+        with app.app_context():
+            Show.query.delete()
+            db.session.commit()
+        suffix = "csv" if format == "csv" else "jsonl"
+        for kind in ("venues", "shows"):
+            path = tmp_path / f"{kind}.{suffix}"
+            path.write_text(exported[kind])
+            result = app.test_cli_runner().invoke(args=["import", kind, str(path)])
+            assert f"Imported 1 of 1 {kind}" in result.output
+        with app.app_context():
+            copy = Venue.query.filter(Venue.id != sample_venue).one()
+            assert copy.website == "https://example.com"
+            assert copy.genres == ["Jazz", "Blues"]
+            assert Show.query.one().start_time == datetime(2030, 1, 1, 20)
+
+    def test_unknown_table(self, client):
+        """Test that only the exported tables are reachable."""
+        assert client.get("/api/v1/export/songs.csv").status_code == 404
+
+
+class TestStatementTimeouts:
+    """Test per-route statement timeouts and pool statistics."""
+
+    @pytest.mark.parametrize(
+        "url, method, budget",
+        [
+            ("/venues", "GET", "read"),
+            ("/venues/search", "POST", "search"),
+            ("/venues/create", "POST", "write"),
+            ("/api/v1/export/shows.csv", "GET", "export"),
+        ],
+    )
+    def test_budget_by_route(self, client, url, method, budget):
+        """Test that each kind of route runs under its own timeout."""
+        timeout = app.config["STATEMENT_TIMEOUTS"][budget]
+        show = text("SELECT setting::int FROM pg_settings WHERE name = :name")
+        with app.test_request_context(url, method=method):
+            assert request_timeout() == timeout
+            assert db.session.scalar(show, {"name": "statement_timeout"}) == timeout
+            db.session.rollback()
+            # A rollback does not undo the connection's setting
+            assert db.session.scalar(show, {"name": "statement_timeout"}) == timeout
+
+    def test_cli_resets_request_budget(self, client):
+        """Test that a connection left with a request's budget is reset."""
+        show = text(
+            "SELECT setting, reset_val FROM pg_settings"
+            " WHERE name = 'statement_timeout'"
+        )
+        search = app.config["STATEMENT_TIMEOUTS"]["search"]
+        db.session.remove()
+        db.engine.dispose()
+        with app.test_request_context("/venues/search", method="POST"):
+            assert db.session.execute(show).one()[0] == str(search)
+            db.session.remove()
+        # The pool's one connection, checked out again outside a request
+        assert db.engine.pool.checkedin() == 1
+        setting, default = db.session.execute(show).one()
+        assert setting == default
+
+    def test_timeout_returns_503(self, client, monkeypatch):
+        """Test that a cancelled statement is answered with 503."""
+
+        def slow_view():
+            db.session.execute(text("SELECT pg_sleep(1)"))
+
+        monkeypatch.setitem(app.config["STATEMENT_TIMEOUTS"], "read", 50)
+        monkeypatch.setitem(app.view_functions, "artists", slow_view)
+        assert client.get("/artists").status_code == 503
+
+    def test_pool_status(self, client):
+        """Test that pool occupancy is reported per engine."""
+        stats = client.get("/status/pool").json["default"]
+        assert stats["pool"] == "QueuePool"
+        assert stats["capacity"] == (
+            app.config["DB_POOL_SIZE"] + app.config["DB_MAX_OVERFLOW"]
+        )
+        assert 0 <= stats["saturation"] <= 1
+
+
+class TestReplicaRouting:
+    """Test that read-only requests read from a replica bind."""
+
+    @pytest.fixture
+    def replica(self, client, sample_venue):
+        """A replica bind on the test database, logging its statements."""
+        statements = []
+        engine = create_engine(app.config["SQLALCHEMY_DATABASE_URI"])
+        event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement),
+        )
+        db.engines["replica0"] = engine
+        # Start from a fresh session, as a new request would
+        db.session.remove()
+        # As if the sample rows had been written long ago
+        page_cache.backend.bumped.clear()
+        yield statements
+        del db.engines["replica0"]
+        engine.dispose()
+
+    def test_get_reads_from_replica(self, client, sample_venue, replica):
+        """Test that a GET page is built from the replica alone."""
+        response, primary = count_statements(client, f"/venues/{sample_venue}")
+        assert response.status_code == 200
+        assert primary == 0
+        assert replica
+
+    def test_search_form_reads_from_replica(self, client, sample_venue, replica):
+        """Test that POST views marked read-only use the replica."""
+        response, primary = count_statements(
+            client, "/venues/search", method="POST", data={"search_term": "Test"}
+        )
+        assert b"Test Venue" in response.data
+        assert primary == 0
+        assert replica
+
+    def test_writer_reads_own_writes(self, client, sample_venue, replica):
+        """Test that a write and the following reads go to the primary."""
+        client.post(
+            f"/venues/{sample_venue}/edit",
+            data={"name": "Renamed", "city": "SF", "state": "CA", "address": "1"},
+        )
+        assert replica == []
+
+        db.session.remove()
+        page_cache.clear()
+        response, primary = count_statements(client, f"/venues/{sample_venue}")
+        assert b"Renamed" in response.data
+        assert primary > 0
+        assert replica == []
+
+        # Once the window has passed, reads go back to the replica
+        with client.session_transaction() as session:
+            session["read_primary_until"] = 0
+        page_cache.clear()
+        page_cache.backend.bumped.clear()
+        _, primary = count_statements(client, f"/venues/{sample_venue}")
+        assert primary == 0
+        assert replica
+
+    def test_bulk_write_reads_own_writes(self, client):
+        """Test that statements bypassing the unit of work count as writes."""
+        with app.test_request_context("/venues/import", method="POST"):
+            db.session.execute(
+                insert(Venue),
+                [{"name": "Bulk", "city": "SF", "state": "CA", "address": "1"}],
+            )
+            db.session.commit()
+            assert flask.session["read_primary_until"] > time.time()
+
+    def test_invalidated_page_renders_from_primary(self, client, sample_venue, replica):
+        """Test that a page missed right after invalidation skips replicas."""
+        page_cache.invalidate(f"venue:{sample_venue}")
+        response, primary = count_statements(client, f"/venues/{sample_venue}")
+        assert response.status_code == 200
+        assert primary > 0
+        assert replica == []
+
+    def test_settling_page_from_replica_is_not_stored(
+        self, client, sample_venue, sample_artist, replica
+    ):
+        """Test that a replica render is not cached under fresh versions."""
+        with app.app_context():
+            db.session.add(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=datetime.now() + timedelta(days=1),
+                )
+            )
+            db.session.commit()
+        page_cache.backend.bumped.clear()
+        # Only known once the page lists the artist's show
+        page_cache.invalidate(f"artist:{sample_artist}")
+        client.get(f"/venues/{sample_venue}")
+        assert replica
+
+        replica.clear()
+        client.get(f"/venues/{sample_venue}")
+        assert replica
+
+
+class TestInstrumentation:
+    """Test per-request timing and SQL statistics."""
+
+    def test_server_timing(self, client, sample_venue):
+        """Test that Server-Timing reports the request's queries."""
+        response, statements = count_statements(client, f"/venues/{sample_venue}")
+        timing = response.headers["Server-Timing"]
+        assert re.match(r"app;dur=[\d.]+, db;dur=[\d.]+;desc=", timing)
+        assert f'"{statements} queries,' in timing
+
+    def test_request_log(self, client, sample_artist, tmp_path):
+        """Test that each request is logged as one JSON line."""
+        path = tmp_path / "requests.jsonl"
+        handler = request_log_handler(str(path))
+        request_logger.addHandler(handler)
+        request_logger.setLevel(logging.INFO)
+        try:
+            client.get("/artists?genre=Jazz")
+        finally:
+            request_logger.removeHandler(handler)
+        # Drain the queue now rather than at exit
+        handler.listener.stop()
+        atexit.unregister(handler.listener.stop)
+
+        (entry,) = [json.loads(line) for line in path.read_text().splitlines()]
+        assert entry["path"] == "/artists?genre=Jazz"
+        assert entry["endpoint"] == "artists"
+        assert entry["status"] == 200
+        assert entry["queries"] >= 1
+        assert entry["rows"] >= 1
+
+
+class TestSeed:
+    """Test the synthetic dataset generator."""
+
+    def seed(self, *args):
+        return app.test_cli_runner().invoke(
+            args=["seed", "--venues", "3", "--artists", "4", "--shows", "20", *args]
+        )
+
+    def snapshot(self):
+        with app.app_context():
+            return [
+                [
+                    (row.id, row.name, row.city, row.genres)
+                    for row in model.query.order_by(model.id)
+                ]
+                for model in (Venue, Artist)
+            ] + [
+                [
+                    (show.venue_id, show.artist_id, show.start_time)
+                    for show in Show.query.order_by(Show.id)
+                ]
+            ]
+
+    def test_seed_is_deterministic(self, client):
+        """Test that the same seed reproduces the same rows and ids."""
+        result = self.seed()
+        assert result.exit_code == 0, result.output
+        assert "Show: 20 rows" in result.output
+        first = self.snapshot()
+
+        assert self.seed("--reset").exit_code == 0
+        assert self.snapshot() == first
+        assert self.seed("--reset", "--seed", "7").exit_code == 0
+        assert self.snapshot() != first
+
+    def test_shows_fill_every_block(self):
+        """Test that venues filled to capacity get one show per block."""
+        today = datetime(2030, 1, 1)
+        count = 2 * 2 * BLOCKS_PER_YEAR
+        rows = list(show_rows(random.Random(1), 2, 5, count, today))
+        starts = {(venue_id, start.replace(minute=0)) for venue_id, _, start, _ in rows}
+        assert len(starts) == count
+
+    def test_refuses_to_overwrite(self, client, sample_venue):
+        """Test that existing data is only replaced with --reset."""
+        result = self.seed()
+        assert result.exit_code != 0
+        assert "--reset" in result.output
+
+
+class TestAssets:
+    """Test the bundled, fingerprinted and precompressed static assets."""
+
+    @pytest.fixture
+    def built(self, client, tmp_path, monkeypatch):
+        static = tmp_path / "static"
+        shutil.copytree(
+            app.static_folder, static, ignore=shutil.ignore_patterns("dist")
+        )
+        monkeypatch.setattr(app, "static_folder", str(static))
+        manifest = build(str(static))
+        monkeypatch.setattr(assets, "manifest", manifest)
+        return manifest
+
+    def test_sources_without_build(self, client, monkeypatch):
+        """Test that pages link the separate source files when nothing is built."""
+        monkeypatch.setattr(assets, "manifest", {})
+        html = client.get("/").get_data(as_text=True)
+        for sources in BUNDLES.values():
+            for source in sources:
+                assert f"/static/{source}" in html
+
+    def test_pages_link_bundles(self, client, built):
+        """Test that pages link one fingerprinted file per bundle."""
+        html = client.get("/").get_data(as_text=True)
+        for filename in built.values():
+            assert f"/assets/{filename}" in html
+        assert "/static/css/main.css" not in html
+        assert re.fullmatch(r"main\.[0-9a-f]{12}\.css", built["main.css"])
+
+    def test_css_urls_are_absolute(self, client, built):
+        """Test that font URLs still resolve from the bundle's location."""
+        css = client.get(f"/assets/{built['main.css']}").get_data(as_text=True)
+        assert "../fonts" not in css
+        assert 'url("/static/fonts/glyphicons-halflings-regular.woff")' in css
+
+    def test_build_is_deterministic(self, built):
+        """Test that rebuilding unchanged sources keeps the same names."""
+        assert build(app.static_folder) == built
+
+    def test_serves_precompressed(self, client, built):
+        """Test that the gzip variant is served to clients that accept it."""
+        url = f"/assets/{built['main.css']}"
+        plain = client.get(url)
+        assert plain.status_code == 200
+        assert plain.mimetype == "text/css"
+        assert "Content-Encoding" not in plain.headers
+        assert plain.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+        assert "Accept-Encoding" in plain.headers["Vary"]
+
+        compressed = client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        assert compressed.headers["Cache-Control"] == plain.headers["Cache-Control"]
+        assert gzip.decompress(compressed.data) == plain.data
+        assert len(compressed.data) < len(plain.data)
+
+    def test_unknown_files(self, client, built):
+        """Test that only built files are served."""
+        assert client.get("/assets/missing.css").status_code == 404
+        assert client.get("/assets/../css/main.css").status_code == 404
+
+
+class TestSoftDelete:
+    """Test soft deletion and the batched purge."""
+
+    @pytest.fixture
+    def tombstoned(self, client, sample_venue, sample_artist):
+        with app.app_context():
+            db.session.add_all(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=datetime.now() + timedelta(days=day),
+                )
+                for day in range(-2, 3)
+            )
+            db.session.commit()
+        response = client.delete(f"/venues/{sample_venue}")
+        assert response.json == {"success": True}
+        return sample_venue, sample_artist
+
+    def test_delete_is_one_update(self, client, sample_venue):
+        """Test that deleting a venue only marks its row."""
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            client.post(f"/venues/{sample_venue}/delete")
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+        writes = [s for s in statements if s.startswith(("UPDATE", "DELETE"))]
+        assert len(writes) == 1
+        assert writes[0].startswith('UPDATE "Venue" SET')
+
+    def test_deleted_venue_is_hidden(self, client, tombstoned):
+        """Test that a tombstoned venue and its shows leave every page."""
+        venue_id, artist_id = tombstoned
+        assert client.get(f"/venues/{venue_id}").status_code == 404
+        assert client.get(f"/api/v1/venues/{venue_id}").status_code == 404
+        assert b"Test Venue" not in client.get("/venues").data
+        assert b"Test Venue" not in client.get("/").data
+        assert b"tile-show" not in client.get("/shows").data
+        assert b"Test Venue" not in client.get(f"/artists/{artist_id}").data
+        response = client.post("/venues/search", data={"search_term": "Test"})
+        assert b"Test Venue" not in response.data
+        assert client.get("/api/v1/venues").get_json()["data"] == []
+        artists = client.get("/api/v1/artists").get_json()["data"]
+        assert [artist["num_upcoming_shows"] for artist in artists] == [0]
+        assert b"0 Upcoming Shows" in client.get(f"/artists/{artist_id}").data
+        for kind in ("venues", "artists", "shows"):
+            with app.app_context():
+                rows = b"".join(exporter.export(kind, "csv")).decode().splitlines()
+            assert len(rows) == (2 if kind == "artists" else 1)
+            assert "Test Venue" not in rows[-1]
+
+        with app.app_context():
+            # The rows stay until purged
+            assert Show.query.count() == 5
+            stmt = select(Venue.id).execution_options(include_deleted=True)
+            assert db.session.scalars(stmt).all() == [venue_id]
+
+    def test_no_writes_to_deleted_venue(self, client, tombstoned):
+        """Test that shows cannot be added to a tombstoned venue."""
+        venue_id, artist_id = tombstoned
+        response = client.post(
+            "/shows/create",
+            data={
+                "venue_id": venue_id,
+                "artist_id": artist_id,
+                "start_time": "2030-01-01 20:00:00",
+            },
+            follow_redirects=True,
+        )
+        assert f"Venue {venue_id} does not exist".encode() in response.data
+        row = f"{artist_id}, {venue_id}, 2030-01-02 20:00:00"
+        response = client.post("/shows/batch", data={"shows": row})
+        assert f"venue {venue_id} does not exist".encode() in response.data
+        with app.app_context():
+            assert Show.query.count() == 5
+
+    def test_deleted_venue_frees_its_artists(
+        self, client, sample_venue, sample_artist, tmp_path
+    ):
+        """Test that shows of a deleted venue no longer block the artist."""
+        with app.app_context():
+            other = Venue(name="Other", city="SF", state="CA", address="2 Main St")
+            db.session.add(other)
+            db.session.add_all(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=datetime(2031, 1, day, 20),
+                )
+                for day in (1, 2)
+            )
+            db.session.commit()
+            other_id = other.id
+        client.delete(f"/venues/{sample_venue}")
+
+        response = client.get(
+            f"/api/v1/artists/{sample_artist}/slots?venue_id={other_id}"
+            "&from=2031-01-01T00:00&to=2031-01-03T00:00&length=120"
+        )
+        starts = [slot["start_time"] for slot in response.get_json()["data"]]
+        assert starts == ["2031-01-01T00:00:00"]
+
+        path = tmp_path / "shows.csv"
+        path.write_text(
+            f"venue_id,artist_id,start_time\n{other_id},{sample_artist},"
+            "2031-01-01 20:00:00\n"
+        )
+        result = app.test_cli_runner().invoke(args=["import", "shows", str(path)])
+        assert "Imported 1 of 1 shows" in result.output
+        response = client.post(
+            "/api/v1/shows/batch",
+            json=[
+                {
+                    "venue_id": other_id,
+                    "artist_id": sample_artist,
+                    "start_time": "2031-01-02 20:00:00",
+                }
+            ],
+        )
+        assert response.status_code == 201
+
+    def test_no_writes_to_deleted_artist(self, client, sample_artist):
+        """Test that availability, albums and songs of a deleted artist fail."""
+        with app.app_context():
+            album = Album(artist_id=sample_artist, name="Kept")
+            db.session.add(album)
+            soft_delete(db.session.get(Artist, sample_artist))
+            db.session.commit()
+            album_id = album.id
+        response = client.post(
+            f"/artists/{sample_artist}/availability",
+            data={
+                "start_time": "2030-01-01 00:00:00",
+                "end_time": "2030-01-02 00:00:00",
+            },
+            follow_redirects=True,
+        )
+        assert f"Artist {sample_artist} does not exist".encode() in response.data
+        client.post(f"/artists/{sample_artist}/albums", data={"album_name": "New"})
+        client.post(f"/albums/{album_id}/songs", data={"song_name": "New"})
+        with app.app_context():
+            assert Availability.query.count() == 0
+            assert Album.query.count() == 1
+            assert Song.query.count() == 0
+
+    def test_purge(self, client, tombstoned):
+        """Test that the purge removes tombstones and dependants in batches."""
+        venue_id, artist_id = tombstoned
+        with app.app_context():
+            artist = db.session.get(Artist, artist_id)
+            album = Album(artist_id=artist_id, name="Gone")
+            album.songs.append(Song(name="Gone Song"))
+            db.session.add(album)
+            soft_delete(artist)
+            db.session.commit()
+
+        reports = []
+        with app.app_context():
+            total = purge(
+                batch_size=2, report=lambda model, *args: reports.append(model)
+            )
+            assert total == 5 + 1 + 1 + 1 + 1
+            assert reports == [Venue, Artist]
+            for model in (Venue, Artist, Show, Album, Song):
+                stmt = select(model.id).execution_options(include_deleted=True)
+                assert db.session.scalars(stmt).all() == []
+
+    def test_purge_rate_limit(self, client, tombstoned, monkeypatch):
+        """Test that the purge sleeps to stay under its rows per second."""
+        slept = []
+        monkeypatch.setattr(soft_delete_module.time, "sleep", slept.append)
+        with app.app_context():
+            assert purge(batch_size=2, rate=2) == 6
+        assert slept and max(slept) <= 3
+
+    def test_purge_cli(self, client, tombstoned):
+        """Test that the purge command reports its progress."""
+        venue_id, _ = tombstoned
+        result = app.test_cli_runner().invoke(args=["purge", "--batch-size", "2"])
+        assert result.exit_code == 0, result.output
+        assert f"Venue {venue_id} purged (Show 5, Venue 1)" in result.output
+        assert "Purged 6 rows" in result.output
+
+
+class TestQueryPlans:
+    """Check with EXPLAIN that each route's queries use their indexes."""
+
+    def explain_route(self, client, url, method="get", disable=("seqscan",), **kwargs):
+        """Run a request and return the EXPLAIN output of every statement.
+
+        The test tables are tiny, so scans named in `disable` are switched
+        off to see which indexes the planner can use at all.
+        """
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            getattr(client, method)(url, **kwargs)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+
+        with db.engine.connect() as conn:
+            for scan in disable:
+                conn.exec_driver_sql(f"SET enable_{scan} = off")
+            return "\n".join(
+                row[0]
+                for statement, parameters in statements
+                for row in conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+            )
+
+    @pytest.fixture
+    def catalogue(self, client, sample_venue, sample_artist):
+        with app.app_context():
+            album = Album(artist_id=sample_artist, name="Album")
+            db.session.add_all(
+                [
+                    album,
+                    Show(
+                        venue_id=sample_venue,
+                        artist_id=sample_artist,
+                        start_time=datetime.now() + timedelta(days=1),
+                    ),
+                    Availability(
+                        artist_id=sample_artist,
+                        start_time=datetime.now(),
+                        end_time=datetime.now() + timedelta(days=7),
+                    ),
+                ]
+            )
+            db.session.commit()
+            db.session.add(Song(album_id=album.id, name="Song"))
+            db.session.commit()
+            self.assume_live_rows()
+        return sample_venue, sample_artist
+
+    def assume_live_rows(self):
+        """Give deleted_at the statistics of a real catalogue: nearly all NULL.
+
+        Without statistics the planner guesses that few rows pass the
+        soft-delete filter and drives joins from the venue or artist side.
+        Setting statistics by hand needs PostgreSQL 18.
+        """
+        if int(db.session.execute(text("SHOW server_version_num")).scalar()) < 180000:
+            return
+        for table in ("Venue", "Artist"):
+            db.session.execute(
+                text(
+                    "SELECT pg_restore_attribute_stats("
+                    "'schemaname', 'public', 'relname', :table, "
+                    "'attname', 'deleted_at', 'inherited', false, "
+                    "'null_frac', 1.0::real, 'avg_width', 8, 'n_distinct', 0::real)"
+                ),
+                {"table": table},
+            )
+        db.session.commit()
+
+    @pytest.mark.parametrize(
+        "url, indexes",
+        [
+            ("/", ['Index Scan Backward using "Venue_pkey"']),
+            ("/venues", ["ix_Venue_state_city_id", "ix_Show_start_time_id"]),
+            ("/venues?genre=Jazz", ["ix_Venue_genres"]),
+            ("/artists?genre=Pop", ["ix_Artist_genres"]),
+            ("/shows", ["ix_Show_start_time_id"]),
+            ("/shows?from=2030-01-01", ["ix_Show_start_time_id"]),
+            ("/venues/{venue_id}", ["ix_Show_venue_id_start_time"]),
+            (
+                "/artists/{artist_id}",
+                [
+                    "ix_Show_artist_id_start_time",
+                    "ex_Availability_artist_id_window",
+                    "ix_Album_artist_id",
+                    "ix_Song_album_id",
+                ],
+            ),
+        ],
+    )
+    def test_route_uses_indexes(self, client, catalogue, url, indexes):
+        """Test that listing and detail routes are served from indexes."""
+        venue_id, artist_id = catalogue
+        plan = self.explain_route(
+            client, url.format(venue_id=venue_id, artist_id=artist_id)
+        )
+        for index in indexes:
+            assert index in plan
+        assert "Seq Scan" not in plan
+
+    @pytest.mark.parametrize("kind", ["venues", "artists"])
+    def test_search_uses_trigram_indexes(self, client, catalogue, kind):
+        """Test that search is answered by the trigram indexes."""
+        table = kind[:-1].capitalize()
+        plan = self.explain_route(
+            client,
+            f"/{kind}/search",
+            method="post",
+            data={"search_term": "test"},
+            # A full primary key scan is cheaper than a BitmapOr on a near
+            # empty table; leave the planner only bitmap scans to pick from.
+            disable=("seqscan", "indexscan"),
+        )
+        for column in ("name", "city", "state"):
+            assert f"ix_{table}_{column}_trgm" in plan
+        assert f"ix_{table}_genres" in plan
+        assert f'Seq Scan on "{table}"' not in plan
+
+
+class TestDatetimeFilter:
+    """Test the cached datetime formatting filter."""
+
+    @pytest.mark.parametrize("format", ["full", "medium", "yyyy-MM-dd HH:mm"])
+    def test_matches_babel(self, format):
+        """Test that cached output matches babel's own formatting."""
+        value = datetime(2030, 5, 17, 21, 30)
+        expected = babel.dates.format_datetime(
+            value, DATETIME_FORMATS.get(format, format), locale="en"
+        )
+        assert format_datetime(value, format) == expected
+
+    def test_accepts_strings(self):
+        """Test that string timestamps are still parsed."""
+        value = datetime(2030, 5, 17, 21, 30)
+        assert format_datetime(str(value), "full") == format_datetime(value, "full")
+
+    def test_repeated_timestamps_hit_cache(self):
+        """Test that formatting the same timestamp twice is memoized."""
+        value = datetime(2031, 1, 2, 3, 4)
+        format_datetime(value, "full")
+        hits = format_datetime_cached.cache_info().hits
+        format_datetime(value, "full")
+        assert format_datetime_cached.cache_info().hits == hits + 1
+
+
+def count_statements(client, url, **kwargs):
+    """Return the response for `url` and the number of SQL statements run."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        response = client.open(url, **kwargs)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    return response, len(statements)
+
+
+class TestDetailPages:
+    """Test that detail pages run a fixed number of queries."""
+
+    def add_catalogue(self, venue_id, artist_id, shows, albums, first_day=1):
+        now = datetime.now()
+        with app.app_context():
+            for day in range(first_day, first_day + shows):
+                db.session.add_all(
+                    [
+                        Show(
+                            venue_id=venue_id,
+                            artist_id=artist_id,
+                            start_time=now + timedelta(days=day),
+                        ),
+                        Show(
+                            venue_id=venue_id,
+                            artist_id=artist_id,
+                            start_time=now - timedelta(days=day),
+                        ),
+                        Availability(
+                            artist_id=artist_id,
+                            start_time=now + timedelta(days=day),
+                            end_time=now + timedelta(days=day, hours=1),
+                        ),
+                    ]
+                )
+            for number in range(albums):
+                album = Album(artist_id=artist_id, name=f"Album {number}")
+                album.songs = [Song(name=f"Song {n}") for n in range(3)]
+                db.session.add(album)
+            db.session.commit()
+
+    def test_query_count_is_constant(self, client, sample_venue, sample_artist):
+        """Test that more shows and albums do not add queries."""
+        self.add_catalogue(sample_venue, sample_artist, shows=1, albums=1)
+        _, venue_small = count_statements(client, f"/venues/{sample_venue}")
+        _, artist_small = count_statements(client, f"/artists/{sample_artist}")
+
+        self.add_catalogue(sample_venue, sample_artist, shows=10, albums=5, first_day=2)
+        _, venue_large = count_statements(client, f"/venues/{sample_venue}")
+        _, artist_large = count_statements(client, f"/artists/{sample_artist}")
+
+        # One validator query for the ETag, then the page's own queries
+        assert venue_small == venue_large <= 4
+        assert artist_small == artist_large <= 7
+
+    def test_sections_are_limited(self, client, sample_venue, sample_artist):
+        """Test that each section is capped while counts cover all shows."""
+        self.add_catalogue(sample_venue, sample_artist, shows=5, albums=0)
+        with app.app_context():
+            shows = show_sections(
+                Show.venue_id, sample_venue, Artist, datetime.now(), limit=2
+            )
+
+        assert shows["past_shows_count"] == shows["upcoming_shows_count"] == 5
+        assert len(shows["past_shows"]) == len(shows["upcoming_shows"]) == 2
+        upcoming = [show["start_time"] for show in shows["upcoming_shows"]]
+        past = [show["start_time"] for show in shows["past_shows"]]
+        assert upcoming == sorted(upcoming)
+        assert past == sorted(past, reverse=True)
+        assert past[0] > past[1] > datetime.now() - timedelta(days=3)
+        assert shows["upcoming_shows"][0]["artist_name"] == "Test Artist"
+
+    def test_missing_entity_is_404(self, client):
+        """Test that unknown ids return 404 rather than a server error."""
+        assert client.get("/venues/999999").status_code == 404
+        assert client.get("/artists/999999").status_code == 404
+
+
+def grow_catalogue(step, size):
+    """Bulk-add `size` venues and artists with shows, windows and albums.
+
+    Venue 1 and artist 1 (the sample fixtures) gain shows and albums on
+    every call, so their detail pages grow with the dataset too.
+    """
+    now = datetime.now()
+    venues = db.session.scalars(
+        insert(Venue).returning(Venue.id),
+        [
+            {
+                "name": f"Venue {step}.{i}",
+                "city": f"City {i % 7}",
+                "state": "CA",
+                "address": "1 St",
+                "genres": ["Jazz"],
+            }
+            for i in range(size)
+        ],
+    ).all()
+    artists = db.session.scalars(
+        insert(Artist).returning(Artist.id),
+        [
+            {
+                "name": f"Artist {step}.{i}",
+                "city": f"City {i % 7}",
+                "state": "CA",
+                "genres": ["Jazz"],
+            }
+            for i in range(size)
+        ],
+    ).all()
+    shows = []
+    for i, (venue_id, artist_id) in enumerate(zip(venues, artists)):
+        for days in (-(step * size + i + 1), step * size + i + 1):
+            shows += [
+                {
+                    "venue_id": venue_id,
+                    "artist_id": artist_id,
+                    "start_time": now + timedelta(days=days),
+                },
+                {
+                    "venue_id": 1,
+                    "artist_id": artist_id,
+                    "start_time": now + timedelta(days=days, hours=1),
+                },
+                {
+                    "venue_id": venue_id,
+                    "artist_id": 1,
+                    "start_time": now + timedelta(days=days, hours=2),
+                },
+            ]
+    db.session.execute(insert(Show), shows)
+    db.session.execute(
+        insert(Availability),
+        [
+            {
+                "artist_id": artist_id,
+                "start_time": now,
+                "end_time": now + timedelta(days=1),
+            }
+            for artist_id in artists
+        ],
+    )
+    albums = db.session.scalars(
+        insert(Album).returning(Album.id),
+        [{"artist_id": 1, "name": f"Album {step}.{i}"} for i in range(size)],
+    ).all()
+    db.session.execute(
+        insert(Song),
+        [
+            {"album_id": album_id, "name": f"Song {n}"}
+            for album_id in albums
+            for n in range(3)
+        ],
+    )
+    db.session.commit()
+
+
+class TestPerformanceBudgets:
+    """Test every read route against its query and latency budget.
+
+    Each route is measured as the dataset grows. Its statement count must
+    not change with the data size and must stay within the budget; its
+    median latency must stay under the route's ceiling.
+    """
+
+    # (method, url, form data, max statements, max median ms)
+    BUDGETS = [
+        ("GET", "/", None, 2, 200),
+        ("GET", "/venues", None, 2, 300),
+        ("GET", "/artists", None, 2, 300),
+        ("GET", "/shows", None, 2, 300),
+        ("GET", "/venues/1", None, 4, 300),
+        ("GET", "/artists/1", None, 7, 300),
+        ("POST", "/venues/search", {"search_term": "Venue"}, 1, 300),
+        ("POST", "/artists/search", {"search_term": "Jazz"}, 1, 300),
+        ("GET", "/api/v1/venues", None, 1, 300),
+        ("GET", "/api/v1/artists/1", None, 3, 300),
+        ("GET", "/api/v1/shows", None, 1, 300),
+    ]
+    DATASET_SIZES = (1, 10, 50)
+    RUNS = 3
+
+    def measure(self, client, method, url, data):
+        """Statement count and median latency in ms over RUNS requests."""
+        timings, counts = [], set()
+        for _ in range(self.RUNS):
+            started = time.perf_counter()
+            response, statements = count_statements(
+                client, url, method=method, data=data
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, url
+            counts.add(statements)
+        assert len(counts) == 1, f"{url} ran {counts} statements on repeat"
+        return counts.pop(), sorted(timings)[len(timings) // 2]
+
+    @pytest.mark.parametrize(
+        "method, url, data, max_statements, max_ms",
+        BUDGETS,
+        ids=[f"{method} {url}" for method, url, *_ in BUDGETS],
+    )
+    def test_route_budget(
+        self,
+        client,
+        sample_venue,
+        sample_artist,
+        monkeypatch,
+        method,
+        url,
+        data,
+        max_statements,
+        max_ms,
+    ):
+        # Measure the queries, not the page cache
+        monkeypatch.setattr(page_cache, "backend", None)
+        assert (sample_venue, sample_artist) == (1, 1)
+
+        counts = {}
+        for step, size in enumerate(self.DATASET_SIZES):
+            with app.app_context():
+                grow_catalogue(step, size)
+            statements, median_ms = self.measure(client, method, url, data)
+            counts[size] = statements
+            assert median_ms <= max_ms, f"{url}: {median_ms:.0f}ms at size {size}"
+
+        assert len(set(counts.values())) == 1, f"{url} queries grow: {counts}"
+        assert counts[self.DATASET_SIZES[0]] <= max_statements
+
+
+class TestPageCache:
+    """Test the rendered page cache and its write-driven invalidation."""
+
+    @pytest.fixture
+    def booked(self, client, sample_venue, sample_artist):
+        with app.app_context():
+            other = Venue(name="Other Venue", city="Austin", state="TX", address="1")
+            db.session.add_all(
+                [
+                    other,
+                    Show(
+                        venue_id=sample_venue,
+                        artist_id=sample_artist,
+                        start_time=datetime.now() + timedelta(days=1),
+                    ),
+                ]
+            )
+            db.session.commit()
+            return sample_venue, sample_artist, other.id
+
+    def test_repeat_hit_runs_no_queries(self, client, booked):
+        """Test that a cached page is served without touching the database."""
+        venue_id, _, _ = booked
+        first, _ = count_statements(client, f"/venues/{venue_id}")
+        second, statements = count_statements(client, f"/venues/{venue_id}")
+        assert statements == 0
+        assert second.data == first.data
+
+    def test_write_invalidates_only_affected_pages(self, client, booked):
+        """Test that an artist edit reaches pages showing that artist only."""
+        venue_id, artist_id, other_id = booked
+        for url in ("/artists", f"/venues/{venue_id}", f"/venues/{other_id}"):
+            client.get(url)
+
+        client.post(
+            f"/artists/{artist_id}/edit",
+            data={"name": "Renamed Artist", "city": "LA", "state": "CA"},
+        )
+
+        assert b"Renamed Artist" in client.get("/artists").data
+        assert b"Renamed Artist" in client.get(f"/venues/{venue_id}").data
+        _, statements = count_statements(client, f"/venues/{other_id}")
+        assert statements == 0
+
+    def test_add_song_invalidates_artist_page(self, client, sample_artist):
+        """Test that writes to an album reach the artist page."""
+        with app.app_context():
+            album = Album(artist_id=sample_artist, name="Cached Album")
+            db.session.add(album)
+            db.session.commit()
+            album_id = album.id
+        client.get(f"/artists/{sample_artist}")
+
+        client.post(f"/albums/{album_id}/songs", data={"song_name": "Fresh Song"})
+        # The redirect target renders the flash, and is not cached
+        response = client.get(f"/artists/{sample_artist}")
+        assert b"Song added!" in response.data
+        assert b"Fresh Song" in response.data
+        assert b"Song added!" not in client.get(f"/artists/{sample_artist}").data
+
+    def test_venue_delete_invalidates_artist_pages(self, client, booked):
+        """Test that shows deleted by the database leave their artist pages."""
+        venue_id, artist_id, _ = booked
+        assert b"Test Venue" in client.get(f"/artists/{artist_id}").data
+
+        client.post(f"/venues/{venue_id}/delete")
+        client.get("/")  # consume the flash
+        assert b"Test Venue" not in client.get(f"/artists/{artist_id}").data
+
+    def test_artist_delete_invalidates_album_pages(self, client, booked):
+        """Test that albums removed with an artist have their pages invalidated."""
+        venue_id, artist_id, _ = booked
+        with app.app_context():
+            album = Album(artist_id=artist_id, name="Album")
+            db.session.add(album)
+            db.session.commit()
+            artist = db.session.get(Artist, artist_id)
+            assert cascade_tags(db.session, artist) == {
+                "shows",
+                f"venue:{venue_id}",
+                f"album:{album.id}",
+            }
+
+    def test_lru_backend_evicts_and_expires(self):
+        """Test LRU eviction order and TTL expiry."""
+        backend = LRUBackend(maxsize=2)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        backend.get("a")
+        backend.set("c", 3)
+        assert backend.get("b") is None
+        assert backend.get("a") == 1
+
+        backend.set("d", 4, ttl=-1)
+        assert backend.get("d") is None
+
+    def test_lru_backend_keeps_tag_versions(self):
+        """Test that evicting pages never resets tag versions."""
+        backend = LRUBackend(maxsize=1)
+        backend.incr(["venue:1"])
+        backend.set("a", 1)
+        backend.set("b", 2)
+        assert backend.get_counters(["venue:1", "venue:2"]) == [1, 0]
+
+
+class TestConditionalGet:
+    """Test ETag revalidation of entity and listing pages."""
+
+    URLS = ("/venues", "/artists", "/shows", "/venues/{venue}", "/artists/{artist}")
+
+    @pytest.fixture
+    def booked(self, client, sample_venue, sample_artist):
+        with app.app_context():
+            db.session.add(
+                Show(
+                    venue_id=sample_venue,
+                    artist_id=sample_artist,
+                    start_time=datetime.now() + timedelta(days=1),
+                )
+            )
+            db.session.commit()
+        return sample_venue, sample_artist
+
+    def revalidate(self, client, url, etag):
+        page_cache.clear()
+        return count_statements(client, url, headers={"If-None-Match": etag})
+
+    @pytest.mark.parametrize("url", URLS)
+    def test_unchanged_page_returns_304(self, client, booked, url):
+        """Test that a matching ETag is answered by the validator alone."""
+        url = url.format(venue=booked[0], artist=booked[1])
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["ETag"].startswith('W/"')
+        assert "no-cache" in response.headers["Cache-Control"]
+
+        response, statements = self.revalidate(client, url, response.headers["ETag"])
+        assert response.status_code == 304
+        assert response.data == b""
+        assert statements == 1
+
+    def test_cached_page_returns_304(self, client, booked):
+        """Test that page cache hits honour If-None-Match without queries."""
+        etag = client.get("/artists").headers["ETag"]
+        response, statements = count_statements(
+            client, "/artists", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert statements == 0
+
+    def test_edit_changes_etag(self, client, booked):
+        """Test that editing an artist changes the venue page's ETag."""
+        venue_id, artist_id = booked
+        etag = client.get(f"/venues/{venue_id}").headers["ETag"]
+        client.post(
+            f"/artists/{artist_id}/edit",
+            data={"name": "Renamed Artist", "city": "LA", "state": "CA"},
+        )
+        response, _ = self.revalidate(client, f"/venues/{venue_id}", etag)
+        assert response.status_code == 200
+        assert b"Renamed Artist" in response.data
+
+    def test_delete_changes_etag(self, client, booked):
+        """Test that deletes, which leave no timestamp, change the ETag."""
+        venue_id, artist_id = booked
+        etag = client.get(f"/artists/{artist_id}").headers["ETag"]
+        with app.app_context():
+            Show.query.filter_by(artist_id=artist_id).delete()
+            db.session.commit()
+        response, _ = self.revalidate(client, f"/artists/{artist_id}", etag)
+        assert response.status_code == 200
+
+    def test_commit_changes_etag_without_newer_timestamp(
+        self, client, booked, monkeypatch
+    ):
+        """Test that a commit that moves no timestamp or count changes the ETag.
+
+        A transaction that started earlier can commit an older updated_at
+        after a newer one; only the shared tag versions bumped on commit move.
+        """
+        # The in-process counters stand in for the shared Redis ones
+        monkeypatch.setattr(type(page_cache), "local", False)
+        venue_id, artist_id = booked
+        etag = client.get(f"/artists/{artist_id}").headers["ETag"]
+        page_cache.invalidate(f"artist:{artist_id}")
+        response, _ = self.revalidate(client, f"/artists/{artist_id}", etag)
+        assert response.status_code == 200
+
+    def test_song_edit_changes_artist_etag(self, client, sample_artist):
+        """Test that song writes bump the tags of their artist's page."""
+        with app.app_context():
+            album = Album(artist_id=sample_artist, name="Album")
+            db.session.add(album)
+            db.session.commit()
+            album_id = album.id
+        tags = [f"artist:{sample_artist}"]
+        before = page_cache.backend.get_counters(tags)
+        with app.app_context():
+            db.session.add(Song(album_id=album_id, name="Song"))
+            db.session.commit()
+        assert page_cache.backend.get_counters(tags) != before
+
+    def test_etag_is_stable_across_processes(self, client, booked, monkeypatch):
+        """Test that another worker, with its own LRU, honours the ETag."""
+        venue_id, artist_id = booked
+        for url in (f"/artists/{artist_id}", "/venues"):
+            etag = client.get(url).headers["ETag"]
+            with monkeypatch.context() as patch:
+                patch.setattr(page_cache, "backend", LRUBackend())
+                response, _ = self.revalidate(client, url, etag)
+            assert response.status_code == 304
+
+    def test_missing_entity_is_not_validated(self, client):
+        """Test that a missing entity still 404s."""
+        assert client.get("/venues/999").status_code == 404
+
+
+class TestGenres:
+    """Test array-backed genres and the genre filters."""
+
+    def test_genres_round_trip_as_list(self, client, sample_venue):
+        """Test that genres are stored and rendered as a list."""
+        with app.app_context():
+            assert db.session.get(Venue, sample_venue).genres == ["Jazz", "Rock"]
+        response = client.get(f"/venues/{sample_venue}")
+        assert b'<span class="genre">Jazz</span>' in response.data
+
+    def test_long_genre_lists_are_not_truncated(self, client, sample_venue):
+        """Test that many genres fit, unlike the old String(120) column."""
+        response = client.post(
+            f"/venues/{sample_venue}/edit",
+            data={
+                "name": "Test Venue",
+                "city": "San Francisco",
+                "state": "CA",
+                "address": "123 Test St",
+                "genres": GENRES,
+            },
+        )
+        assert response.status_code == 302
+        with app.app_context():
+            assert db.session.get(Venue, sample_venue).genres == GENRES
+
+    def test_venue_genre_filter(self, client, sample_venue):
+        """Test /venues?genre= keeps only venues listing that genre."""
+        with app.app_context():
+            db.session.add(
+                Venue(
+                    name="Folk Hall",
+                    city="Boston",
+                    state="MA",
+                    address="1 Hall St",
+                    genres=["Folk"],
+                )
+            )
+            db.session.commit()
+
+        response = client.get("/venues?genre=Folk")
+        assert b"Folk Hall" in response.data
+        assert b"Test Venue" not in response.data
+        assert b"Test Venue" in client.get("/venues").data
+
+    def test_artist_genre_filter(self, client, sample_artist):
+        """Test /artists?genre= keeps only artists listing that genre."""
+        assert b"Test Artist" in client.get("/artists?genre=Pop").data
+        assert b"Test Artist" not in client.get("/artists?genre=Jazz").data
+
+
 class TestSearch:
     """Test search functionality."""
 
@@ -273,6 +1964,72 @@ class TestSearch:
         assert response.status_code == 200
         assert b"Test Artist" in response.data
 
+    def test_venue_search_matches_city_and_genre(self, client, sample_venue):
+        """Test that venue search also matches city and genres."""
+        response = client.post("/venues/search", data={"search_term": "francisco"})
+        assert b"Test Venue" in response.data
+
+        response = client.post("/venues/search", data={"search_term": "jazz"})
+        assert b"Test Venue" in response.data
+
+    def test_search_ranks_and_paginates(self, client):
+        """Test that name matches rank first and results are paginated."""
+        app.config["SEARCH_PAGE_SIZE"] = 2
+        with app.app_context():
+            db.session.add_all(
+                [
+                    Artist(name="Blue Note", city="Austin", state="TX"),
+                    Artist(name="Zed", city="Austin", state="TX", genres=["Blues"]),
+                    Artist(name="Bluegrass Boys", city="Austin", state="TX"),
+                ]
+            )
+            db.session.commit()
+
+            now = datetime.now()
+            first = search(Artist, Show.artist_id, "blue", now, page=1, per_page=2)
+            second = search(Artist, Show.artist_id, "blue", now, page=2, per_page=2)
+        try:
+            response = client.post(
+                "/artists/search", data={"search_term": "blue", "page": 2}
+            )
+        finally:
+            app.config["SEARCH_PAGE_SIZE"] = 20
+
+        assert first["count"] == second["count"] == 3
+        assert [a["name"] for a in first["data"]] == ["Blue Note", "Bluegrass Boys"]
+        assert [a["name"] for a in second["data"]] == ["Zed"]
+        assert b"Zed" in response.data
+        assert b"Blue Note" not in response.data
+
+    def test_search_counts_upcoming_shows(self, client, sample_venue, sample_artist):
+        """Test that search results carry upcoming show counts."""
+        with app.app_context():
+            db.session.add_all(
+                [
+                    Show(
+                        venue_id=sample_venue,
+                        artist_id=sample_artist,
+                        start_time=datetime.now() + timedelta(days=1),
+                    ),
+                    Show(
+                        venue_id=sample_venue,
+                        artist_id=sample_artist,
+                        start_time=datetime.now() - timedelta(days=1),
+                    ),
+                ]
+            )
+            db.session.commit()
+            results = search(Venue, Show.venue_id, "test", datetime.now())
+
+        assert results["data"] == [
+            {"id": sample_venue, "name": "Test Venue", "num_upcoming_shows": 1}
+        ]
+
+    def test_search_escapes_wildcards(self, client, sample_venue):
+        """Test that LIKE wildcards in the term are matched literally."""
+        response = client.post("/venues/search", data={"search_term": "%"})
+        assert b"Test Venue" not in response.data
+
 
 class TestShowsTimeSplit:
     """Test past vs upcoming shows distinction."""
@@ -320,7 +2077,7 @@ class TestCreateOperations:
                 state="TX",
                 address="789 Music Ave",
                 phone="555-9999",
-                genres="Jazz,Blues",
+                genres=["Jazz", "Blues"],
                 facebook_link="https://facebook.com/test",
             )
             db.session.add(venue)
@@ -339,7 +2096,7 @@ class TestCreateOperations:
                 city="Nashville",
                 state="TN",
                 phone="555-8888",
-                genres="Country,Folk",
+                genres=["Country", "Folk"],
                 facebook_link="https://facebook.com/test",
             )
             db.session.add(artist)
@@ -509,5 +2266,469 @@ class TestBonusFeatures:
         assert b"not available" in response.data
 
 
+class TestAvailabilityWindows:
+    """Test range-indexed availability windows."""
+
+    def add_window(self, artist_id, start, end):
+        with app.app_context():
+            db.session.add(
+                Availability(artist_id=artist_id, start_time=start, end_time=end)
+            )
+            db.session.commit()
+
+    def test_containment_lookup(self, client, sample_artist):
+        """Test that window bounds are inclusive."""
+        start, end = datetime(2030, 1, 1), datetime(2030, 1, 8)
+        with app.app_context():
+            assert tuple(artist_availability(sample_artist, start)) == (
+                False,
+                False,
+            )
+        self.add_window(sample_artist, start, end)
+        with app.app_context():
+            for at, available in [
+                (start, True),
+                (end, True),
+                (start + timedelta(days=3), True),
+                (end + timedelta(seconds=1), False),
+            ]:
+                assert tuple(artist_availability(sample_artist, at)) == (
+                    True,
+                    available,
+                )
+
+    def test_overlapping_window_rejected(self, client, sample_artist):
+        """Test that the exclusion constraint rejects overlapping windows."""
+        self.add_window(sample_artist, datetime(2030, 1, 1), datetime(2030, 1, 8))
+        response = client.post(
+            f"/artists/{sample_artist}/availability",
+            data={
+                "start_time": "2030-01-08 00:00:00",
+                "end_time": "2030-01-09 00:00:00",
+            },
+            follow_redirects=True,
+        )
+        assert b"overlaps an existing availability window" in response.data
+        with app.app_context():
+            assert Availability.query.count() == 1
+
+    def test_other_integrity_errors_flash(self, client, sample_artist, monkeypatch):
+        """Test that other constraint errors get the generic message, not a 500."""
+
+        class ForeignKeyViolation(Exception):
+            pgcode = "23503"
+
+        def commit():
+            raise IntegrityError("INSERT", {}, ForeignKeyViolation())
+
+        monkeypatch.setattr(db.session, "commit", commit)
+        response = client.post(
+            f"/artists/{sample_artist}/availability",
+            data={
+                "start_time": "2030-01-08 00:00:00",
+                "end_time": "2030-01-09 00:00:00",
+            },
+            follow_redirects=True,
+        )
+        assert response.status_code == 200
+        assert b"Error adding availability." in response.data
+
+    def test_other_artists_may_overlap(self, client, sample_artist):
+        """Test that the constraint only applies within one artist."""
+        window = (datetime(2030, 1, 1), datetime(2030, 1, 8))
+        with app.app_context():
+            other = Artist(name="Other", city="Austin", state="TX")
+            db.session.add(other)
+            db.session.commit()
+            other_id = other.id
+        self.add_window(sample_artist, *window)
+        self.add_window(other_id, *window)
+        with app.app_context():
+            assert Availability.query.count() == 2
+
+    def test_show_booking_uses_gist_index(self, client, sample_venue, sample_artist):
+        """Test that the availability check is an index lookup."""
+        self.add_window(sample_artist, datetime(2030, 1, 1), datetime(2030, 1, 8))
+        plan = TestQueryPlans().explain_route(
+            client,
+            "/shows/create",
+            method="post",
+            data={
+                "venue_id": sample_venue,
+                "artist_id": sample_artist,
+                "start_time": "2030-01-03 20:00:00",
+            },
+        )
+        assert "ex_Availability_artist_id_window" in plan
+        assert 'Seq Scan on "Availability"' not in plan
+
+
+class TestShowBatches:
+    """Test booking many shows in one request."""
+
+    def setup_catalogue(self, venue_id, artist_id):
+        with app.app_context():
+            db.session.add_all(
+                [
+                    Availability(
+                        artist_id=artist_id,
+                        start_time=datetime(2030, 1, 1),
+                        end_time=datetime(2030, 1, 31),
+                    ),
+                    Show(
+                        venue_id=venue_id,
+                        artist_id=artist_id,
+                        start_time=datetime(2030, 1, 5, 20),
+                    ),
+                ]
+            )
+            db.session.commit()
+
+    def test_form_reports_each_line(self, client, sample_venue, sample_artist):
+        """Test that valid lines are listed and the others explained."""
+        self.setup_catalogue(sample_venue, sample_artist)
+        lines = [
+            f"{sample_artist}, {sample_venue}, 2030-01-10 20:00:00",
+            f"{sample_artist}, 999, 2030-01-11 20:00:00",
+            f"{sample_artist}, {sample_venue}, 2030-03-01 20:00:00",
+            f"{sample_artist}, {sample_venue}, 2030-01-05 20:00:00",
+            f"{sample_artist}, {sample_venue}, 2030-01-10 20:00:00",
+            "",
+            "not a show",
+        ]
+        response = client.post("/shows/batch", data={"shows": "\n".join(lines)})
+        assert response.status_code == 200
+        assert b"1 of 6 shows were listed." in response.data
+        assert b"venue 999 does not exist" in response.data
+        assert b"is not available at that time" in response.data
+        assert response.data.count(b"already has a show at that time") == 2
+        assert b"invalid row" in response.data
+        with app.app_context():
+            assert Show.query.count() == 2
+
+    def test_row_limit(self, client, sample_venue, sample_artist):
+        """Test that oversized batches are refused before any check runs."""
+        app.config["SHOW_BATCH_MAX_ROWS"] = 2
+        try:
+            line = f"{sample_artist}, {sample_venue}, 2030-01-10 20:00:00\n"
+            response = client.post("/shows/batch", data={"shows": line * 3})
+        finally:
+            app.config["SHOW_BATCH_MAX_ROWS"] = 200
+        assert b"At most 2 shows can be booked at once." in response.data
+        with app.app_context():
+            assert Show.query.count() == 0
+
+    def test_api_batch(self, client, sample_venue, sample_artist):
+        """Test the JSON endpoint's per-row results and status codes."""
+        self.setup_catalogue(sample_venue, sample_artist)
+        row = {"venue_id": sample_venue, "artist_id": sample_artist}
+        response = client.post(
+            "/api/v1/shows/batch",
+            json=[
+                {**row, "start_time": "2030-01-10 20:00:00"},
+                {**row, "start_time": "2030-01-12 20:00:00"},
+            ],
+        )
+        assert response.status_code == 201
+        body = response.get_json()
+        assert body["created"] == 2
+        assert [result["row"] for result in body["data"]] == [1, 2]
+
+        response = client.post(
+            "/api/v1/shows/batch",
+            json=[{**row, "start_time": "2030-01-10 20:00:00"}, "nope"],
+        )
+        assert response.status_code == 422
+        body = response.get_json()
+        assert body["rejected"] == 2
+        assert "already has a show" in body["data"][0]["error"]
+        assert "expected a JSON object" in body["data"][1]["error"]
+
+        assert client.post("/api/v1/shows/batch", json={}).status_code == 400
+
+    def test_no_known_rows(self, client, tmp_path):
+        """Test that a batch with only unknown ids is reported, not a 500."""
+        row = {"artist_id": 5, "venue_id": 7, "start_time": "2030-01-10 20:00:00"}
+        response = client.post("/api/v1/shows/batch", json=[row])
+        assert response.status_code == 422
+        assert response.get_json()["data"] == [
+            {"row": 1, "error": "venue 7 does not exist"}
+        ]
+        response = client.post(
+            "/shows/batch", data={"shows": "5, 7, 2030-01-10 20:00:00"}
+        )
+        assert b"venue 7 does not exist" in response.data
+
+        path = tmp_path / "shows.csv"
+        path.write_text("artist_id,venue_id,start_time\n5,7,2030-01-10 20:00:00\n")
+        result = app.test_cli_runner().invoke(args=["import", "shows", str(path)])
+        assert "Imported 0 of 1 shows" in result.output
+        assert "shows.csv:2: venue 7 does not exist" in result.output
+
+    def test_invalid_id_message(self, client, sample_venue):
+        """Test that a malformed id is reported as a field error."""
+        row = {
+            "artist_id": "x",
+            "venue_id": sample_venue,
+            "start_time": "2030-01-10 20:00:00",
+        }
+        response = client.post("/api/v1/shows/batch", json=[row])
+        assert response.status_code == 422
+        assert response.get_json()["data"][0]["error"] == "artist_id: Not a valid id."
+
+    def test_statements_independent_of_size(self, client, sample_venue, sample_artist):
+        """Test that the checks and inserts do not run per row."""
+        self.setup_catalogue(sample_venue, sample_artist)
+
+        def book(days):
+            rows = [
+                {
+                    "venue_id": sample_venue,
+                    "artist_id": sample_artist,
+                    "start_time": f"2030-01-{day:02d} 21:00:00",
+                }
+                for day in days
+            ]
+            response, statements = count_statements(
+                client, "/api/v1/shows/batch", method="post", json=rows
+            )
+            assert response.status_code == 201
+            return statements
+
+        assert book(range(1, 3)) == book(range(10, 30))
+
+    def test_import_rejects_clashes(
+        self, client, sample_venue, sample_artist, tmp_path
+    ):
+        """Test that `flask import` applies the same clash check."""
+        self.setup_catalogue(sample_venue, sample_artist)
+        path = tmp_path / "shows.csv"
+        path.write_text(
+            "artist_id,venue_id,start_time\n"
+            f"{sample_artist},{sample_venue},2030-01-05 20:00:00\n"
+            f"{sample_artist},{sample_venue},2030-01-06 20:00:00\n"
+        )
+        result = app.test_cli_runner().invoke(args=["import", "shows", str(path)])
+        assert "Imported 1 of 2 shows" in result.output
+        assert "shows.csv:2: the venue or artist already has a show" in result.output
+
+
+class TestSlots:
+    """Test the open slot finder."""
+
+    def at(self, day, hour=0):
+        return datetime(2030, 1, day, hour)
+
+    def test_merge_joins_touching_windows(self):
+        """Test that overlapping and adjacent intervals become one."""
+        assert merge([(1, 3), (2, 4), (4, 5), (7, 8), (7, 9)]) == [(1, 5), (7, 9)]
+
+    def test_subtract(self):
+        """Test that taken time is cut out, across interval boundaries."""
+        intervals = [(0, 10), (12, 20), (25, 30)]
+        taken = [(-5, 1), (4, 6), (9, 13), (19, 26)]
+        assert subtract(intervals, taken) == [(1, 4), (6, 9), (13, 19), (26, 30)]
+        assert subtract(intervals, []) == intervals
+        assert subtract([], taken) == []
+
+    def test_open_slots(self):
+        """Test that windows are clipped and short gaps dropped."""
+        hour = timedelta(hours=1)
+        windows = [(self.at(1, 10), self.at(1, 20)), (self.at(2, 10), self.at(3))]
+        shows = [
+            (self.at(1, 12), self.at(1, 14)),
+            (self.at(1, 15), self.at(1, 17)),
+            (self.at(2, 23), self.at(3, 1)),
+        ]
+        slots = open_slots(windows, shows, self.at(1, 11), self.at(2, 23), 2 * hour)
+        assert slots == [
+            (self.at(1, 17), self.at(1, 20)),
+            (self.at(2, 10), self.at(2, 23)),
+        ]
+        # No windows at all: available throughout the range
+        assert open_slots(None, [], self.at(1), self.at(2), hour) == [
+            (self.at(1), self.at(2))
+        ]
+
+    def test_sweep_is_linear(self):
+        """Test that thousands of windows and shows are swept quickly."""
+        hour = timedelta(hours=1)
+        start = self.at(1)
+        windows = [
+            (start + i * 3 * hour, start + (i * 3 + 2) * hour) for i in range(20000)
+        ]
+        shows = [
+            (start + i * 6 * hour, start + (i * 6 + 1) * hour) for i in range(10000)
+        ]
+        began = time.perf_counter()
+        slots = open_slots(windows, shows, start, windows[-1][1], hour)
+        assert time.perf_counter() - began < 1
+        assert len(slots) == 20000
+
+    def test_endpoint(self, client, sample_venue, sample_artist):
+        """Test that other artists' shows at the venue take time too."""
+        with app.app_context():
+            other = Artist(name="Other", city="Austin", state="TX")
+            db.session.add_all(
+                [
+                    other,
+                    Availability(
+                        artist_id=sample_artist,
+                        start_time=self.at(1, 18),
+                        end_time=self.at(2),
+                    ),
+                ]
+            )
+            db.session.flush()
+            db.session.add(
+                Show(
+                    venue_id=sample_venue, artist_id=other.id, start_time=self.at(1, 20)
+                )
+            )
+            db.session.commit()
+        response = client.get(
+            f"/api/v1/artists/{sample_artist}/slots?venue_id={sample_venue}"
+            "&from=2030-01-01T00:00&to=2030-01-03T00:00&length=60"
+        )
+        assert response.status_code == 200
+        assert response.get_json() == {
+            "data": [
+                {
+                    "start_time": "2030-01-01T18:00:00",
+                    "end_time": "2030-01-01T20:00:00",
+                },
+                {
+                    "start_time": "2030-01-01T22:00:00",
+                    "end_time": "2030-01-02T00:00:00",
+                },
+            ],
+            "length_minutes": 60,
+        }
+
+        url = f"/api/v1/artists/{sample_artist}/slots"
+        assert client.get(url).status_code == 400
+        assert client.get(f"{url}?venue_id=999").status_code == 404
+        too_long = "&from=2030-01-01T00:00&to=2032-01-01T00:00"
+        assert client.get(f"{url}?venue_id=1{too_long}").status_code == 400
+        backwards = "&from=2030-01-02T00:00&to=2030-01-01T00:00"
+        response = client.get(f"{url}?venue_id=1{backwards}")
+        assert response.status_code == 400
+        assert "to must be after from" in response.get_json()["error"]["message"]
+        # Malformed values are rejected even where there is a default
+        assert client.get(f"{url}?venue_id=1&length=x").status_code == 400
+
+    def test_artist_page_search(self, client, sample_venue, sample_artist):
+        """Test the search form on the artist page and its results page."""
+        response = client.get(f"/artists/{sample_artist}")
+        assert f'action="/artists/{sample_artist}/slots"'.encode() in response.data
+        response = client.get(
+            f"/artists/{sample_artist}/slots?venue_id={sample_venue}"
+            "&from=2030-01-01 00:00:00&to=2030-01-02 00:00:00"
+        )
+        assert response.status_code == 200
+        assert b"1 Open Slot" in response.data
+        response = client.get(f"/artists/{sample_artist}/slots?venue_id=999")
+        assert b"Venue 999 does not exist." in response.data
+
+
+class TestVenueBookings:
+    """Test the exclusion constraint against double-booking a venue."""
+
+    def book(self, client, venue_id, artist_id, start, end=""):
+        return client.post(
+            "/shows/create",
+            data={
+                "venue_id": venue_id,
+                "artist_id": artist_id,
+                "start_time": start,
+                "end_time": end,
+            },
+            follow_redirects=True,
+        )
+
+    def test_overlapping_show_rejected(self, client, sample_venue, sample_artist):
+        """Test that the constraint error becomes a flash message."""
+        self.book(client, sample_venue, sample_artist, "2030-01-01 20:00:00")
+        with app.app_context():
+            assert Show.query.one().end_time == datetime(2030, 1, 1, 22)
+        response = self.book(
+            client,
+            sample_venue,
+            sample_artist,
+            "2030-01-01 21:00:00",
+            "2030-01-01 23:00:00",
+        )
+        assert b"The venue already has a show booked at that time." in response.data
+        # Back to back is fine
+        response = self.book(client, sample_venue, sample_artist, "2030-01-01 22:00:00")
+        assert b"Show was successfully listed!" in response.data
+        with app.app_context():
+            assert Show.query.count() == 2
+
+    def test_end_before_start_rejected(self, client, sample_venue, sample_artist):
+        """Test that a show cannot end before it starts."""
+        response = self.book(
+            client,
+            sample_venue,
+            sample_artist,
+            "2030-01-01 20:00:00",
+            "2030-01-01 19:00:00",
+        )
+        assert b"A show must end after it starts." in response.data
+        with app.app_context():
+            assert Show.query.count() == 0
+
+    def test_enforced_by_the_database(self, client, sample_venue, sample_artist):
+        """Test that writes bypassing the app's checks are rejected too."""
+        show = {"venue_id": sample_venue, "artist_id": sample_artist}
+        with app.app_context():
+            db.session.execute(
+                insert(Show),
+                [{**show, "start_time": datetime(2030, 1, 1, 20)}],
+            )
+            db.session.commit()
+            with pytest.raises(IntegrityError) as error:
+                db.session.execute(
+                    insert(Show),
+                    [{**show, "start_time": datetime(2030, 1, 1, 21, 59)}],
+                )
+            assert error.value.orig.pgcode == "23P01"
+            db.session.rollback()
+
+            # An empty range would overlap nothing, so it is refused outright
+            at = datetime(2030, 1, 1, 20)
+            with pytest.raises(IntegrityError) as error:
+                db.session.execute(
+                    insert(Show), [{**show, "start_time": at, "end_time": at}]
+                )
+            assert error.value.orig.pgcode == "23514"
+            db.session.rollback()
+
+    def test_batch_rejects_overlaps(self, client, sample_venue, sample_artist):
+        """Test that batch rows overlapping a show, or each other, are refused."""
+        self.book(client, sample_venue, sample_artist, "2030-01-01 20:00:00")
+        lines = [
+            f"{sample_artist}, {sample_venue}, 2030-01-01 21:30:00",
+            f"{sample_artist}, {sample_venue}, 2030-01-02 20:00:00,"
+            " 2030-01-02 23:00:00",
+            f"{sample_artist}, {sample_venue}, 2030-01-02 22:00:00",
+            f"{sample_artist}, {sample_venue}, 2030-01-02 23:00:00",
+        ]
+        response = client.post("/shows/batch", data={"shows": "\n".join(lines)})
+        assert b"2 of 4 shows were listed." in response.data
+        assert response.data.count(b"already has a show at that time") == 2
+
+    def test_slot_search_uses_gist_index(self, client, sample_venue, sample_artist):
+        """Test that the venue's shows are found through the constraint's index."""
+        self.book(client, sample_venue, sample_artist, "2030-01-01 20:00:00")
+        plan = TestQueryPlans().explain_route(
+            client,
+            f"/api/v1/artists/{sample_artist}/slots?venue_id={sample_venue}"
+            "&from=2030-01-01T00:00&to=2030-01-03T00:00",
+        )
+        assert "ex_Show_venue_id_booking" in plan
+        assert 'Seq Scan on "Show"' not in plan
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])